@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark format_table_data against the formatters it replaced.
+
+- legacy: per-row dict copies and per-cell suffix checks
+- row-wise plan: column kinds decided once, rows formatted one at a time
+- columnar: sizes and durations converted a column at a time
+- aligned (current format_table_data): columnar cells padded to column
+  width under the output budget
+
+By default the rows are synthetic dicts shaped like get_all_tables_stats
+output. With --database the same shape is generated server-side and fetched
+as real asyncpg Records, so the legacy path also pays for the dict(row)
+copy execute_query makes. All unaligned paths must produce identical text;
+the aligned path is timed with the output budget disabled.
+
+Usage (connection settings come from the usual POSTGRES_* variables):
+    PYTHONPATH=src python scripts/benchmark-format-table-data.py --rows 100000
+    PYTHONPATH=src python scripts/benchmark-format-table-data.py --rows 100000 --database postgres
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import time
+
+from mcp_postgresql_ops.functions import TableRenderer, _ColumnPlan, format_bytes, format_duration
+
+ROWS_QUERY = """
+    SELECT
+        'public' AS schema_name,
+        'table_' || n AS table_name,
+        n * 7 AS seq_scan,
+        n * 1000 AS seq_tup_read,
+        n * 3 AS idx_scan,
+        n * 50 AS n_live_tup,
+        n % 97 AS n_dead_tup,
+        n * 8192 AS total_size,
+        (n % 1000) / 10.0 AS avg_time,
+        CASE WHEN n % 3 = 0 THEN NULL ELSE now() - make_interval(secs => n) END AS last_autovacuum
+    FROM generate_series(1, $1) AS n
+"""
+
+
+def legacy_format_table_data(data, title=""):
+    """format_table_data before the column plan (per-cell key.endswith checks)."""
+    if not data:
+        return f"No data found{' for ' + title if title else ''}"
+    result = []
+    if title:
+        result.append(f"=== {title} ===\n")
+    if len(data) == 1:
+        for key, value in data[0].items():
+            if isinstance(value, (int, float)) and key.endswith(('_bytes', '_size')):
+                value = format_bytes(value)
+            elif isinstance(value, (int, float)) and key.endswith(('_time', '_duration')):
+                value = format_duration(value)
+            result.append(f"{key}: {value}")
+    else:
+        headers = list(data[0].keys())
+        result.append(" | ".join(headers))
+        result.append("-" * (sum(len(h) for h in headers) + len(headers) * 3 - 1))
+        for row in data:
+            formatted_row = []
+            for key, value in row.items():
+                if isinstance(value, (int, float)) and key.endswith(('_bytes', '_size')):
+                    formatted_row.append(format_bytes(value))
+                elif isinstance(value, (int, float)) and key.endswith(('_time', '_duration')):
+                    formatted_row.append(format_duration(value))
+                else:
+                    formatted_row.append(str(value) if value is not None else "NULL")
+            result.append(" | ".join(formatted_row))
+    return "\n".join(result)
+
+
+def rowwise_format_table_data(data, title=""):
+    """Column plan applied one row at a time (before columnar rendering)."""
+    result = [f"=== {title} ===\n"] if title else []
+    plan = _ColumnPlan(list(data[0].keys()))
+    result.append(" | ".join(plan.headers))
+    result.append("-" * (sum(len(h) for h in plan.headers) + len(plan.headers) * 3 - 1))
+    cells = plan.cells
+    result.extend([
+        " | ".join(["NULL" if value is None else cell(value) for cell, value in zip(cells, row.values())])
+        for row in data
+    ])
+    return "\n".join(result)
+
+
+def columnar_format_table_data(data, title=""):
+    """Columnar cell conversion joined without alignment, comparable with legacy output."""
+    result = [f"=== {title} ===\n"] if title else []
+    plan = _ColumnPlan(list(data[0].keys()))
+    result.append(" | ".join(plan.headers))
+    result.append("-" * (sum(len(h) for h in plan.headers) + len(plan.headers) * 3 - 1))
+    result.extend(map(" | ".join, zip(*plan.columns(data))))
+    return "\n".join(result)
+
+
+def aligned_format_table_data(data, title=""):
+    renderer = TableRenderer(title, max_bytes=0)
+    renderer.add(data)
+    return renderer.text()
+
+
+def synthetic_rows(count):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [{
+        "schema_name": "public",
+        "table_name": f"table_{n}",
+        "seq_scan": n * 7,
+        "seq_tup_read": n * 1000,
+        "idx_scan": n * 3,
+        "n_live_tup": n * 50,
+        "n_dead_tup": n % 97,
+        "total_size": n * 8192,
+        "avg_time": (n % 1000) / 10.0,
+        "last_autovacuum": None if n % 3 == 0 else now - datetime.timedelta(seconds=n),
+    } for n in range(1, count + 1)]
+
+
+async def fetch_records(database, count):
+    import asyncpg
+
+    conn = await asyncpg.connect(
+        host=os.getenv("POSTGRES_HOST", "127.0.0.1"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        database=database,
+    )
+    try:
+        return await conn.fetch(ROWS_QUERY, count)
+    finally:
+        await conn.close()
+
+
+def timed(func, runs):
+    timings = []
+    output = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="rows to format (default: 100000)")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per path; the median is reported")
+    parser.add_argument("--database", help="fetch real asyncpg Records from this database instead of dicts")
+    args = parser.parse_args()
+
+    if args.database:
+        rows = asyncio.run(fetch_records(args.database, args.rows))
+        source = f"{len(rows)} asyncpg Records"
+        label = "legacy (dict copy + per-cell checks)"
+        legacy = lambda: legacy_format_table_data([dict(row) for row in rows], "Bench")  # noqa: E731
+    else:
+        rows = synthetic_rows(args.rows)
+        source = f"{len(rows)} dict rows"
+        label = "legacy (per-cell checks)"
+        legacy = lambda: legacy_format_table_data(rows, "Bench")  # noqa: E731
+
+    paths = [
+        (label, legacy),
+        ("row-wise column plan", lambda: rowwise_format_table_data(rows, "Bench")),
+        ("columnar", lambda: columnar_format_table_data(rows, "Bench")),
+        ("aligned, output budget off", lambda: aligned_format_table_data(rows, "Bench")),
+    ]
+
+    per_row = lambda seconds: seconds / len(rows) * 1e6  # noqa: E731
+    print(f"{source}, {len(rows[0])} columns, median of {args.runs} runs")
+    baseline = expected = None
+    for name, func in paths:
+        seconds, output = timed(func, args.runs)
+        if baseline is None:
+            baseline, expected = seconds, output
+        assert output == expected or name.startswith("aligned"), f"{name} output differs from the legacy formatter"
+        print(f"  {name:<38} {seconds * 1000:8.1f} ms  {per_row(seconds):6.2f} us/row  {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
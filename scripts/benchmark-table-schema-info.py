@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Benchmark get_table_schema_info: information_schema query vs the pg_catalog fast path.
+
+Creates a synthetic schema with many tables (each with a primary key, a
+foreign key, a unique constraint, a check constraint and an index), times
+both queries for a few tables, checks that they return the same rows, and
+drops the schema again.
+
+Usage (connection settings come from the usual POSTGRES_* variables):
+    PYTHONPATH=src python scripts/benchmark-table-schema-info.py --tables 50000 --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import asyncpg
+
+import mcp_postgresql_ops.catalog  # noqa: F401  (registers the catalog templates)
+from mcp_postgresql_ops.version_compat import query_registry
+
+SCHEMA = "bench_catalog"
+
+# get_table_schema_info before the pg_catalog rewrite ($1..$12 = table, schema repeated)
+LEGACY_QUERY = """
+    WITH table_info AS (
+        SELECT 
+            t.table_schema,
+            t.table_name,
+            t.table_type,
+            pg_size_pretty(pg_total_relation_size(quote_ident(t.table_schema)||'.'||quote_ident(t.table_name))) as table_size,
+            pg_stat_get_tuples_inserted(c.oid) + pg_stat_get_tuples_updated(c.oid) + pg_stat_get_tuples_deleted(c.oid) as total_writes,
+            pg_stat_get_live_tuples(c.oid) as estimated_rows
+        FROM information_schema.tables t
+        LEFT JOIN pg_class c ON c.relname = t.table_name
+        LEFT JOIN pg_namespace n ON n.nspname = t.table_schema AND n.oid = c.relnamespace
+        WHERE t.table_name = $1 AND t.table_schema = $2
+    ),
+    column_info AS (
+        SELECT 
+            c.column_name,
+            c.ordinal_position,
+            c.data_type,
+            c.character_maximum_length,
+            c.numeric_precision,
+            c.numeric_scale,
+            c.is_nullable,
+            c.column_default,
+            CASE 
+                WHEN pk.column_name IS NOT NULL THEN 'PRIMARY KEY'
+                WHEN fk.column_name IS NOT NULL THEN 'FOREIGN KEY'
+                ELSE ''
+            END as key_type,
+            fk.referenced_table_name,
+            fk.referenced_column_name
+        FROM information_schema.columns c
+        LEFT JOIN (
+            SELECT kcu.column_name, kcu.table_name, kcu.table_schema
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu 
+                ON tc.constraint_name = kcu.constraint_name
+                AND tc.table_schema = kcu.table_schema
+            WHERE tc.constraint_type = 'PRIMARY KEY'
+                AND tc.table_name = $3 AND tc.table_schema = $4
+        ) pk ON c.column_name = pk.column_name 
+            AND c.table_name = pk.table_name 
+            AND c.table_schema = pk.table_schema
+        LEFT JOIN (
+            SELECT 
+                kcu.column_name, 
+                kcu.table_name, 
+                kcu.table_schema,
+                ccu.table_name AS referenced_table_name,
+                ccu.column_name AS referenced_column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu 
+                ON tc.constraint_name = kcu.constraint_name
+                AND tc.table_schema = kcu.table_schema
+            JOIN information_schema.constraint_column_usage ccu 
+                ON ccu.constraint_name = tc.constraint_name
+                AND ccu.table_schema = tc.table_schema
+            WHERE tc.constraint_type = 'FOREIGN KEY'
+                AND tc.table_name = $5 AND tc.table_schema = $6
+        ) fk ON c.column_name = fk.column_name 
+            AND c.table_name = fk.table_name 
+            AND c.table_schema = fk.table_schema
+        WHERE c.table_name = $7 AND c.table_schema = $8
+        ORDER BY c.ordinal_position
+    ),
+    constraint_info AS (
+        SELECT 
+            tc.constraint_name,
+            tc.constraint_type,
+            string_agg(kcu.column_name, ', ' ORDER BY kcu.ordinal_position) as columns,
+            CASE 
+                WHEN tc.constraint_type = 'FOREIGN KEY' THEN
+                    ccu.table_name || '(' || ccu.column_name || ')'
+                ELSE ''
+            END as references
+        FROM information_schema.table_constraints tc
+        LEFT JOIN information_schema.key_column_usage kcu 
+            ON tc.constraint_name = kcu.constraint_name
+            AND tc.table_schema = kcu.table_schema
+        LEFT JOIN information_schema.constraint_column_usage ccu 
+            ON ccu.constraint_name = tc.constraint_name
+            AND ccu.table_schema = tc.table_schema
+        WHERE tc.table_name = $9 AND tc.table_schema = $10
+        GROUP BY tc.constraint_name, tc.constraint_type, ccu.table_name, ccu.column_name
+        ORDER BY tc.constraint_type, tc.constraint_name
+    ),
+    index_info AS (
+        SELECT 
+            i.indexname as index_name,
+            i.indexdef as index_definition,
+            CASE WHEN idx.indisunique THEN 'UNIQUE' ELSE 'REGULAR' END as index_type
+        FROM pg_indexes i
+        JOIN pg_class c ON c.relname = i.indexname
+        JOIN pg_index idx ON idx.indexrelid = c.oid
+        WHERE i.tablename = $11 AND i.schemaname = $12
+        ORDER BY i.indexname
+    )
+    SELECT * FROM (
+        SELECT 
+            'TABLE_INFO' as section,
+            ti.table_schema || '.' || ti.table_name as name,
+            ti.table_type as type,
+            ti.table_size as size,
+            COALESCE(ti.estimated_rows::text, 'N/A') as rows,
+            COALESCE(ti.total_writes::text, 'N/A') as writes,
+            '' as extra1,
+            '' as extra2,
+            '' as extra3,
+            1 as sort_order
+        FROM table_info ti
+        
+        UNION ALL
+        
+        SELECT 
+            'COLUMN' as section,
+            ci.column_name as name,
+            ci.data_type as type,
+            COALESCE(
+                CASE 
+                    WHEN ci.character_maximum_length IS NOT NULL THEN '(' || ci.character_maximum_length || ')'
+                    WHEN ci.numeric_precision IS NOT NULL AND ci.numeric_scale IS NOT NULL THEN '(' || ci.numeric_precision || ',' || ci.numeric_scale || ')'
+                    WHEN ci.numeric_precision IS NOT NULL THEN '(' || ci.numeric_precision || ')'
+                    ELSE ''
+                END, ''
+            ) as size,
+            ci.is_nullable as rows,
+            COALESCE(ci.column_default, '') as writes,
+            ci.key_type as extra1,
+            COALESCE(ci.referenced_table_name, '') as extra2,
+            COALESCE(ci.referenced_column_name, '') as extra3,
+            2 as sort_order
+        FROM column_info ci
+        
+        UNION ALL
+        
+        SELECT 
+            'CONSTRAINT' as section,
+            co.constraint_name as name,
+            co.constraint_type as type,
+            co.columns as size,
+            co.references as rows,
+            '' as writes,
+            '' as extra1,
+            '' as extra2,
+            '' as extra3,
+            3 as sort_order
+        FROM constraint_info co
+        
+        UNION ALL
+        
+        SELECT 
+            'INDEX' as section,
+            idx.index_name as name,
+            idx.index_type as type,
+            idx.index_definition as size,
+            '' as rows,
+            '' as writes,
+            '' as extra1,
+            '' as extra2,
+            '' as extra3,
+            4 as sort_order
+        FROM index_info idx
+    ) combined_results
+    ORDER BY sort_order, name
+    """
+
+
+def comparable(rows) -> list:
+    # information_schema.table_constraints also lists NOT NULL columns as
+    # CHECK constraints without columns; the fast path leaves them out
+    return [
+        tuple(row) for row in rows
+        if not (row["section"] == "CONSTRAINT" and row["type"] == "CHECK" and row["name"].endswith("_not_null"))
+    ]
+
+
+async def create_catalog(conn: asyncpg.Connection, tables: int) -> None:
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+    batch = 500
+    for start in range(0, tables, batch):
+        ddl = []
+        for i in range(start, min(start + batch, tables)):
+            parent = f"REFERENCES {SCHEMA}.t{i - 1}(id)" if i else ""
+            ddl.append(
+                f"CREATE TABLE {SCHEMA}.t{i} ("
+                f" id bigint PRIMARY KEY, parent_id bigint {parent},"
+                f" code varchar(32) UNIQUE, amount numeric(12,2) CHECK (amount >= 0),"
+                f" created_at timestamptz DEFAULT now());"
+                f"CREATE INDEX ON {SCHEMA}.t{i} (created_at);"
+            )
+        async with conn.transaction():
+            await conn.execute("".join(ddl))
+        print(f"  created {min(start + batch, tables)}/{tables} tables", end="\r", flush=True)
+    await conn.execute("ANALYZE pg_catalog.pg_class, pg_catalog.pg_attribute, pg_catalog.pg_constraint")
+    print()
+
+
+async def time_query(conn: asyncpg.Connection, query: str, params: list, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        rows = await conn.fetch(query, *params)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), rows
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tables", type=int, default=20000, help="synthetic tables to create (default: 20000)")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per query (default: 5)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic schema afterwards")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5432")),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", ""),
+        database=os.getenv("POSTGRES_DB", "postgres"),
+    )
+    try:
+        print(f"Creating {args.tables} tables in schema {SCHEMA}...")
+        await create_catalog(conn, args.tables)
+        relations = await conn.fetchval("SELECT count(*) FROM pg_class")
+        print(f"pg_class now holds {relations} relations\n")
+
+        fast_query = query_registry.render("table_schema_info")
+        print(f"{'table':<10} {'information_schema':>20} {'pg_catalog':>12} {'speedup':>9}  rows")
+        for table in ("t0", f"t{args.tables // 2}", f"t{args.tables - 1}"):
+            legacy_time, legacy_rows = await time_query(conn, LEGACY_QUERY, [table, SCHEMA] * 6, args.runs)
+            fast_time, fast_rows = await time_query(conn, fast_query, [table, SCHEMA], args.runs)
+            legacy_rows, fast_rows = comparable(legacy_rows), comparable(fast_rows)
+            same = legacy_rows == fast_rows
+            print(f"{table:<10} {legacy_time * 1000:>18.1f}ms {fast_time * 1000:>10.1f}ms "
+                  f"{legacy_time / fast_time:>8.1f}x  {len(fast_rows)} ({'identical' if same else 'DIFFERENT'})")
+            if not same:
+                for legacy_row, fast_row in zip(legacy_rows, fast_rows):
+                    if legacy_row != fast_row:
+                        print(f"    information_schema: {legacy_row}\n    pg_catalog:         {fast_row}")
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,572 @@
+"""
+Catalog Introspection
+
+Schema queries that read pg_class, pg_attribute, pg_constraint and pg_index
+directly by OID. They return the same rows the information_schema versions
+did, without the view stack and per-row privilege checks that make
+information_schema slow on catalogs with tens of thousands of relations.
+Batch queries describe any number of tables with one query per section.
+The table list is read in keyset-paginated pages streamed from a cursor.
+A cheap per-database fingerprint detects DDL so schema tool results can be
+kept in memory until the catalog actually changes.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import functions
+from .functions import (
+    execute_queries, execute_query, format_bytes, format_table_data, output_budget, output_limit_note, stream_query,
+)
+from .version_compat import PostgreSQLVersion, query_registry
+
+logger = logging.getLogger(__name__)
+
+# Catalog change detection (see catalog_fingerprint)
+CATALOG_CACHE_CONFIG = {
+    # Seconds a fingerprint is trusted before the database is asked again
+    "check_interval": float(os.getenv("POSTGRES_CATALOG_CHECK_INTERVAL", "5")),
+    # Optional table filled by an event trigger; its max(id) replaces the
+    # statistics-based fingerprint
+    "change_table": os.getenv("POSTGRES_CATALOG_CHANGE_TABLE", "").strip(),
+}
+
+
+def relation_type_sql(alias: str) -> str:
+    """information_schema.tables.table_type for the pg_class row aliased as alias."""
+    return f"""
+    CASE
+        WHEN {alias}.relkind IN ('r', 'p') AND {alias}.relpersistence = 't' THEN 'LOCAL TEMPORARY'
+        WHEN {alias}.relkind IN ('r', 'p') THEN 'BASE TABLE'
+        WHEN {alias}.relkind = 'v' THEN 'VIEW'
+        WHEN {alias}.relkind = 'm' THEN 'MATERIALIZED VIEW'
+        WHEN {alias}.relkind = 'f' THEN 'FOREIGN'
+    END
+    """
+
+
+# information_schema.columns.data_type, computed from pg_type the way the view does
+DATA_TYPE_SQL = """
+CASE
+    WHEN t.typtype = 'd' THEN
+        CASE
+            WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+            WHEN bt.typnamespace = 'pg_catalog'::regnamespace THEN format_type(t.typbasetype, NULL)
+            ELSE 'USER-DEFINED'
+        END
+    WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+    WHEN t.typnamespace = 'pg_catalog'::regnamespace THEN format_type(a.atttypid, NULL)
+    ELSE 'USER-DEFINED'
+END
+"""
+
+
+@query_registry.template("table_schema_info")
+def _table_schema_info_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 table, $2 schema; the relation is resolved once and everything else joins on its OID
+    return f"""
+    WITH rel AS (
+        SELECT c.oid, c.relname, c.relkind, c.relpersistence, n.nspname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = $1 AND n.nspname = $2
+    ),
+    cons AS (
+        SELECT con.oid, con.conname, con.contype, con.conkey, con.confkey, con.confrelid
+        FROM pg_constraint con
+        JOIN rel ON con.conrelid = rel.oid
+        WHERE con.contype IN ('p', 'u', 'f', 'c')
+    ),
+    key_columns AS (
+        SELECT cons.contype, k.attnum, fa.attname AS referenced_column_name,
+               fc.relname AS referenced_table_name
+        FROM cons
+        CROSS JOIN LATERAL unnest(cons.conkey, cons.confkey) AS k(attnum, fattnum)
+        LEFT JOIN pg_class fc ON fc.oid = cons.confrelid
+        LEFT JOIN pg_attribute fa ON fa.attrelid = cons.confrelid AND fa.attnum = k.fattnum
+        WHERE cons.contype IN ('p', 'f')
+    ),
+    column_info AS (
+        SELECT
+            a.attname AS column_name,
+            a.attnum,
+            {DATA_TYPE_SQL} AS data_type,
+            information_schema._pg_char_max_length(information_schema._pg_truetypid(a.*, t.*),
+                                                   information_schema._pg_truetypmod(a.*, t.*)) AS character_maximum_length,
+            information_schema._pg_numeric_precision(information_schema._pg_truetypid(a.*, t.*),
+                                                     information_schema._pg_truetypmod(a.*, t.*)) AS numeric_precision,
+            information_schema._pg_numeric_scale(information_schema._pg_truetypid(a.*, t.*),
+                                                 information_schema._pg_truetypmod(a.*, t.*)) AS numeric_scale,
+            CASE WHEN a.attnotnull OR (t.typtype = 'd' AND t.typnotnull) THEN 'NO' ELSE 'YES' END AS is_nullable,
+            CASE WHEN a.attgenerated = '' THEN pg_get_expr(ad.adbin, ad.adrelid) END AS column_default,
+            CASE
+                WHEN pk.attnum IS NOT NULL THEN 'PRIMARY KEY'
+                WHEN fk.attnum IS NOT NULL THEN 'FOREIGN KEY'
+                ELSE ''
+            END AS key_type,
+            fk.referenced_table_name,
+            fk.referenced_column_name
+        FROM rel
+        JOIN pg_attribute a ON a.attrelid = rel.oid AND a.attnum > 0 AND NOT a.attisdropped
+        JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+        LEFT JOIN pg_attrdef ad ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+        LEFT JOIN (SELECT DISTINCT attnum FROM key_columns WHERE contype = 'p') pk ON pk.attnum = a.attnum
+        LEFT JOIN key_columns fk ON fk.contype = 'f' AND fk.attnum = a.attnum
+    ),
+    constraint_info AS (
+        SELECT
+            cons.conname AS constraint_name,
+            CASE cons.contype
+                WHEN 'p' THEN 'PRIMARY KEY' WHEN 'u' THEN 'UNIQUE'
+                WHEN 'f' THEN 'FOREIGN KEY' ELSE 'CHECK'
+            END AS constraint_type,
+            CASE WHEN cons.contype <> 'c' THEN (
+                SELECT string_agg(a.attname, ', ' ORDER BY k.ord)
+                FROM unnest(cons.conkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = (SELECT oid FROM rel) AND a.attnum = k.attnum
+            ) END AS columns,
+            CASE WHEN cons.contype = 'f' THEN (
+                SELECT fc.relname || '(' || string_agg(fa.attname, ', ' ORDER BY k.ord) || ')'
+                FROM unnest(cons.confkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute fa ON fa.attrelid = cons.confrelid AND fa.attnum = k.attnum
+                JOIN pg_class fc ON fc.oid = cons.confrelid
+                GROUP BY fc.relname
+            ) ELSE '' END AS "references"
+        FROM cons
+    ),
+    index_info AS (
+        SELECT
+            ic.relname AS index_name,
+            pg_get_indexdef(i.indexrelid) AS index_definition,
+            CASE WHEN i.indisunique THEN 'UNIQUE' ELSE 'REGULAR' END AS index_type
+        FROM rel
+        JOIN pg_index i ON i.indrelid = rel.oid
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+    )
+    SELECT * FROM (
+        SELECT
+            'TABLE_INFO' AS section,
+            rel.nspname || '.' || rel.relname AS name,
+            {relation_type_sql("rel")} AS type,
+            pg_size_pretty(pg_total_relation_size(rel.oid)) AS size,
+            COALESCE(pg_stat_get_live_tuples(rel.oid)::text, 'N/A') AS rows,
+            COALESCE((pg_stat_get_tuples_inserted(rel.oid) + pg_stat_get_tuples_updated(rel.oid)
+                      + pg_stat_get_tuples_deleted(rel.oid))::text, 'N/A') AS writes,
+            '' AS extra1,
+            '' AS extra2,
+            '' AS extra3,
+            1 AS sort_order
+        FROM rel
+
+        UNION ALL
+
+        SELECT
+            'COLUMN' AS section,
+            ci.column_name AS name,
+            ci.data_type AS type,
+            CASE
+                WHEN ci.character_maximum_length IS NOT NULL THEN '(' || ci.character_maximum_length || ')'
+                WHEN ci.numeric_precision IS NOT NULL AND ci.numeric_scale IS NOT NULL THEN '(' || ci.numeric_precision || ',' || ci.numeric_scale || ')'
+                WHEN ci.numeric_precision IS NOT NULL THEN '(' || ci.numeric_precision || ')'
+                ELSE ''
+            END AS size,
+            ci.is_nullable AS rows,
+            COALESCE(ci.column_default, '') AS writes,
+            ci.key_type AS extra1,
+            COALESCE(ci.referenced_table_name, '') AS extra2,
+            COALESCE(ci.referenced_column_name, '') AS extra3,
+            2 AS sort_order
+        FROM column_info ci
+
+        UNION ALL
+
+        SELECT
+            'CONSTRAINT' AS section,
+            co.constraint_name AS name,
+            co.constraint_type AS type,
+            co.columns AS size,
+            co."references" AS rows,
+            '' AS writes,
+            '' AS extra1,
+            '' AS extra2,
+            '' AS extra3,
+            3 AS sort_order
+        FROM constraint_info co
+
+        UNION ALL
+
+        SELECT
+            'INDEX' AS section,
+            idx.index_name AS name,
+            idx.index_type AS type,
+            idx.index_definition AS size,
+            '' AS rows,
+            '' AS writes,
+            '' AS extra1,
+            '' AS extra2,
+            '' AS extra3,
+            4 AS sort_order
+        FROM index_info idx
+    ) combined_results
+    ORDER BY sort_order, name
+    """
+
+
+@query_registry.template("schema_overview")
+def _schema_overview_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 schema: tables and views with their columns in ordinal order, PK columns marked
+    return f"""
+    WITH tables AS (
+        SELECT c.oid, n.nspname, c.relname, {relation_type_sql("c")} AS table_type
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v')
+    ),
+    table_columns AS (
+        SELECT
+            tb.nspname,
+            tb.relname,
+            tb.table_type,
+            COUNT(a.attnum) AS column_count,
+            string_agg(
+                CASE WHEN pk.conkey IS NOT NULL AND a.attnum = ANY(pk.conkey) THEN a.attname || ' (PK)'
+                     ELSE a.attname
+                END,
+                ', ' ORDER BY a.attnum
+            ) AS columns,
+            pg_size_pretty(COALESCE(pg_total_relation_size(tb.oid), 0)) AS table_size
+        FROM tables tb
+        LEFT JOIN pg_attribute a ON a.attrelid = tb.oid AND a.attnum > 0 AND NOT a.attisdropped
+        LEFT JOIN pg_constraint pk ON pk.conrelid = tb.oid AND pk.contype = 'p'
+        GROUP BY tb.oid, tb.nspname, tb.relname, tb.table_type
+    )
+    SELECT
+        nspname || '.' || relname AS table_name,
+        table_type,
+        column_count,
+        table_size,
+        LEFT(columns, 100) || CASE WHEN LENGTH(columns) > 100 THEN '...' ELSE '' END AS columns_preview
+    FROM table_columns
+    ORDER BY nspname, relname
+    """
+
+
+# Batch introspection: one query per section for any number of tables
+
+@query_registry.template("batch_relations")
+def _batch_relations_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 schema, $2 table names (NULL = whole schema), $3 limit
+    return f"""
+    SELECT c.oid, n.nspname AS schema_name, c.relname AS table_name,
+           {relation_type_sql("c")} AS table_type,
+           pg_total_relation_size(c.oid) AS total_size,
+           pg_stat_get_live_tuples(c.oid) AS estimated_rows
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = $1
+      AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+      AND ($2::text[] IS NULL OR c.relname = ANY($2::text[]))
+    ORDER BY c.relname
+    LIMIT $3
+    """
+
+
+@query_registry.template("batch_columns")
+def _batch_columns_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 relation OIDs
+    return f"""
+    WITH key_columns AS (
+        SELECT con.conrelid, con.contype, k.attnum,
+               fc.relname AS referenced_table, fa.attname AS referenced_column
+        FROM pg_constraint con
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+        LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+        LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+        WHERE con.conrelid = ANY($1::oid[]) AND con.contype IN ('p', 'f')
+    )
+    SELECT
+        a.attrelid AS oid,
+        a.attname AS column_name,
+        {DATA_TYPE_SQL} AS data_type,
+        CASE
+            WHEN ts.char_length IS NOT NULL THEN '(' || ts.char_length || ')'
+            WHEN ts.numeric_precision IS NOT NULL AND ts.numeric_scale IS NOT NULL
+                THEN '(' || ts.numeric_precision || ',' || ts.numeric_scale || ')'
+            WHEN ts.numeric_precision IS NOT NULL THEN '(' || ts.numeric_precision || ')'
+            ELSE ''
+        END AS type_size,
+        CASE WHEN a.attnotnull OR (t.typtype = 'd' AND t.typnotnull) THEN 'NO' ELSE 'YES' END AS is_nullable,
+        COALESCE(CASE WHEN a.attgenerated = '' THEN pg_get_expr(ad.adbin, ad.adrelid) END, '') AS column_default,
+        CASE
+            WHEN pk.attnum IS NOT NULL THEN 'PRIMARY KEY'
+            WHEN fk.attnum IS NOT NULL THEN 'FOREIGN KEY'
+            ELSE ''
+        END AS key_type,
+        COALESCE(fk.referenced_table || '(' || fk.referenced_column || ')', '') AS "references"
+    FROM pg_attribute a
+    JOIN pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    CROSS JOIN LATERAL (
+        SELECT information_schema._pg_truetypid(a.*, t.*) AS typid,
+               information_schema._pg_truetypmod(a.*, t.*) AS typmod
+    ) tt
+    CROSS JOIN LATERAL (
+        SELECT information_schema._pg_char_max_length(tt.typid, tt.typmod) AS char_length,
+               information_schema._pg_numeric_precision(tt.typid, tt.typmod) AS numeric_precision,
+               information_schema._pg_numeric_scale(tt.typid, tt.typmod) AS numeric_scale
+    ) ts
+    LEFT JOIN pg_attrdef ad ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+    LEFT JOIN (SELECT DISTINCT conrelid, attnum FROM key_columns WHERE contype = 'p') pk
+        ON pk.conrelid = a.attrelid AND pk.attnum = a.attnum
+    LEFT JOIN key_columns fk ON fk.contype = 'f' AND fk.conrelid = a.attrelid AND fk.attnum = a.attnum
+    WHERE a.attrelid = ANY($1::oid[]) AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attrelid, a.attnum
+    """
+
+
+@query_registry.template("batch_constraints")
+def _batch_constraints_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 relation OIDs
+    return """
+    SELECT
+        con.conrelid AS oid,
+        con.conname AS constraint_name,
+        CASE con.contype
+            WHEN 'p' THEN 'PRIMARY KEY' WHEN 'u' THEN 'UNIQUE'
+            WHEN 'f' THEN 'FOREIGN KEY' ELSE 'CHECK'
+        END AS constraint_type,
+        pg_get_constraintdef(con.oid) AS definition
+    FROM pg_constraint con
+    WHERE con.conrelid = ANY($1::oid[]) AND con.contype IN ('p', 'u', 'f', 'c')
+    ORDER BY con.conrelid, con.contype, con.conname
+    """
+
+
+@query_registry.template("batch_indexes")
+def _batch_indexes_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 relation OIDs
+    return """
+    SELECT
+        i.indrelid AS oid,
+        ic.relname AS index_name,
+        CASE WHEN i.indisunique THEN 'UNIQUE' ELSE 'REGULAR' END AS index_type,
+        pg_get_indexdef(i.indexrelid) AS index_definition
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    WHERE i.indrelid = ANY($1::oid[])
+    ORDER BY i.indrelid, ic.relname
+    """
+
+
+async def get_schema_batch(schema_name: str = "public", table_names: Optional[List[str]] = None,
+                           limit: int = 500, database: str = None) -> List[Dict[str, Any]]:
+    """Describe many tables with four set-based catalog queries.
+
+    Returns one dict per table (in name order) with its relation row plus
+    "columns", "constraints" and "indexes" lists.
+    """
+    relations = await execute_query(
+        query_registry.render("batch_relations"), [schema_name, table_names or None, limit], database=database
+    )
+    if not relations:
+        return []
+
+    oids = [row["oid"] for row in relations]
+    columns, constraints, indexes = await execute_queries([
+        (query_registry.render("batch_columns"), [oids]),
+        (query_registry.render("batch_constraints"), [oids]),
+        (query_registry.render("batch_indexes"), [oids]),
+    ], database=database)
+
+    tables = {row["oid"]: {**row, "columns": [], "constraints": [], "indexes": []} for row in relations}
+    for section, rows in (("columns", columns), ("constraints", constraints), ("indexes", indexes)):
+        for row in rows:
+            row = dict(row)
+            tables[row.pop("oid")][section].append(row)
+    return [tables[oid] for oid in oids]
+
+
+def format_schema_batch(tables: List[Dict[str, Any]], title: str) -> str:
+    """Format get_schema_batch() output as one block of sections per table.
+    
+    All sections share one output budget; once it is used up the remaining
+    tables are left out and counted in a closing summary line.
+    """
+    if not tables:
+        return f"No data found for {title}"
+    blocks = [f"=== {title}: {len(tables)} tables ==="]
+    with output_budget() as budget:
+        if budget is not None:
+            budget.charge(blocks[0])
+        for shown, table in enumerate(tables):
+            if budget is not None and budget.spent:
+                blocks.append(output_limit_note(len(tables) - shown, shown, "table", budget.max_bytes))
+                break
+            heading = (f"{table['schema_name']}.{table['table_name']} ({table['table_type']}, "
+                       f"{format_bytes(table['total_size'])}, ~{table['estimated_rows']} rows)")
+            blocks.append(format_table_data(table["columns"], f"{heading} - Columns"))
+            if table["constraints"]:
+                blocks.append(format_table_data(table["constraints"], f"{heading} - Constraints"))
+            if table["indexes"]:
+                blocks.append(format_table_data(table["indexes"], f"{heading} - Indexes"))
+    return "\n\n".join(blocks)
+
+
+@query_registry.template("table_list_page")
+def _table_list_page_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # Keyset pagination on (schema, table); sizes are computed for the page
+    # only, and not at all unless $4 is true
+    return """
+    SELECT
+        p.schema_name,
+        p.table_name,
+        p.owner,
+        CASE WHEN $4 THEN pg_total_relation_size(p.oid) END AS total_size
+    FROM (
+        SELECT c.oid, n.nspname AS schema_name, c.relname AS table_name, pg_get_userbyid(c.relowner) AS owner
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p')
+          AND n.nspname NOT IN ('information_schema', 'pg_catalog')
+          AND ($1::name IS NULL OR (n.nspname, c.relname) > ($1::name, $2::name))
+        ORDER BY n.nspname, c.relname
+        LIMIT $3
+    ) p
+    ORDER BY p.schema_name, p.table_name
+    """
+
+
+# Table list cursor: "schema.table" with quote_ident-style quoting, so names
+# containing dots or quotes round-trip
+_PLAIN_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_$]*")
+_IDENTIFIER = r'(?:"((?:[^"]|"")*)"|([^".]+))'
+_TABLE_CURSOR = re.compile(rf"{_IDENTIFIER}\.{_IDENTIFIER}")
+
+
+def _quote_identifier(name: str) -> str:
+    if _PLAIN_IDENTIFIER.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_cursor(schema_name: str, table_name: str) -> str:
+    """Cursor value for the table list page that follows schema_name.table_name."""
+    return f"{_quote_identifier(schema_name)}.{_quote_identifier(table_name)}"
+
+
+def parse_table_cursor(after: str) -> Tuple[str, str]:
+    """Split a table_cursor() value back into (schema, table)."""
+    match = _TABLE_CURSOR.fullmatch(after)
+    if not match:
+        raise ValueError(f'Invalid after value {after!r}; expected schema.table, quoting names '
+                         f'that contain dots or quotes (e.g. "my.schema".orders)')
+    quoted_schema, schema, quoted_table, table = match.groups()
+    if quoted_schema is not None:
+        schema = quoted_schema.replace('""', '"')
+    if quoted_table is not None:
+        table = quoted_table.replace('""', '"')
+    return schema, table
+
+
+async def get_table_page(after: Optional[str] = None, page_size: int = 1000, include_size: bool = True,
+                         database: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of the table list and the ``after`` value of the next page (None on the last page).
+
+    after is the table_cursor() of the last row of the previous page.
+    """
+    schema_after, table_after = parse_table_cursor(after) if after else (None, None)
+    rows = []
+    next_after = None
+    # One extra row tells whether another page follows
+    stream = stream_query(query_registry.render("table_list_page"),
+                          [schema_after, table_after, page_size + 1, include_size],
+                          database=database, limit=page_size + 1)
+    async with aclosing(stream):
+        async for row in stream:
+            if len(rows) == page_size:
+                last = rows[-1]
+                next_after = table_cursor(last["schema_name"], last["table_name"])
+                break
+            row = dict(row)
+            if not include_size:
+                del row["total_size"]
+            rows.append(row)
+    return rows, next_after
+
+
+# DDL writes rows to these catalogs; their write counters move on every change
+FINGERPRINT_CATALOGS = [
+    "pg_class", "pg_attribute", "pg_attrdef", "pg_constraint", "pg_index",
+    "pg_inherits", "pg_namespace", "pg_type",
+]
+
+STATISTICS_FINGERPRINT_QUERY = f"""
+SELECT concat_ws(':',
+    (SELECT sum(pg_stat_get_tuples_inserted(c) + pg_stat_get_tuples_updated(c) + pg_stat_get_tuples_deleted(c))
+     FROM unnest('{{{",".join(FINGERPRINT_CATALOGS)}}}'::regclass[]) AS c),
+    (SELECT count(*) || '/' || max(xmin::text::bigint) FROM pg_class)
+) AS fingerprint
+"""
+
+
+def _fingerprint_query() -> str:
+    table = CATALOG_CACHE_CONFIG["change_table"]
+    if table and re.fullmatch(r"[A-Za-z_][\w$]*(\.[A-Za-z_][\w$]*)?", table):
+        return f"SELECT (SELECT max(id) FROM {table})::text AS fingerprint"
+    if table:
+        logger.warning(f"Ignoring invalid POSTGRES_CATALOG_CHANGE_TABLE '{table}'")
+    return STATISTICS_FINGERPRINT_QUERY
+
+
+class CatalogFingerprints:
+    """Per-database catalog fingerprints, re-checked at most every check_interval.
+
+    Within the interval the last fingerprint is returned from memory, so a
+    cached schema tool answers without touching the database; concurrent
+    checks for one database share a single query.
+    """
+
+    def __init__(self):
+        # (host, port, database) -> (checked_at, fingerprint)
+        self.entries: Dict[Tuple[str, int, str], Tuple[float, Optional[str]]] = {}
+        self.inflight: Dict[Tuple[str, int, str], asyncio.Task] = {}
+
+    async def _check(self, key: Tuple[str, int, str], database: Optional[str]) -> Optional[str]:
+        try:
+            row = await functions.execute_single_query(_fingerprint_query(), database=database)
+            fingerprint = row["fingerprint"] if row else None
+        except Exception as e:
+            logger.debug(f"Catalog fingerprint check failed for {key[2]}: {e}")
+            # Unknown state: a unique value keeps earlier results from being reused
+            fingerprint = f"unchecked-{time.monotonic()}"
+        self.entries[key] = (time.monotonic(), fingerprint)
+        return fingerprint
+
+    async def get(self, database: str = None) -> Optional[str]:
+        config = functions.POSTGRES_CONFIG
+        key = (config["host"], config["port"], database or config["database"])
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < CATALOG_CACHE_CONFIG["check_interval"]:
+            return entry[1]
+        task = self.inflight.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self.inflight[key] = asyncio.ensure_future(self._check(key, database))
+            task.add_done_callback(lambda done: self.inflight.pop(key, None) if self.inflight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+catalog_fingerprints = CatalogFingerprints()
+
+
+async def catalog_fingerprint(arguments: Dict[str, Any]) -> Optional[str]:
+    """cached_tool fingerprint for schema tools: the catalog state of database_name."""
+    return await catalog_fingerprints.get(arguments.get("database_name"))
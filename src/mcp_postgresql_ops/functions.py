@@ -1,9 +1,26 @@
+import asyncio
 import asyncpg
+import functools
+import inspect
 import logging
 import os
-from typing import Any, Dict, List, Optional, Union
+import time
+import weakref
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+import csv
+import io
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+
+try:
+    import orjson
+except ImportError:  # optional: pip install mcp-postgresql-ops[fast]
+    orjson = None
 
 # Logger configuration
 logger = logging.getLogger(__name__)
@@ -17,6 +34,63 @@ POSTGRES_CONFIG = {
     "database": os.getenv("POSTGRES_DB", "postgres"),
 }
 
+# Connection pool configuration (one pool per host/port/database)
+POOL_CONFIG = {
+    "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+    "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "5")),
+    "idle_timeout": float(os.getenv("POSTGRES_POOL_IDLE_TIMEOUT", "300")),
+    "max_lifetime": float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "3600")),
+    # Budget shared by all per-database pools; least recently used pools are
+    # closed to make room for new ones
+    "max_total_connections": int(os.getenv("POSTGRES_POOL_MAX_TOTAL", "20")),
+    # Pools unused for this many seconds are closed entirely (0 disables)
+    "reap_timeout": float(os.getenv("POSTGRES_POOL_REAP_TIMEOUT", "600")),
+    # Seconds to wait for budget when every pool is busy
+    "budget_wait_timeout": float(os.getenv("POSTGRES_POOL_BUDGET_TIMEOUT", "30")),
+    # Independent queries a single tool may run at the same time
+    "tool_concurrency": int(os.getenv("POSTGRES_TOOL_CONCURRENCY", "4")),
+    # Prepared statements asyncpg keeps per connection, keyed by SQL text
+    # (0 disables prepared statements entirely, e.g. behind pgbouncer)
+    "statement_cache_size": int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100")),
+    # Prepare the hot tool queries as soon as a pooled connection opens
+    "statement_warmup": os.getenv("POSTGRES_STATEMENT_WARMUP", "true").lower() in ("1", "true", "yes"),
+    # Rows fetched per round trip when a result is streamed from a cursor
+    "stream_batch_rows": int(os.getenv("POSTGRES_STREAM_BATCH_ROWS", "500")),
+    # Rows a streamed tool result may contain before the rest is cut off (0 disables)
+    "max_result_rows": int(os.getenv("POSTGRES_MAX_RESULT_ROWS", "10000")),
+}
+
+# Text rendering of tool results (see TableRenderer)
+OUTPUT_CONFIG = {
+    # Output size a table may reach before further rows are elided (0 disables)
+    "max_bytes": int(os.getenv("POSTGRES_OUTPUT_MAX_BYTES", "100000")),
+    # Characters kept per cell; longer values (e.g. query texts) are cut (0 disables)
+    "max_cell_width": int(os.getenv("POSTGRES_OUTPUT_MAX_CELL_WIDTH", "300")),
+}
+
+# Tool result cache (see cached_tool)
+TOOL_CACHE_CONFIG = {
+    "enabled": os.getenv("POSTGRES_TOOL_CACHE", "true").lower() in ("1", "true", "yes"),
+    "max_entries": int(os.getenv("POSTGRES_TOOL_CACHE_MAX_ENTRIES", "256")),
+    "max_bytes": int(os.getenv("POSTGRES_TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    # Seconds an expired size/bloat result may still be served while it is
+    # refreshed in the background (0 disables stale-while-revalidate)
+    "max_stale": float(os.getenv("POSTGRES_TOOL_CACHE_MAX_STALE", "0")),
+    # Per-tool TTL overrides, e.g. "get_table_list=10,get_database_size_info=300"
+    "ttl_overrides": {
+        name.strip(): float(ttl)
+        for name, _, ttl in (
+            item.partition("=") for item in os.getenv("POSTGRES_TOOL_CACHE_TTLS", "").split(",")
+        )
+        if name.strip() and ttl.strip()
+    },
+}
+
+# Seconds a server capability snapshot is reused before it is re-read
+CAPABILITY_TTL = float(os.getenv("POSTGRES_CAPABILITY_TTL", "60"))
+# Seconds a failed version probe is remembered before it is retried
+CAPABILITY_NEGATIVE_TTL = float(os.getenv("POSTGRES_CAPABILITY_NEGATIVE_TTL", "5"))
+
 
 async def get_current_database_name(database: str = None) -> str:
     """Get the name of the currently connected database.
@@ -37,7 +111,10 @@ async def get_current_database_name(database: str = None) -> str:
 
 
 async def get_db_connection(database: str = None) -> asyncpg.Connection:
-    """Create PostgreSQL database connection.
+    """Create a dedicated (non-pooled) PostgreSQL database connection.
+    
+    The caller owns the connection and must close it. Regular queries should
+    go through execute_query(), which borrows a connection from the pool.
     
     Args:
         database: Database name to connect to. If None, uses default from config.
@@ -55,6 +132,273 @@ async def get_db_connection(database: str = None) -> asyncpg.Connection:
         raise
 
 
+class _PoolEntry:
+    """A lazily created asyncpg pool and its usage bookkeeping."""
+
+    def __init__(self, task: "asyncio.Task[asyncpg.Pool]", size: int):
+        self.task = task
+        self.size = size
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.expires_at = self.last_used + POOL_CONFIG["max_lifetime"]
+
+    @property
+    def ready(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is None
+
+    def discard(self) -> None:
+        """Drop the pool without waiting (used when its event loop is gone)."""
+        if not self.task.done():
+            try:
+                self.task.cancel()
+            except RuntimeError:
+                pass  # owning loop already closed
+        elif self.ready:
+            self.task.result().terminate()
+
+    async def close(self) -> None:
+        """Close the pool gracefully."""
+        if self.ready:
+            try:
+                await self.task.result().close()
+            except Exception as e:
+                logger.debug(f"Error while closing connection pool: {e}")
+        elif not self.task.done():
+            self.task.cancel()
+
+
+class _PoolRegistry:
+    """Bounded LRU registry of per-database connection pools.
+    
+    Every pool reserves its max_size against POOL_CONFIG["max_total_connections"].
+    When a new database needs a pool and the budget is exhausted, the least
+    recently used idle pool is closed; pools unused for longer than
+    POOL_CONFIG["reap_timeout"] are closed as well.
+    """
+
+    def __init__(self):
+        self.entries: "OrderedDict[Tuple[str, int, str], _PoolEntry]" = OrderedDict()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._released: Optional[asyncio.Event] = None
+
+    def _bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        # asyncpg pools are bound to the loop they were created on
+        if self.loop is loop:
+            return
+        for entry in self.entries.values():
+            entry.discard()
+        self.entries.clear()
+        self.loop = loop
+        self._released = asyncio.Event()
+
+    def reserved(self) -> int:
+        """Number of connections reserved by open pools."""
+        return sum(entry.size for entry in self.entries.values())
+
+    async def _evict(self, key: Tuple[str, int, str], reason: str) -> None:
+        entry = self.entries.pop(key)
+        logger.debug(f"Closing connection pool for {key[0]}:{key[1]}/{key[2]} ({reason})")
+        await entry.close()
+
+    async def _reap_idle(self) -> None:
+        if POOL_CONFIG["reap_timeout"] <= 0:
+            return
+        cutoff = time.monotonic() - POOL_CONFIG["reap_timeout"]
+        for key, entry in list(self.entries.items()):
+            if entry.in_use == 0 and entry.last_used < cutoff and key in self.entries:
+                await self._evict(key, "idle")
+
+    async def _make_room(self, key: Tuple[str, int, str], size: int) -> None:
+        budget = POOL_CONFIG["max_total_connections"]
+        deadline = time.monotonic() + POOL_CONFIG["budget_wait_timeout"]
+        while key not in self.entries and self.reserved() + size > budget:
+            victim = next((k for k, e in self.entries.items() if e.in_use == 0), None)
+            if victim is not None:
+                await self._evict(victim, "least recently used")
+                continue
+            # Every pool is busy; wait until one of them is released
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(f"Connection budget exhausted ({budget} connections in use across {len(self.entries)} databases)")
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def checkout(self, config: Dict[str, Any]) -> _PoolEntry:
+        """Reserve the pool for a database, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        self._bind(loop)
+        key = (config["host"], config["port"], config["database"])
+
+        await self._reap_idle()
+        if key not in self.entries:
+            size = max(1, min(POOL_CONFIG["max_size"], POOL_CONFIG["max_total_connections"]))
+            await self._make_room(key, size)
+            if key not in self.entries:
+                self.entries[key] = _PoolEntry(loop.create_task(_create_pool(config, size)), size)
+
+        entry = self.entries[key]
+        self.entries.move_to_end(key)
+        entry.in_use += 1
+        try:
+            pool = await asyncio.shield(entry.task)
+            if POOL_CONFIG["max_lifetime"] > 0 and time.monotonic() >= entry.expires_at:
+                entry.expires_at = time.monotonic() + POOL_CONFIG["max_lifetime"]
+                await pool.expire_connections()
+        except Exception as e:
+            self.checkin(entry)
+            # Do not cache failures; the next call retries the connection
+            if self.entries.get(key) is entry and not entry.ready:
+                del self.entries[key]
+            logger.error(f"Failed to connect to PostgreSQL: {e}")
+            raise
+        return entry
+
+    def checkin(self, entry: _PoolEntry) -> None:
+        """Return a reservation taken by checkout()."""
+        entry.in_use -= 1
+        entry.last_used = time.monotonic()
+        if entry.in_use == 0 and self._released is not None:
+            self._released.set()
+
+    async def close_all(self) -> None:
+        entries = list(self.entries.values())
+        self.entries.clear()
+        for entry in entries:
+            if self.loop is asyncio.get_running_loop():
+                await entry.close()
+            else:
+                entry.discard()
+
+
+_pool_registry = _PoolRegistry()
+
+
+class _HotStatementCache:
+    """Prepared statements for the most frequently called tool queries.
+    
+    Hot queries are registered once (see version_compat.QueryRegistry) and
+    prepared on every new pooled connection by the pool's init hook, so the
+    first tool call on a connection skips parse/plan as well. Statements are
+    kept per connection object, so they go away with the connection and are
+    never handed to another backend or database.
+    """
+
+    def __init__(self):
+        self.queries: List[str] = []
+        self.statements: "weakref.WeakKeyDictionary[asyncpg.Connection, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.warmed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return POOL_CONFIG["statement_cache_size"] > 0
+
+    def register(self, query: str) -> None:
+        if query not in self.queries:
+            self.queries.append(query)
+
+    @staticmethod
+    def _connection(conn: asyncpg.Connection) -> asyncpg.Connection:
+        # Pool.acquire() hands out a new proxy each time; key on the wrapped connection
+        if isinstance(conn, asyncpg.pool.PoolConnectionProxy):
+            return conn._con
+        return conn
+
+    def _statements_for(self, conn: asyncpg.Connection) -> Dict[str, Any]:
+        return self.statements.setdefault(self._connection(conn), {})
+
+    async def warm(self, conn: asyncpg.Connection) -> None:
+        """Pool init hook: prepare every hot query on a new connection."""
+        statements = self.statements[self._connection(conn)] = {}
+        for query in self.queries:
+            try:
+                statements[query] = await conn.prepare(query)
+                self.warmed += 1
+            except Exception as e:
+                # Missing privileges etc. only cost the warmup, not the connection
+                logger.debug(f"Statement warmup skipped: {e}")
+
+    async def fetch(self, conn: asyncpg.Connection, query: str, params: List) -> List[asyncpg.Record]:
+        if not self.enabled or query not in self.queries:
+            return await conn.fetch(query, *params)
+        statements = self._statements_for(conn)
+        statement = statements.get(query)
+        if statement is None:
+            self.misses += 1
+            statement = statements[query] = await conn.prepare(query)
+        else:
+            self.hits += 1
+        return await statement.fetch(*params)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hot_queries": len(self.queries),
+            "warmed": self.warmed,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio_percent": round(100.0 * self.hits / lookups, 2) if lookups else 0.0,
+        }
+
+
+_hot_statements = _HotStatementCache()
+
+
+def register_hot_query(query: str) -> None:
+    """Mark a query to be prepared on every pooled connection."""
+    _hot_statements.register(query)
+
+
+def get_statement_cache_stats() -> Dict[str, Any]:
+    """Return warmup and hit/miss counters of the hot statement cache."""
+    return _hot_statements.stats()
+
+
+async def _create_pool(config: Dict[str, Any], size: int) -> asyncpg.Pool:
+    """Open a new asyncpg pool for the given connection config."""
+    init = None
+    if POOL_CONFIG["statement_warmup"] and _hot_statements.enabled and _hot_statements.queries:
+        init = _hot_statements.warm
+    pool = await asyncpg.create_pool(
+        min_size=min(POOL_CONFIG["min_size"], size),
+        max_size=size,
+        max_inactive_connection_lifetime=POOL_CONFIG["idle_timeout"],
+        statement_cache_size=POOL_CONFIG["statement_cache_size"],
+        init=init,
+        **config,
+    )
+    logger.debug(f"Created connection pool for {config['host']}:{config['port']}/{config['database']}")
+    return pool
+
+
+@asynccontextmanager
+async def acquire_connection(database: str = None) -> AsyncIterator[asyncpg.Connection]:
+    """Borrow a pooled connection for the duration of an ``async with`` block.
+    
+    Args:
+        database: Database name to connect to. If None, uses default from config.
+    """
+    config = POSTGRES_CONFIG.copy()
+    if database:
+        config["database"] = database
+
+    entry = await _pool_registry.checkout(config)
+    try:
+        async with entry.task.result().acquire() as conn:
+            yield conn
+    finally:
+        _pool_registry.checkin(entry)
+
+
+async def close_db_pools() -> None:
+    """Close all connection pools (called on server shutdown)."""
+    await _pool_registry.close_all()
+
+
 async def execute_query(query: str, params: Optional[List] = None, database: str = None) -> List[Dict[str, Any]]:
     """Execute query and return results.
     
@@ -63,13 +407,9 @@ async def execute_query(query: str, params: Optional[List] = None, database: str
         params: Query parameters
         database: Database name to connect to. If None, uses default from config.
     """
-    conn = None
     try:
-        conn = await get_db_connection(database)
-        if params:
-            rows = await conn.fetch(query, *params)
-        else:
-            rows = await conn.fetch(query)
+        async with acquire_connection(database) as conn:
+            rows = await _hot_statements.fetch(conn, query, params or [])
         
         # Convert Record to Dict
         result = []
@@ -83,9 +423,6 @@ async def execute_query(query: str, params: Optional[List] = None, database: str
         logger.error(f"Query execution failed: {e}")
         logger.debug(f"Failed query: {query}")
         raise
-    finally:
-        if conn:
-            await conn.close()
 
 
 async def execute_single_query(query: str, params: Optional[List] = None, database: str = None) -> Optional[Dict[str, Any]]:
@@ -100,6 +437,73 @@ async def execute_single_query(query: str, params: Optional[List] = None, databa
     return results[0] if results else None
 
 
+async def stream_query(query: str, params: Optional[List] = None, database: str = None,
+                       limit: Optional[int] = None) -> AsyncIterator[asyncpg.Record]:
+    """Yield rows from a server-side cursor, one batch in memory at a time.
+    
+    The connection stays checked out until the generator is exhausted or
+    closed, so consume it promptly (or wrap it in ``contextlib.aclosing``).
+    
+    Args:
+        query: SQL query to execute (read-only; it runs in a read-only transaction)
+        params: Query parameters
+        database: Database name to connect to. If None, uses default from config.
+        limit: Stop after this many rows (None streams the whole result)
+    """
+    if limit is not None and limit <= 0:
+        return
+    async with acquire_connection(database) as conn:
+        async with conn.transaction(readonly=True):
+            count = 0
+            async for row in conn.cursor(query, *(params or []), prefetch=POOL_CONFIG["stream_batch_rows"]):
+                yield row
+                count += 1
+                if count == limit:
+                    break
+
+
+async def gather_with_limit(*aws: Awaitable[Any], limit: Optional[int] = None) -> List[Any]:
+    """Run independent awaitables concurrently and return their results in order.
+    
+    Args:
+        *aws: Coroutines to run (e.g. execute_query calls)
+        limit: Maximum number running at once (defaults to POOL_CONFIG["tool_concurrency"])
+    """
+    if limit is None:
+        limit = POOL_CONFIG["tool_concurrency"]
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run(aw: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(_run(aw) for aw in aws))
+
+
+async def execute_queries(queries: List[Union[str, Tuple[str, Optional[List]]]], database: str = None, limit: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """Execute independent queries concurrently on pooled connections.
+    
+    Latency is that of the slowest query instead of the sum of all of them.
+    
+    Args:
+        queries: SQL strings or (query, params) tuples
+        database: Database name to connect to. If None, uses default from config.
+        limit: Maximum number of queries in flight (capped by the pool size)
+    
+    Returns:
+        One result list per query, in the same order as ``queries``
+    """
+    if limit is None:
+        limit = POOL_CONFIG["tool_concurrency"]
+    limit = min(limit, POOL_CONFIG["max_size"])
+
+    calls = []
+    for item in queries:
+        query, params = (item, None) if isinstance(item, str) else item
+        calls.append(execute_query(query, params, database=database))
+    return await gather_with_limit(*calls, limit=limit)
+
+
 def format_bytes(bytes_value: Union[int, float, None]) -> str:
     """Format byte values into human-readable format."""
     if bytes_value is None:
@@ -127,63 +531,792 @@ def format_duration(seconds: Union[int, float, None]) -> str:
         return f"{seconds/3600:.2f}h"
 
 
-def format_table_data(data: List[Dict[str, Any]], title: str = "") -> str:
-    """Convert table data into formatted string."""
+# Column kinds of a result's column plan
+_PLAIN, _BYTES, _DURATION = 0, 1, 2
+
+_CELL_FORMATTERS = {
+    _PLAIN: str,
+    _BYTES: lambda value: format_bytes(value) if isinstance(value, (int, float)) else str(value),
+    _DURATION: lambda value: format_duration(value) if isinstance(value, (int, float)) else str(value),
+}
+
+# format_bytes in closed form: values at or above 1024**k use unit k (a NaN
+# compares false everywhere and ends up in PB, as in the division loop)
+_BYTE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+_BYTE_BOUNDS = tuple(1024.0 ** k for k in range(1, 6))
+_BYTE_SCALES = tuple(1024.0 ** k for k in range(6))
+_NUMERIC_TYPES = {int, float, bool}
+
+
+def _format_bytes_column(values: Sequence[Any]) -> List[str]:
+    """format_bytes for a column of numbers (None -> "NULL"), the unit found by bisection."""
+    numbers = [0.0 if v is None else float(v) for v in values]
+    units = [bisect_right(_BYTE_BOUNDS, n) for n in numbers]
+    scaled = [n / _BYTE_SCALES[u] for n, u in zip(numbers, units)]
+    return [
+        "NULL" if v is None else f"{x:.2f} {_BYTE_UNITS[u]}"
+        for v, x, u in zip(values, scaled, units)
+    ]
+
+
+def _format_duration_column(values: Sequence[Any]) -> List[str]:
+    """format_duration for a column of numbers (None -> "NULL")."""
+    seconds = [0.0 if v is None else float(v) for v in values]
+    minutes, hours = [s / 60 for s in seconds], [s / 3600 for s in seconds]
+    return [
+        "NULL" if v is None else f"{s:.2f}s" if s < 60 else f"{m:.2f}m" if s < 3600 else f"{h:.2f}h"
+        for v, s, m, h in zip(values, seconds, minutes, hours)
+    ]
+
+
+_COLUMN_FORMATTERS = {_BYTES: _format_bytes_column, _DURATION: _format_duration_column}
+
+
+class _ColumnPlan:
+    """How each column of a result is rendered, decided once from the column names.
+    
+    Numeric *_bytes/_size columns become human-readable sizes and numeric
+    *_time/_duration columns durations; everything else is str(). Rows are
+    read positionally with values(), so asyncpg Records are formatted
+    without a dict copy (all rows of a result share the first row's columns).
+    Columns are converted a whole batch at a time, sizes and durations in bulk.
+    """
+    
+    __slots__ = ("headers", "kinds", "cells")
+    
+    def __init__(self, headers: List[str]):
+        self.headers = headers
+        self.kinds = [
+            _BYTES if key.endswith(('_bytes', '_size')) else _DURATION if key.endswith(('_time', '_duration')) else _PLAIN
+            for key in headers
+        ]
+        # One converter per column; plain columns go straight to str()
+        self.cells = [_CELL_FORMATTERS[kind] for kind in self.kinds]
+    
+    def record(self, row: Mapping[str, Any]) -> List[Tuple[str, str]]:
+        return [
+            (key, str(value if value is None else cell(value)))
+            for key, cell, value in zip(self.headers, self.cells, row.values())
+        ]
+    
+    def column(self, kind: int, cell: Callable[[Any], str], values: Sequence[Any]) -> List[str]:
+        if kind and {type(v) for v in values} - {type(None)} <= _NUMERIC_TYPES:
+            return _COLUMN_FORMATTERS[kind](values)
+        # Plain columns, and size/duration columns holding e.g. Decimal or text
+        return ["NULL" if value is None else cell(value) for value in values]
+    
+    def columns(self, rows: Sequence[Mapping[str, Any]]) -> List[List[str]]:
+        columns = zip(*[tuple(row.values()) for row in rows])
+        return [self.column(kind, cell, values) for kind, cell, values in zip(self.kinds, self.cells, columns)]
+
+
+class OutputBudget:
+    """Bytes of text one tool response has used so far (see output_budget)."""
+    
+    __slots__ = ("max_bytes", "used", "spent")
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.spent = False
+    
+    def charge(self, text: str, full: bool = False) -> None:
+        """Count a block of the response; full marks a table cut off by the budget."""
+        # Blocks are joined by a blank line
+        self.used += (len(text) if text.isascii() else len(text.encode("utf-8"))) + 2
+        self.spent = self.spent or full or self.used >= self.max_bytes
+
+
+# Budget shared by every table rendered for the current tool response
+_output_budget: ContextVar[Optional[OutputBudget]] = ContextVar("output_budget", default=None)
+
+
+@contextmanager
+def output_budget() -> Iterator[Optional[OutputBudget]]:
+    """Make the tables rendered inside the block share one OUTPUT_CONFIG["max_bytes"] budget.
+    
+    Each table starts where the previous one left off, so a response that
+    joins several tables stays within the limit as a whole. Nested blocks
+    reuse the active budget. Yields None when the limit is disabled or the
+    tool collects tables for machine-readable output.
+    """
+    budget = _output_budget.get()
+    if budget is not None or not OUTPUT_CONFIG["max_bytes"] or _result_tables.get() is not None:
+        yield budget
+        return
+    budget = OutputBudget(OUTPUT_CONFIG["max_bytes"])
+    token = _output_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _output_budget.reset(token)
+
+
+def output_limit_note(dropped: Optional[int], shown: int, unit: str, max_bytes: int) -> str:
+    """Summary line for output left out once max_bytes was reached (dropped=None: count unknown)."""
+    count = "" if dropped is None else f"{dropped} "
+    plural = "s" if dropped != 1 else ""
+    return (f"... {count}more {unit}{plural} not shown "
+            f"(output limit of {max_bytes} bytes reached after {shown} {unit}s; "
+            f"narrow the request or raise POSTGRES_OUTPUT_MAX_BYTES)")
+
+
+class TableRenderer:
+    """Aligned text table with a per-cell width cap and an output budget.
+    
+    Rows are added in batches (a whole result, or one cursor batch when
+    streaming). Column widths are fixed by the first batch; later cells that
+    are wider simply overflow their column. Every line is checked against
+    max_bytes as it is rendered, the header and separator included: once the
+    next line does not fit, rendering stops and further rows are only
+    counted in ``dropped``, which text() reports in a summary line. A caller
+    that stops reading rows at that point sets ``unread`` so the summary
+    does not claim an exact count. Without an explicit max_bytes, a table
+    rendered inside output_budget() starts with what the response has
+    already used; if not even its title fits, the table is reduced to the
+    summary line, which then names it.
+    """
+    
+    def __init__(self, title: str = "", max_bytes: Optional[int] = None, max_cell_width: Optional[int] = None):
+        budget = _output_budget.get() if max_bytes is None else None
+        self.title = title
+        self.lines: List[str] = []
+        self.max_bytes = OUTPUT_CONFIG["max_bytes"] if max_bytes is None else max_bytes
+        self.max_cell_width = OUTPUT_CONFIG["max_cell_width"] if max_cell_width is None else max_cell_width
+        self.used = budget.used if budget is not None else 0
+        self.plan: Optional[_ColumnPlan] = None
+        self.template: Optional[str] = None
+        self.shown = 0
+        self.dropped = 0
+        self.unread = False
+        self.unit = "row"
+        # A table without room for its title gets no room for rows either
+        self.untitled = bool(title) and not self._take(f"=== {title} ===\n")
+        if title and not self.untitled:
+            self.lines.append(f"=== {title} ===\n")
+    
+    @property
+    def full(self) -> bool:
+        return self.dropped > 0 or self.untitled
+    
+    def _fit(self, cell: str) -> str:
+        # One line per row; long values (query texts) are cut to the cap
+        if "\n" in cell or "\r" in cell or "\t" in cell:
+            cell = " ".join(cell.split())
+        cap = self.max_cell_width
+        if cap and len(cell) > cap:
+            cell = cell[:max(cap - 3, 1)] + "..."
+        return cell
+    
+    def _fit_column(self, cells: List[str]) -> List[str]:
+        cap = self.max_cell_width or None
+        fit = self._fit
+        return [cell if (cap is None or len(cell) <= cap) and cell.isprintable() else fit(cell) for cell in cells]
+    
+    def _take(self, line: str) -> bool:
+        size = (len(line) if line.isascii() else len(line.encode("utf-8"))) + 1
+        if self.max_bytes and self.used + size > self.max_bytes:
+            return False
+        self.used += size
+        return True
+    
+    def record(self, row: Mapping[str, Any]) -> None:
+        """Render a single row as key: value lines (fields that do not fit are counted in dropped)."""
+        self.unit = "field"
+        if self.untitled:
+            self.dropped += len(row)
+            return
+        self.plan = _ColumnPlan(list(row.keys()))
+        for key, value in self.plan.record(row):
+            line = f"{key}: {self._fit(value)}"
+            if not self._take(line):
+                self.dropped += 1
+                continue
+            self.lines.append(line)
+            self.shown += 1
+    
+    def add(self, rows: Sequence[Mapping[str, Any]]) -> bool:
+        """Render rows; returns False once the budget is used up (later rows are only counted)."""
+        if self.full:
+            self.dropped += len(rows)
+            return False
+        if not rows:
+            return True
+        if self.plan is None:
+            self.plan = _ColumnPlan(list(rows[0].keys()))
+        # Sizes and durations are always short; only plain columns need fitting
+        columns = [cells if kind else self._fit_column(cells)
+                   for kind, cells in zip(self.plan.kinds, self.plan.columns(rows))]
+        if self.template is None:
+            headers = self.plan.headers
+            widths = [max(len(header), max(map(len, cells), default=0)) for header, cells in zip(headers, columns)]
+            # The last column is not padded
+            self.template = " | ".join([f"{{:<{width}}}" for width in widths[:-1]] + ["{}"])
+            header = self.template.format(*headers)
+            separator = "-" * (sum(widths) + len(widths) * 3 - 3)
+            for line in (header, separator):
+                if not self._take(line):
+                    self.dropped += len(rows)
+                    return False
+                self.lines.append(line)
+        for index, line in enumerate(map(self.template.format, *columns)):
+            if not self._take(line):
+                self.dropped += len(rows) - index
+                return False
+            self.lines.append(line)
+            self.shown += 1
+        return True
+    
+    def text(self) -> str:
+        lines = self.lines
+        if self.dropped:
+            dropped = None if self.unread else self.dropped
+            note = output_limit_note(dropped, self.shown, self.unit, self.max_bytes)
+            lines = lines + [f"{self.title}: {note}" if self.untitled else note]
+        return "\n".join(lines)
+    
+    def finish(self) -> str:
+        """text(), charged to the response budget when one is active."""
+        text = self.text()
+        budget = _output_budget.get()
+        if budget is not None:
+            budget.charge(text, self.full)
+        return text
+
+
+def format_table_data(data: Sequence[Mapping[str, Any]], title: str = "") -> str:
+    """Convert table data (dicts or asyncpg Records) into an aligned text table.
+    
+    Cells are capped at OUTPUT_CONFIG["max_cell_width"] characters and the
+    output at OUTPUT_CONFIG["max_bytes"], shared with the other tables of
+    the response (see output_budget); rows beyond the budget are replaced
+    by a summary line (see TableRenderer).
+    """
+    tables = _result_tables.get()
+    if tables is not None:
+        tables.append(ResultTable(title, data))
+        return ""
     if not data:
         return f"No data found{' for ' + title if title else ''}"
     
-    result = []
-    if title:
-        result.append(f"=== {title} ===\n")
-    
+    renderer = TableRenderer(title)
     # Format as table
     if len(data) == 1:
         # Display single record as key-value pairs
-        for key, value in data[0].items():
-            if isinstance(value, (int, float)) and key.endswith(('_bytes', '_size')):
-                value = format_bytes(value)
-            elif isinstance(value, (int, float)) and key.endswith(('_time', '_duration')):
-                value = format_duration(value)
-            result.append(f"{key}: {value}")
+        renderer.record(data[0])
     else:
-        # Display multiple records as table format
-        headers = list(data[0].keys())
-        
-        # Add headers
-        result.append(" | ".join(headers))
-        result.append("-" * (sum(len(h) for h in headers) + len(headers) * 3 - 1))
-        
-        # Add data rows
-        for row in data:
-            formatted_row = []
-            for key, value in row.items():
-                if isinstance(value, (int, float)) and key.endswith(('_bytes', '_size')):
-                    formatted_row.append(format_bytes(value))
-                elif isinstance(value, (int, float)) and key.endswith(('_time', '_duration')):
-                    formatted_row.append(format_duration(value))
-                else:
-                    formatted_row.append(str(value) if value is not None else "NULL")
-            result.append(" | ".join(formatted_row))
+        renderer.add(data)
+    return renderer.finish()
+
+
+async def format_table_stream(rows: AsyncIterable[Mapping[str, Any]], title: str = "",
+                              max_rows: Optional[int] = None) -> str:
+    """Like format_table_data, but formats rows (asyncpg Records or dicts) as they arrive.
+    
+    Rows are rendered in batches of POOL_CONFIG["stream_batch_rows"], so
+    only one batch is held besides the output text. Once the output budget
+    is used up no further rows are read. With max_rows, at most max_rows
+    rows are read (plus one to tell whether the result was cut off).
+    """
+    tables = _result_tables.get()
+    if tables is not None:
+        tables.append(await ResultTable.collect(title, rows, max_rows))
+        return ""
+    iterator = aiter(rows)
+    first = await anext(iterator, None)
+    if first is None:
+        return f"No data found{' for ' + title if title else ''}"
+    renderer = TableRenderer(title)
+    second = await anext(iterator, None)
+    if second is None:
+        renderer.record(first)
+        return renderer.finish()
+
+    batch_size = max(2, POOL_CONFIG["stream_batch_rows"])
+    batch = [first, second]
+    total = 0
+    capped = False
+    exhausted = False
+    while True:
+        wanted = batch_size if max_rows is None else min(batch_size, max_rows + 1 - total)
+        while len(batch) < wanted and not exhausted:
+            row = await anext(iterator, None)
+            if row is None:
+                exhausted = True
+            else:
+                batch.append(row)
+        if not batch:
+            break
+        if max_rows is not None and total + len(batch) > max_rows:
+            renderer.add(batch[:max_rows - total])
+            capped = True
+            break
+        if not renderer.add(batch):
+            # Output budget spent; leave the rest of the result unread
+            renderer.unread = not exhausted
+            break
+        total += len(batch)
+        batch = []
+    text = renderer.finish()
+    if capped:
+        text += f"\n... more rows not shown (result capped at {max_rows} rows)"
+    return text
+
+
+async def stream_table_data(query: str, params: Optional[List] = None, title: str = "",
+                            database: str = None, max_rows: Optional[int] = None) -> str:
+    """Run a query and format its rows straight from the cursor.
+    
+    Peak memory is one cursor batch (POSTGRES_STREAM_BATCH_ROWS) instead of
+    the full result as Records plus dicts. max_rows defaults to
+    POOL_CONFIG["max_result_rows"] (0 disables the cap).
+    """
+    if max_rows is None:
+        max_rows = POOL_CONFIG["max_result_rows"] or None
+    limit = max_rows + 1 if max_rows is not None else None
+    async with aclosing(stream_query(query, params, database=database, limit=limit)) as rows:
+        return await format_table_stream(rows, title, max_rows)
+
+
+OUTPUT_FORMATS = ("text", "json", "csv", "ndjson")
+
+# Tables collected instead of rendered while a tool runs with a
+# machine-readable output_format (see structured_output)
+_result_tables: ContextVar[Optional[List["ResultTable"]]] = ContextVar("result_tables", default=None)
+# Top-level fields (e.g. a paging cursor) recorded next to the tables
+_result_fields: ContextVar[Optional[Dict[str, Any]]] = ContextVar("result_fields", default=None)
+
+
+class ResultTable:
+    """One result table of a tool call, kept as typed values for serialization."""
+    
+    __slots__ = ("title", "columns", "rows", "truncated")
+    
+    def __init__(self, title: str, data: Sequence[Mapping[str, Any]], truncated: bool = False):
+        self.title = title
+        self.columns = list(data[0].keys()) if data else []
+        self.rows = [tuple(row.values()) for row in data]
+        self.truncated = truncated
+    
+    @classmethod
+    async def collect(cls, title: str, rows: AsyncIterable[Mapping[str, Any]],
+                      max_rows: Optional[int] = None) -> "ResultTable":
+        data = []
+        async for row in rows:
+            if max_rows is not None and len(data) >= max_rows:
+                return cls(title, data, truncated=True)
+            data.append(row)
+        return cls(title, data)
     
-    return "\n".join(result)
+    def as_dict(self) -> Dict[str, Any]:
+        return {"title": self.title, "columns": self.columns, "rows": self.rows, "truncated": self.truncated}
+
+
+def collecting_result_tables() -> bool:
+    """True while a tool runs with a machine-readable output_format."""
+    return _result_tables.get() is not None
+
+
+def add_result_table(title: str, data: Sequence[Mapping[str, Any]]) -> None:
+    """Record rows for machine-readable output of a tool that renders its own text."""
+    tables = _result_tables.get()
+    if tables is not None:
+        tables.append(ResultTable(title, data))
+
+
+def add_result_field(name: str, value: Any) -> None:
+    """Record a top-level field of machine-readable output, e.g. the cursor of the next page."""
+    fields = _result_fields.get()
+    if fields is not None:
+        fields[name] = value
+
+
+def _json_default(value: Any) -> Any:
+    """Typed JSON for what asyncpg decodes beyond the JSON types.
+    
+    Numerics stay numbers (integral values exactly), intervals become
+    seconds, timestamps ISO 8601 strings. LSNs already arrive as integers.
+    """
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return None
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def _dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (str, int, float, Decimal)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple, dict)):
+        return _dumps(value)
+    return _json_default(value)
+
+
+def serialize_result(output_format: str, tables: List[ResultTable], text: str,
+                     fields: Optional[Dict[str, Any]] = None) -> str:
+    """Serialize the tables a tool produced, with the text around them as notes.
+    
+    Output without tables, and errors, are passed on as text or error.
+    """
+    fields = fields or {}
+    if not tables or text.startswith("Error"):
+        key = "error" if text.startswith("Error") else "text"
+        if output_format == "csv":
+            return text
+        return _dumps({key: text, **fields})
+    # Summaries, recommendations and footers the tool printed around its tables
+    notes = [line.strip() for line in text.splitlines() if line.strip()]
+    if output_format == "json":
+        return _dumps({"tables": [table.as_dict() for table in tables], **fields, "notes": notes})
+    if output_format == "ndjson":
+        lines = []
+        for table in tables:
+            columns = table.columns
+            lines.extend(_dumps({"_table": table.title, **dict(zip(columns, row))}) for row in table.rows)
+            if table.truncated:
+                lines.append(_dumps({"_table": table.title, "_truncated": True}))
+        if fields or notes:
+            lines.append(_dumps({**{f"_{name}": value for name, value in fields.items()}, "_notes": notes}))
+        return "\n".join(lines)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for index, table in enumerate(tables):
+        if len(tables) > 1:
+            # Several tables: each starts with a comment line naming it
+            buffer.write(("\n" if index else "") + f"# {table.title}\n")
+        if table.columns:
+            writer.writerow(table.columns)
+        writer.writerows([_csv_value(value) for value in row] for row in table.rows)
+        if table.truncated:
+            buffer.write("# truncated\n")
+    for name, value in fields.items():
+        buffer.write(f"# {name}: {'' if value is None else value}\n")
+    for note in notes:
+        buffer.write(f"# {note}\n")
+    return buffer.getvalue()
+
+
+def structured_output(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Add an ``output_format`` argument ("text", "json", "csv", "ndjson") to a tool.
+    
+    Apply directly to the tool function, below ``@cached_tool`` so cached
+    results are keyed by format. Text output shares one output budget
+    across all tables of the call (see output_budget). With a
+    machine-readable format, every format_table_data/format_table_stream
+    call in the tool records its rows instead of rendering them, and the
+    recorded tables are serialized with typed values (orjson when installed). The tool's remaining text lines
+    are returned as notes, and fields recorded with add_result_field at the
+    top level.
+    """
+    signature = inspect.signature(func)
+    parameter = inspect.Parameter("output_format", inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                                  default="text", annotation=str)
+    
+    @functools.wraps(func)
+    async def wrapper(*args: Any, output_format: str = "text", **kwargs: Any) -> str:
+        if output_format == "text":
+            with output_budget():
+                return await func(*args, **kwargs)
+        if output_format not in OUTPUT_FORMATS:
+            return f"Error: output_format must be one of {', '.join(OUTPUT_FORMATS)}"
+        tables: List[ResultTable] = []
+        fields: Dict[str, Any] = {}
+        tables_token, fields_token = _result_tables.set(tables), _result_fields.set(fields)
+        try:
+            text = await func(*args, **kwargs)
+        finally:
+            _result_tables.reset(tables_token)
+            _result_fields.reset(fields_token)
+        return serialize_result(output_format, tables, text, fields)
+    
+    wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), parameter])
+    wrapper.__annotations__ = {**func.__annotations__, "output_format": str}
+    return wrapper
+
+
+class _ToolResultCache:
+    """TTL cache of tool results with single-flight loading.
+    
+    Entries are keyed by (host, port, tool name, arguments) and evicted when
+    they expire or, least recently used first, when the cache exceeds
+    max_entries or max_bytes. Identical calls that arrive while a result is
+    being computed wait for that one computation instead of starting their own.
+    
+    Entries stored with max_stale > 0 outlive their TTL by that many seconds:
+    a stale entry is returned immediately, labelled with its age, while a
+    background refresh replaces it (stale-while-revalidate).
+    """
+
+    def __init__(self):
+        # key -> (stored_at, fresh_until, keep_until, result)
+        self.entries: "OrderedDict[Tuple[Any, ...], Tuple[float, float, float, str]]" = OrderedDict()
+        self.size_bytes = 0
+        self.inflight: Dict[Tuple[Any, ...], asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[Tuple[float, float, float, str]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[2]:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[Any, ...], result: str, ttl: float, max_stale: float = 0) -> None:
+        self._remove(key)
+        size = len(result)
+        if size > TOOL_CACHE_CONFIG["max_bytes"]:
+            return
+        now = time.monotonic()
+        self.entries[key] = (now, now + ttl, now + ttl + max_stale, result)
+        self.size_bytes += size
+        self._evict()
+
+    def _remove(self, key: Tuple[Any, ...]) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[3])
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if now >= entry[2]]:
+            self._remove(key)
+        while self.entries and (len(self.entries) > TOOL_CACHE_CONFIG["max_entries"]
+                                or self.size_bytes > TOOL_CACHE_CONFIG["max_bytes"]):
+            self._remove(next(iter(self.entries)))
+
+    def _load(self, key: Tuple[Any, ...], ttl: float, max_stale: float,
+              call: Callable[[], Awaitable[str]]) -> Tuple[asyncio.Task, bool]:
+        """Return the in-flight computation for key, starting one if needed."""
+        task = self.inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task, False
+
+        task = asyncio.ensure_future(call())
+        self.inflight[key] = task
+
+        def _store(done: asyncio.Task) -> None:
+            if self.inflight.get(key) is done:
+                del self.inflight[key]
+            if done.cancelled() or done.exception() is not None:
+                return
+            result = done.result()
+            # Tools report failures as "Error ..." strings; never cache those
+            # (a stale entry is kept instead)
+            if isinstance(result, str) and not result.startswith("Error"):
+                self.put(key, result, ttl, max_stale)
+
+        task.add_done_callback(_store)
+        return task, True
+
+    async def get_or_call(self, key: Tuple[Any, ...], ttl: float, call: Callable[[], Awaitable[str]],
+                          max_stale: float = 0) -> str:
+        entry = self.get(key)
+        if entry is not None:
+            stored_at, fresh_until, _, result = entry
+            if time.monotonic() < fresh_until:
+                self.hits += 1
+                return result
+            # Stale but within max_stale: answer now, refresh in the background
+            self.stale_hits += 1
+            self._load(key, ttl, max_stale, call)
+            age = int(time.monotonic() - stored_at)
+            return f"[Cached result computed {age}s ago; a refresh is running in the background]\n{result}"
+
+        task, started = self._load(key, ttl, max_stale, call)
+        if started:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size_bytes = 0
+
+
+_tool_cache = _ToolResultCache()
+
+
+def cached_tool(ttl: float, stale_while_revalidate: bool = False,
+                fingerprint: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None,
+                ) -> Callable[[Callable[..., Awaitable[str]]], Callable[..., Awaitable[str]]]:
+    """Cache an MCP tool's result for ttl seconds per distinct arguments.
+    
+    Apply below ``@mcp.tool()`` so the tool's signature and docstring are
+    kept. Arguments are normalized by binding them to the signature with
+    defaults applied, so ``f()`` and ``f(database_name=None)`` share an
+    entry. POSTGRES_TOOL_CACHE_TTLS overrides ttl per tool name.
+    
+    With stale_while_revalidate, expired results keep being served for up
+    to TOOL_CACHE_CONFIG["max_stale"] seconds (opt-in; 0 disables) while
+    a fresh result is computed in the background.
+    
+    fingerprint is awaited with the bound arguments and its value becomes
+    part of the key, so a new value (e.g. after DDL, see
+    catalog.catalog_fingerprint) makes earlier results unreachable before
+    their TTL runs out.
+    """
+    def decorator(func: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> str:
+            tool_ttl = TOOL_CACHE_CONFIG["ttl_overrides"].get(func.__name__, ttl)
+            if not TOOL_CACHE_CONFIG["enabled"] or tool_ttl <= 0:
+                return await func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (
+                POSTGRES_CONFIG["host"], POSTGRES_CONFIG["port"], func.__name__,
+                tuple(sorted((name, repr(value)) for name, value in bound.arguments.items())),
+            )
+            if fingerprint is not None:
+                key += (await fingerprint(bound.arguments),)
+            max_stale = TOOL_CACHE_CONFIG["max_stale"] if stale_while_revalidate else 0
+            if bound.arguments.get("output_format", "text") != "text":
+                # The age label would break machine-readable output; serve it fresh
+                max_stale = 0
+            return await _tool_cache.get_or_call(key, tool_ttl, lambda: func(*args, **kwargs), max_stale)
+
+        return wrapper
+    return decorator
+
+
+def clear_tool_cache() -> None:
+    """Drop all cached tool results."""
+    _tool_cache.clear()
+
+
+# Server facts that tools used to probe one query at a time
+CAPABILITY_SNAPSHOT_QUERY = """
+SELECT
+    version() AS version,
+    current_setting('server_version_num')::int AS server_version_num,
+    current_database() AS database_name,
+    pg_is_in_recovery() AS in_recovery,
+    COALESCE(
+        (SELECT json_object_agg(extname, extversion) FROM pg_extension),
+        '{}'::json
+    ) AS extensions,
+    COALESCE(
+        (SELECT json_object_agg(name, setting) FROM pg_settings
+         WHERE name IN (
+             'max_connections', 'shared_preload_libraries', 'server_encoding',
+             'track_activities', 'track_counts', 'track_io_timing',
+             'track_functions', 'wal_level', 'summarize_wal', 'io_method'
+         )),
+        '{}'::json
+    ) AS settings,
+    COALESCE(
+        (SELECT json_object_agg(relname, columns) FROM (
+            SELECT c.relname, json_agg(a.attname ORDER BY a.attnum) AS columns
+            FROM pg_class c
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE c.relnamespace = 'pg_catalog'::regnamespace
+              AND c.relname IN (
+                  'pg_stat_activity', 'pg_stat_database', 'pg_stat_user_tables',
+                  'pg_stat_bgwriter', 'pg_stat_checkpointer', 'pg_stat_io',
+                  'pg_stat_wal_receiver', 'pg_replication_slots',
+                  'pg_stat_replication_slots', 'pg_wait_events', 'pg_aios'
+              )
+            GROUP BY c.relname
+        ) catalog),
+        '{}'::json
+    ) AS catalog_columns
+"""
+
+# Capability snapshots keyed by (host, port, database): (expires_at, snapshot)
+_capability_cache: Dict[Tuple[str, int, str], Tuple[float, Dict[str, Any]]] = {}
+_capability_tasks: Dict[Tuple[str, int, str], asyncio.Task] = {}
+
+
+async def _load_server_capabilities(database: str = None) -> Dict[str, Any]:
+    row = await execute_single_query(CAPABILITY_SNAPSHOT_QUERY, database=database)
+    snapshot = dict(row)
+    # asyncpg returns json columns as text
+    for column in ("extensions", "settings", "catalog_columns"):
+        if isinstance(snapshot[column], str):
+            snapshot[column] = json.loads(snapshot[column])
+    return snapshot
+
+
+async def get_server_capabilities(database: str = None, force_refresh: bool = False) -> Dict[str, Any]:
+    """Return version, extensions, key settings and recovery state in one snapshot.
+    
+    The snapshot is read with a single query and reused for CAPABILITY_TTL
+    seconds; concurrent callers share one in-flight query.
+    
+    Args:
+        database: Database to inspect (extensions are per database)
+        force_refresh: Ignore the cached snapshot
+    
+    Returns:
+        Dict with version, server_version_num, database_name, in_recovery,
+        extensions (name -> version), settings (name -> value) and
+        catalog_columns (catalog view -> column names)
+    """
+    key = (POSTGRES_CONFIG["host"], POSTGRES_CONFIG["port"], database or POSTGRES_CONFIG["database"])
+    cached = _capability_cache.get(key)
+    if cached is not None and not force_refresh and time.monotonic() < cached[0]:
+        return cached[1]
+
+    task = _capability_tasks.get(key)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_load_server_capabilities(database))
+        _capability_tasks[key] = task
+    try:
+        snapshot = await asyncio.shield(task)
+    finally:
+        if _capability_tasks.get(key) is task and task.done():
+            del _capability_tasks[key]
+
+    _capability_cache[key] = (time.monotonic() + CAPABILITY_TTL, snapshot)
+    return snapshot
 
 
 async def get_server_version() -> str:
     """Return PostgreSQL server version."""
     try:
-        result = await execute_single_query("SELECT version()")
-        return result["version"] if result else "Unknown"
+        capabilities = await get_server_capabilities()
+        return capabilities["version"] or "Unknown"
     except Exception as e:
         logger.error(f"Failed to get server version: {e}")
         return f"Error: {e}"
 
 
-async def check_extension_exists(extension_name: str) -> bool:
-    """Check if extension is installed."""
+async def check_extension_exists(extension_name: str, database: str = None) -> bool:
+    """Check if extension is installed.
+    
+    Args:
+        extension_name: Extension to look for
+        database: Database to check (uses default if omitted)
+    """
     try:
-        query = "SELECT 1 FROM pg_extension WHERE extname = $1"
-        result = await execute_single_query(query, [extension_name])
-        return result is not None
+        capabilities = await get_server_capabilities(database)
+        return extension_name in capabilities["extensions"]
     except Exception:
         return False
 
@@ -0,0 +1,320 @@
+"""
+Lock Wait Graph
+
+Builds the wait-for graph of blocked sessions from pg_blocking_pids() and
+analyzes it in Python (root blockers, chain depth, victim counts) instead of
+self-joining pg_locks, which gets slow exactly when the lock table is huge.
+LockWatcher keeps the last graph so repeated polls report only what changed.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from . import functions
+from .functions import execute_query, format_table_data, output_budget
+from .version_compat import PostgreSQLVersion, query_registry
+
+logger = logging.getLogger(__name__)
+
+
+@query_registry.template("blocking_sessions", warmup=True)
+def _blocking_sessions_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # pg_blocking_pids() is only evaluated for sessions waiting on a heavyweight
+    # lock; their blockers are then looked up by pid
+    return """
+    WITH waiting AS (
+        SELECT pid, pg_blocking_pids(pid) AS blocked_by
+        FROM pg_stat_activity
+        WHERE wait_event_type = 'Lock'
+    )
+    SELECT
+        a.pid,
+        a.usename AS username,
+        a.datname AS database,
+        a.state,
+        a.wait_event_type,
+        a.wait_event,
+        EXTRACT(EPOCH FROM now() - a.xact_start)::float8 AS xact_duration,
+        EXTRACT(EPOCH FROM now() - a.state_change)::float8 AS state_duration,
+        LEFT(a.query, 80) AS query,
+        COALESCE(w.blocked_by, '{}') AS blocked_by
+    FROM pg_stat_activity a
+    LEFT JOIN waiting w ON w.pid = a.pid
+    WHERE w.pid IS NOT NULL
+       OR a.pid IN (SELECT unnest(blocked_by) FROM waiting)
+    ORDER BY a.pid
+    """
+
+
+# Watch mode splits blocking_sessions in two: the edges and the columns that
+# change between polls (state, waits, durations, query) are read every time,
+# user and database only for pids the watcher has not seen yet
+
+@query_registry.template("watched_sessions")
+def _watched_sessions_sql(version: Optional[PostgreSQLVersion]) -> str:
+    return """
+    WITH waiting AS (
+        SELECT pid, pg_blocking_pids(pid) AS blocked_by
+        FROM pg_stat_activity
+        WHERE wait_event_type = 'Lock'
+    )
+    SELECT
+        a.pid,
+        a.state,
+        a.wait_event_type,
+        a.wait_event,
+        EXTRACT(EPOCH FROM now() - a.xact_start)::float8 AS xact_duration,
+        EXTRACT(EPOCH FROM now() - a.state_change)::float8 AS state_duration,
+        LEFT(a.query, 80) AS query,
+        COALESCE(w.blocked_by, '{}') AS blocked_by
+    FROM pg_stat_activity a
+    LEFT JOIN waiting w ON w.pid = a.pid
+    WHERE w.pid IS NOT NULL
+       OR a.pid IN (SELECT unnest(blocked_by) FROM waiting)
+    """
+
+
+@query_registry.template("session_identity")
+def _session_identity_sql(version: Optional[PostgreSQLVersion]) -> str:
+    return """
+    SELECT pid, usename AS username, datname AS database
+    FROM pg_stat_activity
+    WHERE pid = ANY($1::int[])
+    """
+
+
+class WaitForGraph:
+    """Wait-for graph: an edge waiter -> blocker for every pg_blocking_pids() entry.
+
+    Root blockers are sessions that block others without waiting themselves;
+    waiters that cannot be reached from any root sit on a wait cycle (a
+    deadlock the server has not broken yet) and are reported as such.
+    """
+
+    def __init__(self, rows: Sequence[Dict[str, Any]]):
+        self.sessions: Dict[int, Dict[str, Any]] = {row["pid"]: dict(row) for row in rows}
+        self.blocked_by: Dict[int, List[int]] = {}
+        self.blocking: Dict[int, List[int]] = {}
+        for row in rows:
+            blockers = [pid for pid in row["blocked_by"] or [] if pid != row["pid"]]
+            if blockers:
+                self.blocked_by[row["pid"]] = blockers
+            for blocker in blockers:
+                self.blocking.setdefault(blocker, []).append(row["pid"])
+        self.levels: Dict[int, int] = {}
+        self.root_of: Dict[int, int] = {}
+        self._walk()
+
+    @property
+    def edges(self) -> Set[tuple]:
+        """All (waiter, blocker) pairs."""
+        return {(waiter, blocker) for waiter, blockers in self.blocked_by.items() for blocker in blockers}
+
+    def roots(self) -> List[int]:
+        """Root blockers, plus the lowest pid of each wait cycle."""
+        return sorted(pid for pid, root in self.root_of.items() if pid == root)
+
+    def in_cycle(self, pid: int) -> bool:
+        return pid in self.blocked_by and self.root_of.get(pid) == pid
+
+    def victims(self, pid: int) -> Set[int]:
+        """Sessions waiting on pid directly or through a chain."""
+        seen: Set[int] = set()
+        queue = deque(self.blocking.get(pid, ()))
+        while queue:
+            waiter = queue.popleft()
+            if waiter in seen or waiter == pid:
+                continue
+            seen.add(waiter)
+            queue.extend(self.blocking.get(waiter, ()))
+        return seen
+
+    def depth(self, pid: int) -> int:
+        """Length of the longest wait chain below pid (0 if nobody waits on it)."""
+        return max((self.levels[v] - self.levels[pid] for v in self.victims(pid) if self.root_of.get(v) == pid),
+                   default=0)
+
+    def _walk(self) -> None:
+        # Breadth-first from every root assigns each waiter its nearest root and level
+        starts = sorted(pid for pid in self.blocking if pid not in self.blocked_by)
+        pending = set(self.blocked_by)
+        while True:
+            for root in starts:
+                self.root_of[root] = root
+                self.levels[root] = 0
+                queue = deque([root])
+                while queue:
+                    pid = queue.popleft()
+                    for waiter in self.blocking.get(pid, ()):
+                        if waiter not in self.levels:
+                            self.levels[waiter] = self.levels[pid] + 1
+                            self.root_of[waiter] = root
+                            pending.discard(waiter)
+                            queue.append(waiter)
+            if not pending:
+                return
+            # Only cycles and their waiters are left; start again from the lowest pid on a cycle
+            starts = [min(self._cycle_from(min(pending)))]
+            pending.discard(starts[0])
+
+    def _cycle_from(self, pid: int) -> List[int]:
+        """Follow blocked_by from an unreached waiter until a pid repeats; return that cycle."""
+        path: List[int] = []
+        seen: Dict[int, int] = {}
+        while pid not in seen:
+            seen[pid] = len(path)
+            path.append(pid)
+            pid = self.blocked_by[pid][0]
+        return path[seen[pid]:]
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        """One row per root blocker, most victims first."""
+        rows = []
+        for root in self.roots():
+            session = self.sessions.get(root, {})
+            rows.append({
+                "root_pid": root,
+                "username": session.get("username"),
+                "database": session.get("database"),
+                "state": "wait cycle" if self.in_cycle(root) else session.get("state"),
+                "xact_duration": session.get("xact_duration"),
+                "directly_blocked": len(self.blocking.get(root, ())),
+                "total_victims": len(self.victims(root)),
+                "chain_depth": self.depth(root),
+                "query": session.get("query"),
+            })
+        rows.sort(key=lambda row: (-row["total_victims"], row["root_pid"]))
+        return rows
+
+    def tree_rows(self) -> List[Dict[str, Any]]:
+        """Every session in the graph, depth-first under its root."""
+        rows = []
+        emitted: Set[int] = set()
+        for summary in self.summary_rows():
+            stack = [summary["root_pid"]]
+            while stack:
+                pid = stack.pop()
+                if pid in emitted:
+                    continue
+                emitted.add(pid)
+                session = self.sessions.get(pid, {})
+                level = self.levels.get(pid, 0)
+                rows.append({
+                    "pid": ("  " * level) + str(pid),
+                    "level": level,
+                    "blocked_by": ",".join(str(b) for b in self.blocked_by.get(pid, ())) or None,
+                    "username": session.get("username"),
+                    "state": session.get("state"),
+                    "wait_event": session.get("wait_event"),
+                    "state_duration": session.get("state_duration"),
+                    "query": session.get("query"),
+                })
+                stack.extend(sorted(self.blocking.get(pid, ()), reverse=True))
+        return rows
+
+
+async def get_wait_for_graph(database: str = None) -> WaitForGraph:
+    """Fetch blocked sessions and their blockers and build the graph."""
+    rows = await execute_query(query_registry.render("blocking_sessions"), database=database)
+    return WaitForGraph(rows)
+
+
+def format_lock_tree(graph: WaitForGraph, title: str) -> str:
+    """Format root blockers followed by the indented blocking tree."""
+    if not graph.blocked_by:
+        return f"=== {title} ===\n\nNo sessions are waiting on locks"
+    with output_budget():
+        return "\n\n".join([
+            format_table_data(graph.summary_rows(), f"{title} - Root Blockers"),
+            format_table_data(graph.tree_rows(), f"{title} - Blocking Tree"),
+        ])
+
+
+class LockWatcher:
+    """Keeps the last wait-for graph per database and reports changes between polls."""
+
+    def __init__(self):
+        self.graphs: Dict[Tuple[str, int, str], Tuple[float, WaitForGraph]] = {}
+
+    @staticmethod
+    def _key(database: Optional[str]) -> Tuple[str, int, str]:
+        config = functions.POSTGRES_CONFIG
+        return config["host"], config["port"], database or config["database"]
+
+    async def poll(self, database: str = None) -> Tuple[Optional[Tuple[float, WaitForGraph]], WaitForGraph]:
+        """Return ((taken_at, previous graph) or None, current graph) and store the current one."""
+        key = self._key(database)
+        previous = self.graphs.get(key)
+        known = previous[1].sessions if previous else {}
+
+        polled = await execute_query(query_registry.render("watched_sessions"), database=database)
+        pids = {row["pid"] for row in polled} | {pid for row in polled for pid in row["blocked_by"] or []}
+        identity = {pid: {"username": known[pid].get("username"), "database": known[pid].get("database")}
+                    for pid in pids if pid in known}
+        missing = sorted(pids - identity.keys())
+        if missing:
+            rows = await execute_query(query_registry.render("session_identity"), [missing], database=database)
+            identity.update((row["pid"], {"username": row["username"], "database": row["database"]}) for row in rows)
+
+        # Everything but user and database comes from this poll
+        current_rows = {row["pid"]: row for row in polled}
+        rows = []
+        for pid in sorted(pids):
+            row = {"pid": pid, **identity.get(pid, {})}
+            row.update(current_rows.get(pid, {"blocked_by": []}))
+            rows.append(row)
+        current = WaitForGraph(rows)
+        self.graphs[key] = (time.monotonic(), current)
+        return previous, current
+
+
+def diff_graphs(old: WaitForGraph, new: WaitForGraph) -> List[Dict[str, Any]]:
+    """Changes from old to new: blockers, resolved chains, queue sizes, waiters."""
+    changes = []
+    old_roots, new_roots = set(old.roots()), set(new.roots())
+    for root in sorted(new_roots - old_roots):
+        changes.append({"change": "new blocker", "pid": root, "root_pid": root,
+                        "detail": f"{len(new.victims(root))} waiting", "query": new.sessions.get(root, {}).get("query")})
+    for root in sorted(old_roots - new_roots):
+        if root in new.root_of:
+            detail = f"now waits behind {new.root_of[root]}"
+        else:
+            detail = f"released {len(old.victims(root))} waiting"
+        changes.append({"change": "resolved", "pid": root, "root_pid": root,
+                        "detail": detail, "query": old.sessions.get(root, {}).get("query")})
+    for root in sorted(old_roots & new_roots):
+        before, after = len(old.victims(root)), len(new.victims(root))
+        if before != after:
+            changes.append({"change": "queue grew" if after > before else "queue shrank", "pid": root,
+                            "root_pid": root, "detail": f"{before} -> {after} waiting",
+                            "query": new.sessions.get(root, {}).get("query")})
+
+    old_edges, new_edges = old.blocked_by, new.blocked_by
+    for pid in sorted(new_edges.keys() - old_edges.keys()):
+        changes.append({"change": "new waiter", "pid": pid, "root_pid": new.root_of.get(pid),
+                        "detail": "blocked by " + ",".join(map(str, new_edges[pid])),
+                        "query": new.sessions.get(pid, {}).get("query")})
+    for pid in sorted(old_edges.keys() - new_edges.keys()):
+        changes.append({"change": "stopped waiting", "pid": pid, "root_pid": old.root_of.get(pid),
+                        "detail": None, "query": old.sessions.get(pid, {}).get("query")})
+    return changes
+
+
+lock_watcher = LockWatcher()
+
+
+async def format_lock_watch(database: str = None) -> str:
+    """Poll the wait-for graph and format the changes since the previous poll."""
+    previous, current = await lock_watcher.poll(database)
+    if previous is None:
+        return format_lock_tree(current, "Lock Wait Tree (watch baseline; call again for changes)")
+
+    taken_at, old = previous
+    state = f"{len(current.roots())} root blockers, {len(current.blocked_by)} waiting sessions"
+    title = f"Lock Wait Changes since {time.monotonic() - taken_at:.0f}s ago (now: {state})"
+    changes = diff_graphs(old, current)
+    if not changes:
+        return f"=== {title} ===\n\nNo changes since the previous poll"
+    return format_table_data(changes, title)
@@ -12,9 +12,11 @@ Key Features:
 """
 
 import argparse
+import json
 import logging
 import os
 import sys
+from contextlib import asynccontextmanager
 
 # Prevent direct execution of this module
 if __name__ == "__main__":
@@ -24,16 +26,22 @@ if __name__ == "__main__":
     print()
     print("Direct execution of mcp_main.py is not supported.")
     sys.exit(1)
-from typing import Any, Optional
+from typing import Any, List, Optional
 from fastmcp import FastMCP
 from fastmcp.server.auth import StaticTokenVerifier
 from .functions import (
     execute_query,
     execute_single_query,
+    execute_queries,
     format_table_data,
+    stream_table_data,
+    structured_output,
+    add_result_field,
+    add_result_table,
+    collecting_result_tables,
     format_bytes,
     format_duration,
-    get_server_version,
+    get_server_capabilities,
     check_extension_exists,
     get_pg_stat_statements_data,
     get_pg_stat_monitor_data,
@@ -41,13 +49,34 @@ from .functions import (
     read_prompt_template,
     parse_prompt_sections,
     get_current_database_name,
+    close_db_pools,
+    get_statement_cache_stats,
+    cached_tool,
     POSTGRES_CONFIG
 )
 from .version_compat import (
     get_postgresql_version,
     check_feature_availability,
+    query_registry,
+    render_for_server,
     VersionAwareQueries
 )
+from .catalog import catalog_fingerprint, format_schema_batch, get_schema_batch, get_table_page
+from .lock_graph import format_lock_tree, format_lock_watch, get_wait_for_graph
+from .metrics_sampler import (
+    activity_sampler,
+    format_session_history,
+    format_top_statements,
+    format_window_stats,
+    metrics_sampler,
+)
+from .relation_graph import (
+    RELATIONSHIP_TYPES,
+    format_relationship_overview,
+    format_table_relationships,
+    relation_graphs,
+)
+from .stats_export import EXPORT_CONFIG, export_statistics
 
 # =============================================================================
 # Logging configuration
@@ -80,10 +109,23 @@ def _build_static_token_auth(secret_key: str) -> StaticTokenVerifier:
     return StaticTokenVerifier(tokens=tokens)
 
 
+@asynccontextmanager
+async def _server_lifespan(server: FastMCP):
+    """Run the optional samplers and release pooled connections on shutdown."""
+    metrics_sampler.start()
+    activity_sampler.start()
+    try:
+        yield {}
+    finally:
+        await activity_sampler.stop()
+        await metrics_sampler.stop()
+        await close_db_pools()
+
+
 # Initialize MCP instance once for decorator registration.
 # Runtime authentication is configured in main() before mcp.run().
 logger.info("Initializing MCP instance")
-mcp = FastMCP("mcp-postgresql-ops")
+mcp = FastMCP("mcp-postgresql-ops", lifespan=_server_lifespan)
 
 # =============================================================================
 # Server initialization
@@ -96,13 +138,16 @@ PROMPT_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "prompt_template.
 # MCP Tools (PostgreSQL Operations Tools)
 
 @mcp.tool()
+@structured_output
 async def get_lock_monitoring(
     database_name: str = None,
     granted: str = None, 
     state: str = None,
     mode: str = None,
     locktype: str = None,
-    username: str = None
+    username: str = None,
+    tree: bool = False,
+    watch: bool = False
 ) -> str:
     """
     [Tool Purpose]: Monitor current locks and potential deadlocks in PostgreSQL
@@ -112,6 +157,10 @@ async def get_lock_monitoring(
     - Show blocked and blocking sessions, lock types, and wait status
     - Help diagnose lock contention and deadlock risk
     - Filter results by granted status, state, mode, lock type, or username
+    - In tree mode, show root blockers with victim counts and chain depth, and the blocking tree
+      (built from pg_blocking_pids(), so it stays fast when pg_locks is huge)
+    - In watch mode, report only what changed since the previous watch call (new blockers,
+      resolved chains, growing or shrinking queues, new and released waiters)
     
     [Required Use Cases]:
     - When user requests "lock monitoring", "deadlock check", "blocked sessions", etc.
@@ -131,80 +180,30 @@ async def get_lock_monitoring(
         mode: Filter by lock mode ("AccessShareLock", "ExclusiveLock", etc.)
         locktype: Filter by lock type ("relation", "transactionid", "virtualxid", etc.)
         username: Filter by specific username
+        tree: Show the blocking tree of waiting sessions instead of individual locks;
+              the other filters do not apply (default: False)
+        watch: Compare the blocking tree with the previous watch call and return only the changes;
+               the first call returns the full tree as the baseline (default: False)
     
     Returns:
         Table-format information showing PID, user, database, lock type, relation, mode, granted, waiting, and blocked-by info
     """
     try:
-        # Build WHERE conditions based on filters
-        where_conditions = []
-        params = []
-        param_count = 0
-        
-        if granted is not None:
-            param_count += 1
-            where_conditions.append(f"l.granted = ${param_count}")
-            params.append(granted.lower() == "true")
-            
-        if state:
-            param_count += 1
-            where_conditions.append(f"a.state ILIKE ${param_count}")
-            params.append(f"%{state}%")
-            
-        if mode:
-            param_count += 1
-            where_conditions.append(f"l.mode ILIKE ${param_count}")
-            params.append(f"%{mode}%")
-            
-        if locktype:
-            param_count += 1
-            where_conditions.append(f"l.locktype ILIKE ${param_count}")
-            params.append(f"%{locktype}%")
-            
-        if username:
-            param_count += 1
-            where_conditions.append(f"a.usename ILIKE ${param_count}")
-            params.append(f"%{username}%")
-        
-        # Build WHERE clause
-        where_clause = ""
-        if where_conditions:
-            where_clause = "WHERE " + " AND ".join(where_conditions)
-        
-        query = f'''
-        SELECT
-            a.pid,
-            a.usename AS username,
-            a.datname AS database,
-            l.locktype,
-            l.mode,
-            l.granted,
-            l.relation::regclass AS relation,
-            a.state,
-            a.query_start,
-            LEFT(a.query, 80) AS query,
-            l.virtualtransaction,
-            l.virtualxid,
-            l.transactionid,
-            l.fastpath,
-            a.wait_event_type,
-            a.wait_event,
-            bl.pid AS blocked_by
-        FROM pg_locks l
-        JOIN pg_stat_activity a ON l.pid = a.pid
-        LEFT JOIN pg_locks bl_l
-            ON l.locktype = bl_l.locktype
-            AND l.database IS NOT DISTINCT FROM bl_l.database
-            AND l.relation IS NOT DISTINCT FROM bl_l.relation
-            AND l.page IS NOT DISTINCT FROM bl_l.page
-            AND l.tuple IS NOT DISTINCT FROM bl_l.tuple
-            AND l.transactionid IS NOT DISTINCT FROM bl_l.transactionid
-            AND l.pid <> bl_l.pid
-            AND NOT l.granted AND bl_l.granted
-        LEFT JOIN pg_stat_activity bl ON bl_l.pid = bl.pid
-        {where_clause}
-        ORDER BY a.datname, a.pid, l.locktype, l.mode
-        '''
+        if watch:
+            return await format_lock_watch(database_name)
+        if tree:
+            graph = await get_wait_for_graph(database_name)
+            return format_lock_tree(graph, "Lock Wait Tree")
+        
+        # Unused filters are bound as NULL so every call shares one statement
+        params = [
+            granted.lower() == "true" if granted is not None else None,
+            f"%{state}%" if state else None,
+            f"%{mode}%" if mode else None,
+            f"%{locktype}%" if locktype else None,
+            f"%{username}%" if username else None,
+        ]
+        query = query_registry.render("lock_monitoring")
         
         locks = await execute_query(query, params, database=database_name)
         
@@ -235,6 +234,7 @@ async def get_lock_monitoring(
 
 
 @mcp.tool()
+@structured_output
 async def get_wal_status() -> str:
     """
     [Tool Purpose]: Monitor WAL (Write Ahead Log) status and statistics
@@ -268,8 +268,6 @@ async def get_wal_status() -> str:
             pg_is_in_recovery() as in_recovery
         """
         
-        wal_info = await execute_query(wal_query)
-        
         # Get WAL archiving statistics (if available)
         archiver_query = """
         SELECT 
@@ -283,8 +281,6 @@ async def get_wal_status() -> str:
         FROM pg_stat_archiver
         """
         
-        archiver_stats = await execute_query(archiver_query)
-        
         # Get WAL settings
         config_query = """
         SELECT name, setting, unit
@@ -297,7 +293,8 @@ async def get_wal_status() -> str:
         ORDER BY name
         """
         
-        wal_config = await execute_query(config_query)
+        # The three queries are independent; run them concurrently
+        wal_info, archiver_stats, wal_config = await execute_queries([wal_query, archiver_query, config_query])
         
         result = []
         result.append("=== WAL Status Information ===\n")
@@ -313,6 +310,7 @@ async def get_wal_status() -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_replication_status() -> str:
     """
     [Tool Purpose]: Monitor PostgreSQL replication status and statistics
@@ -360,15 +358,13 @@ async def get_replication_status() -> str:
         ORDER BY client_addr
         """
         
-        repl_connections = await execute_query(repl_query)
-        
         # Get replication slots with version compatibility
         slots_query = await VersionAwareQueries.get_replication_slots_query()
-        repl_slots = await execute_query(slots_query)
         
         # Get WAL receiver status with version compatibility
         receiver_query = await VersionAwareQueries.get_wal_receiver_query()
-        wal_receiver = await execute_query(receiver_query)
+        
+        repl_connections, repl_slots, wal_receiver = await execute_queries([repl_query, slots_query, receiver_query])
         
         result = []
         result.append("=== Replication Status Information ===\n")
@@ -396,6 +392,7 @@ async def get_replication_status() -> str:
 # =============================================================================
 
 @mcp.tool()
+@structured_output
 async def get_server_info() -> str:
     """
     [Tool Purpose]: Check basic information and connection status of PostgreSQL server
@@ -420,17 +417,15 @@ async def get_server_info() -> str:
         Comprehensive information including server version, connection info, and extension status
     """
     try:
-        # Retrieve server version
-        version = await get_server_version()
+        # Version, extensions and recovery state come from one cached snapshot
+        capabilities = await get_server_capabilities()
+        version = capabilities["version"]
         pg_version = await get_postgresql_version()
+        extensions = capabilities["extensions"]
         
         # Connection information (with password masking)
         conn_info = sanitize_connection_info()
         
-        # Check extension status
-        pg_stat_statements_exists = await check_extension_exists("pg_stat_statements")
-        pg_stat_monitor_exists = await check_extension_exists("pg_stat_monitor")
-        
         # Version compatibility features
         features = {
             'Modern Version (12+)': pg_version.is_modern,
@@ -448,6 +443,24 @@ async def get_server_info() -> str:
             'Parallel Worker Stats (18+)': pg_version.has_parallel_worker_stats,
         }
         
+        statement_stats = get_statement_cache_stats()
+        add_result_table("PostgreSQL Server Information", [{
+            "version": version, "parsed_version": str(pg_version),
+            **{key: conn_info[key] for key in ("host", "port", "database", "user")},
+            "in_recovery": capabilities["in_recovery"],
+        }])
+        add_result_table("Extension Status", [
+            {"extension": extension, "installed_version": extensions.get(extension)}
+            for extension in ("pg_stat_statements", "pg_stat_monitor")
+        ])
+        add_result_table("Version Compatibility Features", [
+            {"feature": feature, "available": available} for feature, available in features.items()
+        ])
+        add_result_table("Prepared Statement Cache", [statement_stats])
+        if collecting_result_tables():
+            # The tables hold everything the text below repeats
+            return ""
+        
         result = []
         result.append("=== PostgreSQL Server Information ===\n")
         result.append(f"Version: {version}")
@@ -456,11 +469,15 @@ async def get_server_info() -> str:
         result.append(f"Port: {conn_info['port']}")
         result.append(f"Database: {conn_info['database']}")
         result.append(f"User: {conn_info['user']}")
+        result.append(f"Server Role: {'Standby (in recovery)' if capabilities['in_recovery'] else 'Primary'}")
         result.append("")
         
         result.append("=== Extension Status ===")
-        result.append(f"pg_stat_statements: {'✓ Installed' if pg_stat_statements_exists else '✗ Not installed'}")
-        result.append(f"pg_stat_monitor: {'✓ Installed' if pg_stat_monitor_exists else '✗ Not installed'}")
+        for extension in ("pg_stat_statements", "pg_stat_monitor"):
+            if extension in extensions:
+                result.append(f"{extension}: ✓ Installed ({extensions[extension]})")
+            else:
+                result.append(f"{extension}: ✗ Not installed")
         result.append("")
         
         result.append("=== Version Compatibility Features ===")
@@ -469,6 +486,11 @@ async def get_server_info() -> str:
             result.append(f"{feature}: {status}")
         result.append("")
         
+        result.append("=== Prepared Statement Cache ===")
+        result.append(f"Hot Queries: {statement_stats['hot_queries']} (prepared at connection start: {statement_stats['warmed']})")
+        result.append(f"Hits: {statement_stats['hits']}, Misses: {statement_stats['misses']} ({statement_stats['hit_ratio_percent']}% hit ratio)")
+        result.append("")
+        
         # Add compatibility summary
         if pg_version.is_modern:
             if pg_version >= 18:
@@ -492,6 +514,7 @@ async def get_server_info() -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_current_database_info(database_name: str = None) -> str:
     """
     [Tool Purpose]: Get information about the current database connection
@@ -545,6 +568,9 @@ async def get_current_database_info(database_name: str = None) -> str:
             return f"Database information not found for: {current_db}"
         
         info = db_info[0]
+        add_result_table("Current Database Information", db_info)
+        if collecting_result_tables():
+            return ""
         
         result = []
         result.append("=== Current Database Information ===\n")
@@ -567,6 +593,8 @@ async def get_current_database_info(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@cached_tool(ttl=60, stale_while_revalidate=True)
+@structured_output
 async def get_database_list() -> str:
     """
     [Tool Purpose]: Retrieve list of all databases and their basic information on PostgreSQL server
@@ -575,6 +603,7 @@ async def get_database_list() -> str:
     - Retrieve list of all databases on the server
     - Display owner, encoding, and size information for each database
     - Include database connection limit information
+    - May return the previous result labelled with its age while a refresh runs (when POSTGRES_TOOL_CACHE_MAX_STALE is set)
     
     [Required Use Cases]:
     - When user requests "database list", "DB list", "database info", etc.
@@ -613,12 +642,15 @@ async def get_database_list() -> str:
 
 
 @mcp.tool()
-async def get_table_list(database_name: str = None) -> str:
+@cached_tool(ttl=60, fingerprint=catalog_fingerprint)
+@structured_output
+async def get_table_list(database_name: str = None, page_size: int = 1000, after: str = None,
+                         include_size: bool = True) -> str:
     """
     [Tool Purpose]: Retrieve list of all tables and their information from specified database (or current DB)
     
     [Exact Functionality]:
-    - Retrieve list of all tables in specified database
+    - Retrieve list of all tables in specified database, one page at a time in schema/table order
     - Display schema, owner, and size information for each table
     - Distinguish table types (regular tables, views, etc.)
     
@@ -634,29 +666,28 @@ async def get_table_list(database_name: str = None) -> str:
     
     Args:
         database_name: Database name to query (uses currently connected database if omitted)
+        page_size: Maximum number of tables to return (default: 1000, max: 10000)
+        after: Continue after this "schema.table"; names with dots or quotes are double-quoted
+               (use the value given at the end of the previous page)
+        include_size: Compute total table size (default: True; False is much faster on databases with many tables)
     
     Returns:
         Table-format information including table name, schema, owner, type, and size
     """
     try:
-        query = """
-        SELECT 
-            schemaname as schema_name,
-            tablename as table_name,
-            tableowner as owner,
-            pg_size_pretty(pg_total_relation_size(schemaname||'.'||tablename)) as size
-        FROM pg_tables 
-        WHERE schemaname NOT IN ('information_schema', 'pg_catalog')
-        ORDER BY schemaname, tablename
-        """
-        
-        # Execute query on specified database or default
-        tables = await execute_query(query, database=database_name)
+        page_size = max(1, min(page_size, 10000))
+        tables, next_after = await get_table_page(after, page_size, include_size, database=database_name)
         title = f"Table List"
         if database_name:
             title += f" (Database: {database_name})"
-            
-        return format_table_data(tables, title)
+        if after:
+            title += f" after {after}"
+        
+        result = format_table_data(tables, title)
+        add_result_field("next_after", next_after)
+        if next_after:
+            result += f"\n\nShowing {len(tables)} tables; more follow. Next page: after={json.dumps(next_after)}"
+        return result
         
     except Exception as e:
         logger.error(f"Failed to get table list: {e}")
@@ -664,6 +695,8 @@ async def get_table_list(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@cached_tool(ttl=60)
+@structured_output
 async def get_user_list() -> str:
     """
     [Tool Purpose]: Retrieve list of all user accounts and permission information on PostgreSQL server
@@ -713,6 +746,8 @@ async def get_user_list() -> str:
 
 
 @mcp.tool()
+@cached_tool(ttl=300, fingerprint=catalog_fingerprint)
+@structured_output
 async def get_table_schema_info(database_name: str, table_name: str = None, schema_name: str = "public") -> str:
     """
     [Tool Purpose]: Retrieve detailed schema information for specific table or all tables in a database
@@ -742,221 +777,16 @@ async def get_table_schema_info(database_name: str, table_name: str = None, sche
     """
     try:
         if table_name:
-            # Specific table schema information
-            query = """
-            WITH table_info AS (
-                SELECT 
-                    t.table_schema,
-                    t.table_name,
-                    t.table_type,
-                    pg_size_pretty(pg_total_relation_size(quote_ident(t.table_schema)||'.'||quote_ident(t.table_name))) as table_size,
-                    pg_stat_get_tuples_inserted(c.oid) + pg_stat_get_tuples_updated(c.oid) + pg_stat_get_tuples_deleted(c.oid) as total_writes,
-                    pg_stat_get_live_tuples(c.oid) as estimated_rows
-                FROM information_schema.tables t
-                LEFT JOIN pg_class c ON c.relname = t.table_name
-                LEFT JOIN pg_namespace n ON n.nspname = t.table_schema AND n.oid = c.relnamespace
-                WHERE t.table_name = $1 AND t.table_schema = $2
-            ),
-            column_info AS (
-                SELECT 
-                    c.column_name,
-                    c.ordinal_position,
-                    c.data_type,
-                    c.character_maximum_length,
-                    c.numeric_precision,
-                    c.numeric_scale,
-                    c.is_nullable,
-                    c.column_default,
-                    CASE 
-                        WHEN pk.column_name IS NOT NULL THEN 'PRIMARY KEY'
-                        WHEN fk.column_name IS NOT NULL THEN 'FOREIGN KEY'
-                        ELSE ''
-                    END as key_type,
-                    fk.referenced_table_name,
-                    fk.referenced_column_name
-                FROM information_schema.columns c
-                LEFT JOIN (
-                    SELECT kcu.column_name, kcu.table_name, kcu.table_schema
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.key_column_usage kcu 
-                        ON tc.constraint_name = kcu.constraint_name
-                        AND tc.table_schema = kcu.table_schema
-                    WHERE tc.constraint_type = 'PRIMARY KEY'
-                        AND tc.table_name = $3 AND tc.table_schema = $4
-                ) pk ON c.column_name = pk.column_name 
-                    AND c.table_name = pk.table_name 
-                    AND c.table_schema = pk.table_schema
-                LEFT JOIN (
-                    SELECT 
-                        kcu.column_name, 
-                        kcu.table_name, 
-                        kcu.table_schema,
-                        ccu.table_name AS referenced_table_name,
-                        ccu.column_name AS referenced_column_name
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.key_column_usage kcu 
-                        ON tc.constraint_name = kcu.constraint_name
-                        AND tc.table_schema = kcu.table_schema
-                    JOIN information_schema.constraint_column_usage ccu 
-                        ON ccu.constraint_name = tc.constraint_name
-                        AND ccu.table_schema = tc.table_schema
-                    WHERE tc.constraint_type = 'FOREIGN KEY'
-                        AND tc.table_name = $5 AND tc.table_schema = $6
-                ) fk ON c.column_name = fk.column_name 
-                    AND c.table_name = fk.table_name 
-                    AND c.table_schema = fk.table_schema
-                WHERE c.table_name = $7 AND c.table_schema = $8
-                ORDER BY c.ordinal_position
-            ),
-            constraint_info AS (
-                SELECT 
-                    tc.constraint_name,
-                    tc.constraint_type,
-                    string_agg(kcu.column_name, ', ' ORDER BY kcu.ordinal_position) as columns,
-                    CASE 
-                        WHEN tc.constraint_type = 'FOREIGN KEY' THEN
-                            ccu.table_name || '(' || ccu.column_name || ')'
-                        ELSE ''
-                    END as references
-                FROM information_schema.table_constraints tc
-                LEFT JOIN information_schema.key_column_usage kcu 
-                    ON tc.constraint_name = kcu.constraint_name
-                    AND tc.table_schema = kcu.table_schema
-                LEFT JOIN information_schema.constraint_column_usage ccu 
-                    ON ccu.constraint_name = tc.constraint_name
-                    AND ccu.table_schema = tc.table_schema
-                WHERE tc.table_name = $9 AND tc.table_schema = $10
-                GROUP BY tc.constraint_name, tc.constraint_type, ccu.table_name, ccu.column_name
-                ORDER BY tc.constraint_type, tc.constraint_name
-            ),
-            index_info AS (
-                SELECT 
-                    i.indexname as index_name,
-                    i.indexdef as index_definition,
-                    CASE WHEN idx.indisunique THEN 'UNIQUE' ELSE 'REGULAR' END as index_type
-                FROM pg_indexes i
-                JOIN pg_class c ON c.relname = i.indexname
-                JOIN pg_index idx ON idx.indexrelid = c.oid
-                WHERE i.tablename = $11 AND i.schemaname = $12
-                ORDER BY i.indexname
-            )
-            SELECT * FROM (
-                SELECT 
-                    'TABLE_INFO' as section,
-                    ti.table_schema || '.' || ti.table_name as name,
-                    ti.table_type as type,
-                    ti.table_size as size,
-                    COALESCE(ti.estimated_rows::text, 'N/A') as rows,
-                    COALESCE(ti.total_writes::text, 'N/A') as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    1 as sort_order
-                FROM table_info ti
-                
-                UNION ALL
-                
-                SELECT 
-                    'COLUMN' as section,
-                    ci.column_name as name,
-                    ci.data_type as type,
-                    COALESCE(
-                        CASE 
-                            WHEN ci.character_maximum_length IS NOT NULL THEN '(' || ci.character_maximum_length || ')'
-                            WHEN ci.numeric_precision IS NOT NULL AND ci.numeric_scale IS NOT NULL THEN '(' || ci.numeric_precision || ',' || ci.numeric_scale || ')'
-                            WHEN ci.numeric_precision IS NOT NULL THEN '(' || ci.numeric_precision || ')'
-                            ELSE ''
-                        END, ''
-                    ) as size,
-                    ci.is_nullable as rows,
-                    COALESCE(ci.column_default, '') as writes,
-                    ci.key_type as extra1,
-                    COALESCE(ci.referenced_table_name, '') as extra2,
-                    COALESCE(ci.referenced_column_name, '') as extra3,
-                    2 as sort_order
-                FROM column_info ci
-                
-                UNION ALL
-                
-                SELECT 
-                    'CONSTRAINT' as section,
-                    co.constraint_name as name,
-                    co.constraint_type as type,
-                    co.columns as size,
-                    co.references as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    3 as sort_order
-                FROM constraint_info co
-                
-                UNION ALL
-                
-                SELECT 
-                    'INDEX' as section,
-                    idx.index_name as name,
-                    idx.index_type as type,
-                    idx.index_definition as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    4 as sort_order
-                FROM index_info idx
-            ) combined_results
-            ORDER BY sort_order, name
-            """
-            
-            # Parameters: table_name, schema_name repeated 6 times for different subqueries
-            params = [table_name, schema_name] * 6  # 12 parameters total
+            # Specific table schema information (pg_catalog by OID; see catalog.py)
+            query = query_registry.render("table_schema_info")
+            params = [table_name, schema_name]
             results = await execute_query(query, params, database=database_name)
             title = f"Schema Information for {schema_name}.{table_name}"
             if database_name:
                 title += f" (Database: {database_name})"
         else:
             # All tables schema overview
-            query = """
-            WITH table_columns AS (
-                SELECT 
-                    t.table_schema,
-                    t.table_name,
-                    t.table_type,
-                    COUNT(c.column_name) as column_count,
-                    string_agg(
-                        CASE WHEN pk.column_name IS NOT NULL THEN c.column_name || ' (PK)' 
-                             ELSE c.column_name 
-                        END, 
-                        ', ' ORDER BY c.ordinal_position
-                    ) as columns,
-                    pg_size_pretty(COALESCE(pg_total_relation_size(quote_ident(t.table_schema)||'.'||quote_ident(t.table_name)), 0)) as table_size
-                FROM information_schema.tables t
-                LEFT JOIN information_schema.columns c 
-                    ON t.table_name = c.table_name AND t.table_schema = c.table_schema
-                LEFT JOIN (
-                    SELECT kcu.column_name, kcu.table_name, kcu.table_schema
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.key_column_usage kcu 
-                        ON tc.constraint_name = kcu.constraint_name
-                        AND tc.table_schema = kcu.table_schema
-                    WHERE tc.constraint_type = 'PRIMARY KEY'
-                ) pk ON c.column_name = pk.column_name 
-                    AND c.table_name = pk.table_name 
-                    AND c.table_schema = pk.table_schema
-                WHERE t.table_schema = $1 
-                    AND t.table_type IN ('BASE TABLE', 'VIEW')
-                GROUP BY t.table_schema, t.table_name, t.table_type
-                ORDER BY t.table_schema, t.table_name
-            )
-            SELECT 
-                table_schema || '.' || table_name as table_name,
-                table_type,
-                column_count,
-                table_size,
-                LEFT(columns, 100) || CASE WHEN LENGTH(columns) > 100 THEN '...' ELSE '' END as columns_preview
-            FROM table_columns
-            """
+            query = query_registry.render("schema_overview")
             
             results = await execute_query(query, [schema_name], database=database_name)
             title = f"Schema Overview for {schema_name} schema"
@@ -971,6 +801,59 @@ async def get_table_schema_info(database_name: str, table_name: str = None, sche
 
 
 @mcp.tool()
+@cached_tool(ttl=300, fingerprint=catalog_fingerprint)
+@structured_output
+async def get_table_schema_batch(database_name: str, schema_name: str = "public",
+                                 table_names: List[str] = None, limit: int = 100) -> str:
+    """
+    [Tool Purpose]: Retrieve detailed schema information for many tables (or a whole schema) in one call
+    
+    [Exact Functionality]:
+    - Describe columns (type, size, nullability, default, key, referenced column) of every requested table
+    - List constraints with their definitions and indexes with their definitions, grouped per table
+    - Fetch all tables with a fixed handful of catalog queries instead of one call per table
+    
+    [Required Use Cases]:
+    - When user requests "describe all tables", "show the structure of these tables", "document this schema", etc.
+    - When exploring an unfamiliar schema before writing queries
+    - Instead of calling get_table_schema_info repeatedly for several tables
+    
+    [Strictly Prohibited Use Cases]:
+    - Requests for actual data inside tables
+    - Requests for table structure changes or DDL operations
+    - Requests for performance statistics (use other tools for that)
+    
+    Args:
+        database_name: Database name to query (REQUIRED - specify which database to analyze)
+        schema_name: Schema containing the tables (default: "public")
+        table_names: Tables to describe (if omitted, describes every table and view in the schema)
+        limit: Maximum number of tables to describe (default: 100, max: 1000)
+    
+    Returns:
+        Per-table sections with columns, constraints, and indexes
+    """
+    try:
+        limit = max(1, min(max(limit, len(table_names or [])), 1000))
+        tables = await get_schema_batch(schema_name, table_names, limit, database=database_name)
+        
+        title = f"Table Schemas in {schema_name}"
+        if database_name:
+            title += f" (Database: {database_name})"
+        result = format_schema_batch(tables, title)
+        if table_names:
+            missing = sorted(set(table_names) - {table["table_name"] for table in tables})
+            if missing:
+                result += f"\n\nNot found in {schema_name}: {', '.join(missing)}"
+        return result
+        
+    except Exception as e:
+        logger.error(f"Failed to get table schema batch: {e}")
+        return f"Error retrieving table schema information: {str(e)}"
+
+
+@mcp.tool()
+@cached_tool(ttl=300, fingerprint=catalog_fingerprint)
+@structured_output
 async def get_database_schema_info(database_name: str, schema_name: str = None) -> str:
     """
     [Tool Purpose]: Retrieve detailed information about database schemas (namespaces) and their contents
@@ -1178,20 +1061,22 @@ async def get_database_schema_info(database_name: str, schema_name: str = None)
 
 
 @mcp.tool()
+@cached_tool(ttl=300, fingerprint=catalog_fingerprint)
+@structured_output
 async def get_table_relationships(database_name: str, table_name: str = None, schema_name: str = "public", relationship_type: str = "all") -> str:
     """
     [Tool Purpose]: Analyze table relationships including foreign keys, dependencies, and inheritance
     
     [Exact Functionality]:
     - Show foreign key relationships (inbound and outbound)
-    - Display view dependencies and table references
+    - Display view dependencies and transitive foreign key dependencies (what a table needs, what needs it)
     - Analyze inheritance and partition relationships
-    - Identify orphaned tables and relationship patterns
+    - Detect foreign key cycles, compute a dependency-safe table load order, and identify orphaned tables
     
     [Required Use Cases]:
     - When user requests "table relationships", "foreign keys", "dependencies", etc.
     - When analyzing database schema design and data model
-    - When planning data migration or schema changes
+    - When planning data migration or schema changes (load order, cycles, impact of dropping a table)
     
     [Strictly Prohibited Use Cases]:
     - Requests for actual data inside tables
@@ -1202,307 +1087,30 @@ async def get_table_relationships(database_name: str, table_name: str = None, sc
         database_name: Database name to query (REQUIRED - specify which database to analyze)
         table_name: Specific table name to analyze (if None, shows database-wide relationship overview)
         schema_name: Schema name to search in (default: "public")
-        relationship_type: Type of relationships to show ("all", "foreign_keys", "dependencies", "inheritance")
+        relationship_type: Type of relationships to show ("all", "foreign_keys", "dependencies", "inheritance",
+                           "load_order", "cycles", "orphans"; "cycles" and "orphans" are always database-wide)
     
     Returns:
         Detailed relationship information including foreign keys, dependencies, and metadata
     """
     try:
+        if relationship_type not in RELATIONSHIP_TYPES:
+            return f"Error: relationship_type must be one of {', '.join(RELATIONSHIP_TYPES)}"
+        
+        graph = await relation_graphs.get(database_name)
         if table_name:
-            # Specific table relationship analysis
-            query = """
-            WITH table_info AS (
-                SELECT 
-                    t.table_schema,
-                    t.table_name,
-                    t.table_type
-                FROM information_schema.tables t
-                WHERE t.table_name = $1 AND t.table_schema = $2
-                  AND t.table_type IN ('BASE TABLE', 'VIEW')
-            ),
-            foreign_keys_out AS (
-                SELECT 
-                    tc.constraint_name,
-                    tc.table_schema || '.' || tc.table_name as source_table,
-                    kcu.column_name as source_column,
-                    ccu.table_schema || '.' || ccu.table_name AS target_table,
-                    ccu.column_name AS target_column,
-                    rc.match_option,
-                    rc.update_rule,
-                    rc.delete_rule,
-                    'OUTBOUND' as direction
-                FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.key_column_usage AS kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                JOIN information_schema.referential_constraints AS rc
-                    ON tc.constraint_name = rc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                  AND tc.table_name = $1 AND tc.table_schema = $2
-                ORDER BY tc.constraint_name, kcu.ordinal_position
-            ),
-            foreign_keys_in AS (
-                SELECT 
-                    tc.constraint_name,
-                    tc.table_schema || '.' || tc.table_name as source_table,
-                    kcu.column_name as source_column,
-                    ccu.table_schema || '.' || ccu.table_name AS target_table,
-                    ccu.column_name AS target_column,
-                    rc.match_option,
-                    rc.update_rule,
-                    rc.delete_rule,
-                    'INBOUND' as direction
-                FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.key_column_usage AS kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                JOIN information_schema.referential_constraints AS rc
-                    ON tc.constraint_name = rc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                  AND ccu.table_name = $1 AND ccu.table_schema = $2
-                ORDER BY tc.constraint_name, kcu.ordinal_position
-            ),
-            view_dependencies AS (
-                SELECT DISTINCT
-                    v.view_schema || '.' || v.view_name as view_name,
-                    'Depends on this table' as dependency_type
-                FROM information_schema.view_table_usage v
-                WHERE v.table_schema = $2 AND v.table_name = $1
-            ),
-            inheritance_info AS (
-                SELECT 
-                    schemaname || '.' || tablename as child_table,
-                    schemaname || '.' || tablename as parent_table,
-                    'INHERITS' as relationship_type
-                FROM pg_tables pt
-                JOIN pg_inherits i ON i.inhrelid = (pt.schemaname||'.'||pt.tablename)::regclass::oid
-                JOIN pg_class pc ON i.inhparent = pc.oid
-                JOIN pg_namespace pn ON pc.relnamespace = pn.oid
-                WHERE (pt.tablename = $1 AND pt.schemaname = $2)
-                   OR (pc.relname = $1 AND pn.nspname = $2)
-            )
-            SELECT * FROM (
-                SELECT 
-                    'TABLE_INFO' as section,
-                    'Table: ' || ti.table_schema || '.' || ti.table_name as name,
-                    'Type: ' || ti.table_type as type,
-                    'Analysis target table' as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    1 as sort_order
-                FROM table_info ti
-                
-                UNION ALL
-                
-                SELECT 
-                    'FK_OUTBOUND' as section,
-                    'FK: ' || fko.constraint_name as name,
-                    fko.direction as type,
-                    fko.source_column || ' → ' || fko.target_table as size,
-                    'Column: ' || fko.target_column as rows,
-                    'Update: ' || fko.update_rule || ', Delete: ' || fko.delete_rule as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    2 as sort_order
-                FROM foreign_keys_out fko
-                
-                UNION ALL
-                
-                SELECT 
-                    'FK_INBOUND' as section,
-                    'FK: ' || fki.constraint_name as name,
-                    fki.direction as type,
-                    fki.source_table || ' → ' || fki.source_column as size,
-                    'Referencing Column: ' || fki.target_column as rows,
-                    'Update: ' || fki.update_rule || ', Delete: ' || fki.delete_rule as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    3 as sort_order
-                FROM foreign_keys_in fki
-                
-                UNION ALL
-                
-                SELECT 
-                    'VIEW_DEPENDENCY' as section,
-                    'View: ' || vd.view_name as name,
-                    vd.dependency_type as type,
-                    'View depends on this table' as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    4 as sort_order
-                FROM view_dependencies vd
-                
-                UNION ALL
-                
-                SELECT 
-                    'INHERITANCE' as section,
-                    'Relation: ' || ii.child_table as name,
-                    ii.relationship_type as type,
-                    ii.parent_table as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    5 as sort_order
-                FROM inheritance_info ii
-            ) combined_results
-            ORDER BY sort_order, name
-            """
-            
-            params = [table_name, schema_name]  # Only 2 parameters needed - table_name and schema_name reused in all WHERE clauses
-            results = await execute_query(query, params, database=database_name)
+            oid = graph.find(table_name, schema_name)
+            if oid is None:
+                return f"Table '{schema_name}.{table_name}' not found"
             title = f"Relationships for {schema_name}.{table_name}"
             if database_name:
                 title += f" (Database: {database_name})"
-        else:
-            # Database-wide relationship overview
-            query = """
-            WITH relationship_stats AS (
-                SELECT 
-                    'Foreign Key Relationships' as category,
-                    COUNT(*) as count,
-                    'Total FK constraints in database' as description
-                FROM information_schema.table_constraints 
-                WHERE constraint_type = 'FOREIGN KEY'
-            
-                UNION ALL
-                
-                SELECT 
-                    'Referenced Tables' as category,
-                    COUNT(DISTINCT ccu.table_schema || '.' || ccu.table_name) as count,
-                    'Tables being referenced by foreign keys' as description
-                FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                
-                UNION ALL
-                
-                SELECT 
-                    'Referencing Tables' as category,
-                    COUNT(DISTINCT tc.table_schema || '.' || tc.table_name) as count,
-                    'Tables that reference other tables' as description
-                FROM information_schema.table_constraints AS tc 
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                
-                UNION ALL
-                
-                SELECT 
-                    'Orphaned Tables' as category,
-                    COUNT(*) as count,
-                    'Tables with no foreign key relationships' as description
-                FROM information_schema.tables t
-                WHERE t.table_type = 'BASE TABLE'
-                  AND t.table_schema NOT IN ('information_schema', 'pg_catalog')
-                  AND t.table_schema NOT LIKE 'pg_%'
-                  AND NOT EXISTS (
-                      SELECT 1 FROM information_schema.table_constraints tc
-                      WHERE tc.table_name = t.table_name 
-                        AND tc.table_schema = t.table_schema
-                        AND tc.constraint_type = 'FOREIGN KEY'
-                  )
-                  AND NOT EXISTS (
-                      SELECT 1 FROM information_schema.constraint_column_usage ccu
-                      WHERE ccu.table_name = t.table_name 
-                        AND ccu.table_schema = t.table_schema
-                  )
-            ),
-            top_referenced_tables AS (
-                SELECT 
-                    ccu.table_schema || '.' || ccu.table_name as table_name,
-                    COUNT(*) as reference_count,
-                    'Most referenced table' as category
-                FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                GROUP BY ccu.table_schema, ccu.table_name
-                ORDER BY COUNT(*) DESC
-                LIMIT 5
-            ),
-            relationship_details AS (
-                SELECT 
-                    tc.table_schema || '.' || tc.table_name as referencing_table,
-                    kcu.column_name as referencing_column,
-                    ccu.table_schema || '.' || ccu.table_name AS referenced_table,
-                    ccu.column_name AS referenced_column,
-                    rc.update_rule,
-                    rc.delete_rule,
-                    tc.constraint_name
-                FROM information_schema.table_constraints AS tc 
-                JOIN information_schema.key_column_usage AS kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                JOIN information_schema.referential_constraints AS rc
-                    ON tc.constraint_name = rc.constraint_name
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                ORDER BY tc.table_schema, tc.table_name, kcu.ordinal_position
-            )
-            SELECT * FROM (
-                SELECT 
-                    'STATISTICS' as section,
-                    rs.category as name,
-                    rs.count::text as type,
-                    rs.description as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    1 as sort_order
-                FROM relationship_stats rs
-                
-                UNION ALL
-                
-                SELECT 
-                    'TOP_REFERENCED' as section,
-                    trt.table_name as name,
-                    'Referenced ' || trt.reference_count || ' times' as type,
-                    'High-traffic table in relationships' as size,
-                    '' as rows,
-                    '' as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    2 as sort_order
-                FROM top_referenced_tables trt
-                
-                UNION ALL
-                
-                SELECT 
-                    'RELATIONSHIP' as section,
-                    rd.constraint_name as name,
-                    rd.referencing_table || ' → ' || rd.referenced_table as type,
-                    rd.referencing_column || ' → ' || rd.referenced_column as size,
-                    'Update: ' || rd.update_rule as rows,
-                    'Delete: ' || rd.delete_rule as writes,
-                    '' as extra1,
-                    '' as extra2,
-                    '' as extra3,
-                    3 as sort_order
-                FROM relationship_details rd
-            ) combined_results
-            ORDER BY sort_order, name
-            """
-            
-            results = await execute_query(query, [], database=database_name)
-            title = f"Database Relationship Overview"
-            if database_name:
-                title += f" (Database: {database_name})"
-            
-        return format_table_data(results, title)
+            return format_table_relationships(graph, oid, relationship_type, title)
+        
+        title = f"Database Relationship Overview"
+        if database_name:
+            title += f" (Database: {database_name})"
+        return format_relationship_overview(graph, relationship_type, title)
         
     except Exception as e:
         logger.error(f"Failed to get table relationships: {e}")
@@ -1510,6 +1118,7 @@ async def get_table_relationships(database_name: str, table_name: str = None, sc
 
 
 @mcp.tool()
+@structured_output
 async def get_active_connections() -> str:
     """
     [Tool Purpose]: Retrieve all active connections and session information on current PostgreSQL server
@@ -1533,20 +1142,7 @@ async def get_active_connections() -> str:
         Information including PID, username, database name, client address, status, and current query
     """
     try:
-        query = """
-        SELECT 
-            pid,
-            usename as username,
-            datname as database_name,
-            client_addr,
-            client_port,
-            state,
-            query_start,
-            LEFT(query, 100) as current_query
-        FROM pg_stat_activity 
-        WHERE pid <> pg_backend_pid()
-        ORDER BY query_start DESC
-        """
+        query = query_registry.render("active_connections")
         
         connections = await execute_query(query)
         return format_table_data(connections, "Active Connections")
@@ -1557,13 +1153,16 @@ async def get_active_connections() -> str:
 
 
 @mcp.tool()
-async def get_pg_stat_statements_top_queries(limit: int = 20, database_name: str = None) -> str:
+@structured_output
+async def get_pg_stat_statements_top_queries(limit: int = 20, database_name: str = None,
+                                             window: int = None, sort_by: str = "time") -> str:
     """
     [Tool Purpose]: Analyze top queries that consumed the most time using pg_stat_statements extension
     
     [Exact Functionality]:
     - Retrieve top query list based on total execution time
     - Display call count, average execution time, and cache hit rate for each query
+    - Rank only the activity of the last N seconds (by time, calls, rows, or I/O) when a window is given
     - Support identification of queries requiring performance optimization
     
     [Required Use Cases]:
@@ -1579,18 +1178,24 @@ async def get_pg_stat_statements_top_queries(limit: int = 20, database_name: str
     Args:
         limit: Number of top queries to retrieve (default: 20, max: 100)
         database_name: Database name to analyze (uses default database if omitted)
+        window: Rank statements by their activity over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of since the last stats reset (optional)
+        sort_by: Ranking used with window - "time", "calls", "rows", or "io" (default: "time")
     
     Returns:
         Performance statistics including query text, call count, total execution time, average execution time, and cache hit rate
     """
     try:
         # Check extension exists
-        if not await check_extension_exists("pg_stat_statements"):
+        if not await check_extension_exists("pg_stat_statements", database_name):
             return "Error: pg_stat_statements extension is not installed or enabled"
         
         # Limit range constraint
         limit = max(1, min(limit, 100))
         
+        if window:
+            return await format_top_statements(window, sort_by, limit, database_name)
+        
         data = await get_pg_stat_statements_data(limit, database=database_name)
         
         title = f"Top {limit} Queries by Total Execution Time (pg_stat_statements)"
@@ -1605,6 +1210,7 @@ async def get_pg_stat_statements_top_queries(limit: int = 20, database_name: str
 
 
 @mcp.tool()
+@structured_output
 async def get_pg_stat_monitor_recent_queries(limit: int = 20, database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze recently executed queries and detailed monitoring information using pg_stat_monitor extension
@@ -1633,7 +1239,7 @@ async def get_pg_stat_monitor_recent_queries(limit: int = 20, database_name: str
     """
     try:
         # Check extension exists
-        if not await check_extension_exists("pg_stat_monitor"):
+        if not await check_extension_exists("pg_stat_monitor", database_name):
             return "Error: pg_stat_monitor extension is not installed or enabled"
         
         # Limit range constraint
@@ -1653,6 +1259,8 @@ async def get_pg_stat_monitor_recent_queries(limit: int = 20, database_name: str
 
 
 @mcp.tool()
+@cached_tool(ttl=60, stale_while_revalidate=True)
+@structured_output
 async def get_database_size_info() -> str:
     """
     [Tool Purpose]: Analyze size information and storage usage status of all databases in PostgreSQL server
@@ -1661,6 +1269,7 @@ async def get_database_size_info() -> str:
     - Retrieve disk usage for each database
     - Analyze overall server storage usage status
     - Provide database list sorted by size
+    - May return the previous result labelled with its age while a refresh runs (when POSTGRES_TOOL_CACHE_MAX_STALE is set)
     
     [Required Use Cases]:
     - When user requests "database size", "disk usage", "storage space", etc.
@@ -1708,6 +1317,8 @@ async def get_database_size_info() -> str:
 
 
 @mcp.tool()
+@cached_tool(ttl=60, stale_while_revalidate=True)
+@structured_output
 async def get_table_size_info(schema_name: str = "public", database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze size information and index usage of all tables in specified schema
@@ -1716,6 +1327,7 @@ async def get_table_size_info(schema_name: str = "public", database_name: str =
     - Retrieve size information of all tables within schema
     - Analyze index size and total size per table
     - Provide table list sorted by size
+    - May return the previous result labelled with its age while a refresh runs (when POSTGRES_TOOL_CACHE_MAX_STALE is set)
     
     [Required Use Cases]:
     - When user requests "table size", "schema capacity", "index usage", etc.
@@ -1778,6 +1390,8 @@ async def get_table_size_info(schema_name: str = "public", database_name: str =
 
 
 @mcp.tool()
+@cached_tool(ttl=60)
+@structured_output
 async def get_postgresql_config(config_name: str = None, filter_text: str = None) -> str:
     """
     [Tool Purpose]: Retrieve and analyze PostgreSQL server configuration parameter values
@@ -1870,8 +1484,7 @@ async def get_postgresql_config(config_name: str = None, filter_text: str = None
             FROM pg_settings 
             ORDER BY category, name
             """
-            configs = await execute_query(query)
-            return format_table_data(configs, "All PostgreSQL Configuration Parameters")
+            return await stream_table_data(query, title="All PostgreSQL Configuration Parameters")
             
     except Exception as e:
         logger.error(f"Failed to get PostgreSQL config: {e}")
@@ -1879,6 +1492,7 @@ async def get_postgresql_config(config_name: str = None, filter_text: str = None
 
 
 @mcp.tool()
+@structured_output
 async def get_index_usage_stats(database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze usage rate and performance statistics of all indexes in database
@@ -1923,13 +1537,11 @@ async def get_index_usage_stats(database_name: str = None) -> str:
         ORDER BY idx_scan DESC, schemaname, relname, indexrelname
         """
         
-        indexes = await execute_query(query, database=database_name)
-        
         title = "Index Usage Statistics"
         if database_name:
             title += f" (Database: {database_name})"
             
-        return format_table_data(indexes, title)
+        return await stream_table_data(query, title=title, database=database_name)
         
     except Exception as e:
         logger.error(f"Failed to get index usage stats: {e}")
@@ -1937,6 +1549,7 @@ async def get_index_usage_stats(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_vacuum_analyze_stats(database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze VACUUM and ANALYZE execution history and statistics per table
@@ -2007,6 +1620,7 @@ async def get_vacuum_analyze_stats(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_table_bloat_analysis(database_name: str = None, schema_name: str = None, table_pattern: str = None, min_dead_tuples: int = 1, limit: int = 20) -> str:
     """
     [Tool Purpose]: Analyze table bloat based on dead tuple statistics and size information
@@ -2045,76 +1659,10 @@ async def get_table_bloat_analysis(database_name: str = None, schema_name: str =
         # Validate and constrain limit
         limit = max(1, min(limit, 100))
         
-        # Build WHERE clause based on parameters
-        where_conditions = []
-        params = []
-        param_index = 1
-        
-        # Schema filtering
-        if schema_name:
-            where_conditions.append(f"schemaname = ${param_index}")
-            params.append(schema_name)
-            param_index += 1
-        else:
-            # Exclude system schemas
-            where_conditions.append("schemaname NOT IN ('information_schema', 'pg_catalog')")
-            where_conditions.append("schemaname NOT LIKE 'pg_%'")
-        
-        # Table pattern filtering
-        if table_pattern:
-            where_conditions.append(f"relname ILIKE ${param_index}")
-            params.append(table_pattern)
-            param_index += 1
-        
-        # Dead tuples filtering
-        where_conditions.append(f"n_dead_tup >= ${param_index}")
-        params.append(min_dead_tuples)
-        param_index += 1
-        
-        # Add LIMIT parameter
-        params.append(limit)
-        
-        # Combine WHERE conditions
-        schema_filter = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        query = f"""
-        SELECT 
-            schemaname as schema_name,
-            relname as table_name,
-            pg_size_pretty(pg_total_relation_size(schemaname||'.'||relname)) as total_size,
-            pg_size_pretty(pg_relation_size(schemaname||'.'||relname)) as table_size,
-            n_dead_tup as dead_tuples,
-            n_live_tup as live_tuples,
-            CASE 
-                WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
-                ELSE round(100.0 * n_dead_tup / (n_live_tup + n_dead_tup), 2)
-            END as bloat_ratio_percent,
-            pg_size_pretty(
-                (pg_relation_size(schemaname||'.'||relname) * 
-                CASE 
-                    WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
-                    ELSE n_dead_tup::float / (n_live_tup + n_dead_tup)
-                END)::bigint
-            ) as estimated_bloat_size,
-            last_vacuum,
-            last_autovacuum,
-            CASE 
-                WHEN last_vacuum IS NULL AND last_autovacuum IS NULL THEN 'Never vacuumed'
-                WHEN last_vacuum IS NULL THEN 'Manual vacuum needed'
-                WHEN last_autovacuum IS NULL THEN 'Auto vacuum available'
-                WHEN last_vacuum > last_autovacuum THEN 'Recently manual vacuumed'
-                ELSE 'Recently auto vacuumed'
-            END as vacuum_status
-        FROM pg_stat_user_tables
-        {schema_filter}
-        ORDER BY 
-            CASE 
-                WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
-                ELSE 100.0 * n_dead_tup / (n_live_tup + n_dead_tup)
-            END DESC, 
-            n_dead_tup DESC
-        LIMIT ${len(params)}
-        """
+        # Unused filters are bound as NULL so every call shares one statement;
+        # without a schema, system schemas are excluded
+        params = [schema_name or None, table_pattern or None, min_dead_tuples, limit]
+        query = query_registry.render("table_bloat")
         
         bloat_stats = await execute_query(query, params, database=database_name)
         
@@ -2160,6 +1708,8 @@ async def get_table_bloat_analysis(database_name: str = None, schema_name: str =
 
 
 @mcp.tool()
+@cached_tool(ttl=60, stale_while_revalidate=True)
+@structured_output
 async def get_database_bloat_overview(database_name: str = None, limit: int = 20) -> str:
     """
     [Tool Purpose]: Provide database-wide bloat overview and summary statistics
@@ -2169,6 +1719,7 @@ async def get_database_bloat_overview(database_name: str = None, limit: int = 20
     - Identify schemas and tables with highest bloat ratios
     - Calculate total estimated bloat size per schema
     - Show aggregate dead tuple counts and maintenance status
+    - May return the previous result labelled with its age while a refresh runs (when POSTGRES_TOOL_CACHE_MAX_STALE is set)
     
     [Required Use Cases]:
     - When user requests "database bloat overview", "bloat summary", etc.
@@ -2247,6 +1798,7 @@ async def get_database_bloat_overview(database_name: str = None, limit: int = 20
 
 
 @mcp.tool()
+@structured_output
 async def get_autovacuum_status(database_name: str = None, schema_name: str = None, table_pattern: str = None, limit: int = 50) -> str:
     """
     [Tool Purpose]: Analyze autovacuum configuration and current maintenance status for tables
@@ -2395,6 +1947,7 @@ async def get_autovacuum_status(database_name: str = None, schema_name: str = No
 
 
 @mcp.tool()
+@structured_output
 async def get_autovacuum_activity(database_name: str = None, schema_name: str = None, hours_back: int = 24, limit: int = 50) -> str:
     """
     [Tool Purpose]: Monitor recent autovacuum and autoanalyze activity patterns and execution history
@@ -2544,6 +2097,7 @@ async def get_autovacuum_activity(database_name: str = None, schema_name: str =
 
 
 @mcp.tool()
+@structured_output
 async def get_running_vacuum_operations(database_name: str = None) -> str:
     """
     [Tool Purpose]: Monitor currently running VACUUM and ANALYZE operations in real-time
@@ -2650,6 +2204,7 @@ async def get_running_vacuum_operations(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_vacuum_effectiveness_analysis(database_name: str = None, schema_name: str = None, limit: int = 30) -> str:
     """
     [Tool Purpose]: Analyze VACUUM effectiveness and maintenance patterns using existing statistics
@@ -2801,7 +2356,8 @@ async def get_vacuum_effectiveness_analysis(database_name: str = None, schema_na
 
 
 @mcp.tool()
-async def get_database_stats() -> str:
+@structured_output
+async def get_database_stats(window: int = None) -> str:
     """
     [Tool Purpose]: Get comprehensive database-wide statistics and performance metrics
     
@@ -2823,10 +2379,18 @@ async def get_database_stats() -> str:
     - Requests for database configuration changes
     - Requests for performance tuning actions
     
+    Args:
+        window: Report deltas and per-second rates over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of cumulative counters (optional)
+    
     Returns:
         Comprehensive database statistics including transactions, I/O, tuples, and performance metrics
     """
     try:
+        if window:
+            return format_window_stats("database_stats", window, "Database Activity Rates",
+                                       sort_by="xact_commit_per_sec")
+
         version = await get_postgresql_version()
 
         # PG 18+ adds parallel worker tracking
@@ -2882,7 +2446,8 @@ async def get_database_stats() -> str:
 
 
 @mcp.tool()
-async def get_bgwriter_stats() -> str:
+@structured_output
+async def get_bgwriter_stats(window: int = None) -> str:
     """
     [Tool Purpose]: Analyze background writer and checkpoint performance statistics with version compatibility
     
@@ -2904,88 +2469,23 @@ async def get_bgwriter_stats() -> str:
     - Requests for background writer parameter modifications
     - Requests for statistics reset
     
+    Args:
+        window: Report deltas and per-second rates over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of cumulative counters (optional)
+    
     Returns:
         Background writer and checkpoint performance statistics with version-appropriate data
     """
     try:
+        if window:
+            return format_window_stats("bgwriter_stats", window, "Background Writer & Checkpointer Rates")
+
         pg_version = await get_postgresql_version()
 
+        query = await render_for_server("bgwriter_stats")
         if pg_version.has_checkpointer_view:
-            # PostgreSQL 17+: Separate checkpointer and bgwriter views
-            # PG 18 adds num_done and slru_written to pg_stat_checkpointer
-            checkpointer_extra_cols = ""
-            bgwriter_extra_null_cols = ""
-            if pg_version.has_checkpointer_v18:
-                checkpointer_extra_cols = """,
-                num_done as completed_checkpoints,
-                slru_written as slru_buffers_written"""
-
-                bgwriter_extra_null_cols = """,
-                0 as completed_checkpoints,
-                0 as slru_buffers_written"""
-
-            query = f"""
-            SELECT
-                'Checkpointer (PG17+)' as component,
-                num_timed as scheduled_checkpoints,
-                num_requested as requested_checkpoints,
-                num_timed + num_requested as total_checkpoints,
-                CASE
-                    WHEN (num_timed + num_requested) > 0 THEN
-                        ROUND((num_timed::numeric / (num_timed + num_requested)) * 100, 2)
-                    ELSE 0
-                END as scheduled_checkpoint_ratio_percent,
-                ROUND(write_time::numeric, 2) as checkpoint_write_time_ms,
-                ROUND(sync_time::numeric, 2) as checkpoint_sync_time_ms,
-                ROUND((write_time + sync_time)::numeric, 2) as total_checkpoint_time_ms,
-                buffers_written as buffers_written{checkpointer_extra_cols},
-                stats_reset as stats_reset_time
-            FROM pg_stat_checkpointer
-            UNION ALL
-            SELECT
-                'Background Writer (PG17+)' as component,
-                0 as scheduled_checkpoints,
-                0 as requested_checkpoints,
-                0 as total_checkpoints,
-                0 as scheduled_checkpoint_ratio_percent,
-                0 as checkpoint_write_time_ms,
-                0 as checkpoint_sync_time_ms,
-                0 as total_checkpoint_time_ms,
-                buffers_clean as buffers_written{bgwriter_extra_null_cols},
-                stats_reset as stats_reset_time
-            FROM pg_stat_bgwriter
-            """
             explanation = f"PostgreSQL {pg_version} detected - using separate checkpointer and bgwriter views"
         else:
-            # PostgreSQL 12-16: Combined bgwriter view with all columns
-            query = """
-            SELECT
-                'Combined BGWriter (PG12-16)' as component,
-                checkpoints_timed as scheduled_checkpoints,
-                checkpoints_req as requested_checkpoints,
-                checkpoints_timed + checkpoints_req as total_checkpoints,
-                CASE
-                    WHEN (checkpoints_timed + checkpoints_req) > 0 THEN
-                        ROUND((checkpoints_timed::numeric / (checkpoints_timed + checkpoints_req)) * 100, 2)
-                    ELSE 0
-                END as scheduled_checkpoint_ratio_percent,
-                ROUND(checkpoint_write_time::numeric, 2) as checkpoint_write_time_ms,
-                ROUND(checkpoint_sync_time::numeric, 2) as checkpoint_sync_time_ms,
-                ROUND((checkpoint_write_time + checkpoint_sync_time)::numeric, 2) as total_checkpoint_time_ms,
-                buffers_checkpoint as buffers_written_by_checkpoints,
-                buffers_clean as buffers_written_by_bgwriter,
-                buffers_backend as buffers_written_by_backend,
-                buffers_backend_fsync as backend_fsync_calls,
-                buffers_alloc as buffers_allocated,
-                maxwritten_clean as bgwriter_maxwritten_stops,
-                CASE
-                    WHEN buffers_clean > 0 AND maxwritten_clean > 0 THEN
-                        ROUND((maxwritten_clean::numeric / buffers_clean) * 100, 2)
-                    ELSE 0
-                END as bgwriter_stop_ratio_percent,
-                stats_reset as stats_reset_time
-            FROM pg_stat_bgwriter
-            """
             explanation = f"PostgreSQL {pg_version} detected - using combined bgwriter view (includes checkpointer)"
 
         stats = await execute_query(query)
@@ -3012,7 +2512,8 @@ async def get_bgwriter_stats() -> str:
 
 
 @mcp.tool()
-async def get_io_stats(limit: int = 20, database_name: str = None) -> str:
+@structured_output
+async def get_io_stats(limit: int = 20, database_name: str = None, window: int = None) -> str:
     """
     [Tool Purpose]: Analyze comprehensive I/O statistics across all database operations with version compatibility
     
@@ -3036,90 +2537,30 @@ async def get_io_stats(limit: int = 20, database_name: str = None) -> str:
     Args:
         limit: Maximum number of results to return (1-100, default 20)
         database_name: Target database name (optional)
+        window: Report deltas and per-second rates over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of cumulative counters (optional)
     
     Returns:
         Comprehensive I/O statistics with version-appropriate detail level
     """
     try:
         limit = max(1, min(limit, 100))
+        if window:
+            # pg_stat_io is cluster-wide, so the sampled data covers every database
+            return format_window_stats("io_stats", window, "I/O Rates (pg_stat_io)",
+                                       sort_by="reads_per_sec", limit=limit)
+
         pg_version = await get_postgresql_version(database_name)
         
+        query = await render_for_server("io_stats", database_name)
         if pg_version.has_pg_stat_io:
-            # PostgreSQL 16+: Use comprehensive pg_stat_io
-            # PG 18+ adds read_bytes/write_bytes/extend_bytes
-            byte_cols = ""
-            if pg_version.has_pg_stat_io_bytes:
-                byte_cols = """,
-                pg_size_pretty(read_bytes) as read_bytes_pretty,
-                pg_size_pretty(write_bytes) as write_bytes_pretty,
-                pg_size_pretty(extend_bytes) as extend_bytes_pretty"""
-
-            query = f"""
-            SELECT
-                backend_type,
-                object,
-                context,
-                reads,
-                ROUND(read_time::numeric, 2) as read_time_ms,
-                writes,
-                ROUND(write_time::numeric, 2) as write_time_ms,
-                extends,
-                ROUND(extend_time::numeric, 2) as extend_time_ms{byte_cols},
-                hits,
-                evictions,
-                reuses,
-                fsyncs,
-                ROUND(fsync_time::numeric, 2) as fsync_time_ms,
-                CASE
-                    WHEN (reads + hits) > 0 THEN
-                        ROUND((hits::numeric / (reads + hits)) * 100, 2)
-                    ELSE 0
-                END as hit_ratio_percent
-            FROM pg_stat_io
-            WHERE reads > 0 OR writes > 0 OR hits > 0 OR extends > 0 OR fsyncs > 0
-            ORDER BY (reads + writes + extends) DESC
-            LIMIT {limit}
-            """
             title = f"Comprehensive I/O Statistics (pg_stat_io - PostgreSQL {pg_version})"
             explanation = "Detailed I/O statistics showing all backend types, contexts, and timing information"
         else:
-            # PostgreSQL 12-15: Fall back to pg_statio_* views
-            query = f"""
-            SELECT 
-                'relation I/O (fallback)' as backend_type,
-                'heap+index+toast' as object,
-                'basic' as context,
-                (heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) as reads,
-                0 as read_time_ms,
-                0 as writes,
-                0 as write_time_ms,
-                0 as extends,
-                0 as extend_time_ms,
-                (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit) as hits,
-                0 as evictions,
-                0 as reuses,
-                0 as fsyncs,
-                0 as fsync_time_ms,
-                CASE 
-                    WHEN ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) + 
-                          (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)) > 0 THEN
-                        ROUND(((heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)::numeric / 
-                               ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) +
-                                (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit))) * 100, 2)
-                    ELSE 0
-                END as hit_ratio_percent,
-                schemaname || '.' || relname as table_name
-            FROM pg_statio_all_tables
-            WHERE (heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read +
-                   heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit) > 0
-            ORDER BY ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) + 
-                     (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)) DESC
-            LIMIT {limit}
-            """
             title = f"Basic I/O Statistics (pg_statio_* fallback - PostgreSQL {pg_version})"
             explanation = "Basic I/O statistics from pg_statio_* views - limited data available on this version"
         
-        stats = await execute_query(query, database=database_name)
+        stats = await execute_query(query, [limit], database=database_name)
         
         if not stats:
             return "No I/O statistics found"
@@ -3151,7 +2592,8 @@ async def get_io_stats(limit: int = 20, database_name: str = None) -> str:
 
 
 @mcp.tool()
-async def get_table_io_stats(database_name: str = None, schema_name: str = "public") -> str:
+@structured_output
+async def get_table_io_stats(database_name: str = None, schema_name: str = "public", window: int = None) -> str:
     """
     [Tool Purpose]: Analyze I/O performance statistics for tables (disk reads vs buffer cache hits)
     
@@ -3175,11 +2617,17 @@ async def get_table_io_stats(database_name: str = None, schema_name: str = "publ
     Args:
         database_name: Database name to analyze (uses default database if omitted)
         schema_name: Schema name to filter (default: public)
+        window: Report deltas and per-second rates over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of cumulative counters (optional)
     
     Returns:
         Table I/O statistics including heap, index, and TOAST performance metrics
     """
     try:
+        if window:
+            return format_window_stats("table_io_stats", window, "Table I/O Rates", database=database_name,
+                                       sort_by="heap_blks_read_per_sec", schema_name=schema_name)
+
         # Build WHERE clause with proper filtering for schema and non-empty I/O stats
         where_conditions = []
         params = []
@@ -3229,8 +2677,6 @@ async def get_table_io_stats(database_name: str = None, schema_name: str = "publ
         ORDER BY total_disk_reads DESC, schemaname, relname
         """
         
-        stats = await execute_query(query, params, database=database_name)
-        
         title = "Table I/O Statistics"
         if database_name:
             title += f" (Database: {database_name}"
@@ -3240,7 +2686,7 @@ async def get_table_io_stats(database_name: str = None, schema_name: str = "publ
         elif schema_name:
             title += f" (Schema: {schema_name})"
             
-        return format_table_data(stats, title)
+        return await stream_table_data(query, params, title=title, database=database_name)
         
     except Exception as e:
         logger.error(f"Failed to get table I/O stats: {e}")
@@ -3248,6 +2694,7 @@ async def get_table_io_stats(database_name: str = None, schema_name: str = "publ
 
 
 @mcp.tool()
+@structured_output
 async def get_index_io_stats(database_name: str = None, schema_name: str = "public") -> str:
     """
     [Tool Purpose]: Analyze I/O performance statistics for indexes (disk reads vs buffer cache hits)
@@ -3335,7 +2782,8 @@ async def get_index_io_stats(database_name: str = None, schema_name: str = "publ
 
 
 @mcp.tool()
-async def get_all_tables_stats(database_name: str = None, include_system: bool = False) -> str:
+@structured_output
+async def get_all_tables_stats(database_name: str = None, include_system: bool = False, window: int = None) -> str:
     """
     [Tool Purpose]: Get comprehensive statistics for all tables (including system tables if requested)
     
@@ -3359,14 +2807,19 @@ async def get_all_tables_stats(database_name: str = None, include_system: bool =
     Args:
         database_name: Database name to analyze (uses default database if omitted)
         include_system: Include system tables in results (default: False)
+        window: Report deltas and per-second rates over the last N seconds from the background
+                sampler (POSTGRES_SAMPLER_INTERVAL) instead of cumulative counters (optional)
     
     Returns:
         Comprehensive table statistics including access patterns and maintenance history
     """
     try:
+        if window:
+            return format_window_stats("all_tables_stats", window, "Table Access Rates", database=database_name,
+                                       sort_by="seq_tup_read_per_sec", include_system=include_system)
+
         # Use version-compatible query
         query = await VersionAwareQueries.get_all_tables_stats_query(include_system, database_name)
-        stats = await execute_query(query, database=database_name)
         
         title = "All Tables Statistics"
         if include_system:
@@ -3374,7 +2827,7 @@ async def get_all_tables_stats(database_name: str = None, include_system: bool =
         if database_name:
             title += f" (Database: {database_name})"
             
-        return format_table_data(stats, title)
+        return await stream_table_data(query, title=title, database=database_name)
         
     except Exception as e:
         logger.error(f"Failed to get all tables stats: {e}")
@@ -3382,6 +2835,54 @@ async def get_all_tables_stats(database_name: str = None, include_system: bool =
 
 
 @mcp.tool()
+@structured_output
+async def export_statistics_snapshot(database_names: List[str] = None, datasets: List[str] = None,
+                                     file_format: str = "parquet", include_system: bool = False) -> str:
+    """
+    [Tool Purpose]: Write table, table I/O, and index usage statistics of many databases to Parquet or Arrow IPC files
+    
+    [Exact Functionality]:
+    - Export pg_stat_user_tables (or pg_stat_all_tables), pg_statio_user_tables and pg_stat_user_indexes
+    - Keep PostgreSQL types as typed Arrow columns (counters, OIDs, timestamps), without text conversion
+    - Write <POSTGRES_EXPORT_DIR>/<dataset>/database=<name>/<snapshot>.<format>, one file per database and view
+    - Report the files written with row counts and sizes
+    
+    [Required Use Cases]:
+    - When user requests "export table statistics", "snapshot stats to parquet", "capacity planning export", etc.
+    - When statistics of thousands of tables or hundreds of databases are needed for offline analysis
+    
+    [Strictly Prohibited Use Cases]:
+    - Answering questions about statistics directly (use get_all_tables_stats, get_table_io_stats, get_index_usage_stats)
+    - Writing anywhere other than POSTGRES_EXPORT_DIR
+    - Exporting table contents
+    
+    Args:
+        database_names: Databases to export (default: every database that accepts connections)
+        datasets: Any of "all_tables_stats", "table_io_stats", "index_usage_stats" (default: all three)
+        file_format: "parquet" (default) or "arrow" (Arrow IPC file)
+        include_system: Export pg_stat_all_tables instead of pg_stat_user_tables (default: False)
+    
+    Returns:
+        One row per file written with dataset, database, rows, file size, and path (or the error)
+    """
+    try:
+        directory = EXPORT_CONFIG["directory"]
+        if not directory:
+            return "Error: statistics export is disabled; set POSTGRES_EXPORT_DIR to the directory to write to"
+        
+        summary = await export_statistics(directory, datasets, database_names, file_format, include_system)
+        failed = sum(1 for row in summary if row["error"])
+        title = f"Statistics Export to {directory} ({len(summary) - failed} files written"
+        title += f", {failed} failed)" if failed else ")"
+        return format_table_data(summary, title)
+        
+    except Exception as e:
+        logger.error(f"Failed to export statistics: {e}")
+        return f"Error exporting statistics: {str(e)}"
+
+
+@mcp.tool()
+@structured_output
 async def get_user_functions_stats(database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze performance statistics for user-defined functions
@@ -3457,6 +2958,7 @@ async def get_user_functions_stats(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_database_conflicts_stats(database_name: str = None) -> str:
     """
     [Tool Purpose]: Analyze query conflicts in standby/replica database environments
@@ -3530,6 +3032,7 @@ async def get_database_conflicts_stats(database_name: str = None) -> str:
 # =============================================================================
 
 @mcp.tool()
+@structured_output
 async def get_wait_events(database_name: str = None, wait_event_type: str = None) -> str:
     """
     [Tool Purpose]: List available wait event types and their descriptions (PostgreSQL 17+)
@@ -3576,8 +3079,6 @@ async def get_wait_events(database_name: str = None, wait_event_type: str = None
             ORDER BY type, name
             """
 
-            events = await execute_query(query, params, database=database_name)
-
             summary_query = """
             SELECT
                 wait_event_type,
@@ -3588,7 +3089,7 @@ async def get_wait_events(database_name: str = None, wait_event_type: str = None
             GROUP BY wait_event_type, wait_event
             ORDER BY COUNT(*) DESC
             """
-            summary = await execute_query(summary_query, database=database_name)
+            events, summary = await execute_queries([(query, params), summary_query], database=database_name)
 
             result = []
             title = "Wait Event Catalog (pg_wait_events)"
@@ -3636,6 +3137,49 @@ async def get_wait_events(database_name: str = None, wait_event_type: str = None
 
 
 @mcp.tool()
+@structured_output
+async def get_active_session_history(window: int = 300, group_by: str = "wait_event", limit: int = 20,
+                                     database_name: str = None) -> str:
+    """
+    [Tool Purpose]: Break down recent database time by wait event, query, user, database, or session
+    using the in-memory Active Session History (ASH) sampler
+
+    [Exact Functionality]:
+    - Aggregate pg_stat_activity samples taken every POSTGRES_SAMPLER_ACTIVITY_INTERVAL seconds
+    - Estimate DB time, share of DB time, and average active sessions per group
+    - Count active sessions without a wait event as "CPU"
+    - Catch short waits that a single pg_stat_activity snapshot misses; answered from memory
+
+    [Required Use Cases]:
+    - When user requests "what were sessions waiting on", "DB time by wait event", "ASH", etc.
+    - When finding which queries or users consumed the most database time in the last minutes
+    - When diagnosing intermittent slowness after it happened
+
+    [Strictly Prohibited Use Cases]:
+    - Requests for session termination or wait resolution
+    - Requests for history older than the sampler's buffer (POSTGRES_SAMPLER_ACTIVITY_ROWS)
+    - Requests for configuration changes
+
+    Args:
+        window: Look back this many seconds (default: 300)
+        group_by: "wait_event", "query", "user", "database", or "session" (default: "wait_event")
+        limit: Maximum number of groups to return (default: 20, max: 100)
+        database_name: Only count sessions connected to this database (optional)
+
+    Returns:
+        Groups ordered by sampled DB time with samples, DB time, percentage, and average active sessions
+    """
+    try:
+        limit = max(1, min(limit, 100))
+        return format_session_history(window, group_by, limit, database_name)
+
+    except Exception as e:
+        logger.error(f"Failed to get active session history: {e}")
+        return f"Error retrieving active session history: {str(e)}"
+
+
+@mcp.tool()
+@structured_output
 async def get_wal_summarizer_status(database_name: str = None) -> str:
     """
     [Tool Purpose]: Monitor WAL summarizer status for incremental backup support (PostgreSQL 17+)
@@ -3710,6 +3254,7 @@ async def get_wal_summarizer_status(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_async_io_status(database_name: str = None) -> str:
     """
     [Tool Purpose]: Monitor asynchronous I/O subsystem status (PostgreSQL 18+)
@@ -3772,6 +3317,7 @@ async def get_async_io_status(database_name: str = None) -> str:
 
 
 @mcp.tool()
+@structured_output
 async def get_per_backend_io_stats(database_name: str = None, limit: int = 20) -> str:
     """
     [Tool Purpose]: Analyze per-backend I/O and WAL statistics (PostgreSQL 18+)
@@ -3892,6 +3438,7 @@ async def get_per_backend_io_stats(database_name: str = None, limit: int = 20) -
 # =============================================================================
 
 @mcp.tool()
+@structured_output
 async def get_prompt_template(section: Optional[str] = None, mode: Optional[str] = None) -> str:
     """
     Returns the MCP prompt template (full, headings, or specific section).
@@ -0,0 +1,849 @@
+"""
+Background Metrics Sampler
+
+Periodically snapshots cumulative pg_stat views into fixed-size ring buffers
+so statistics tools can report deltas and per-second rates over a recent
+window without an extra database round trip. A second, faster sampler keeps
+an Active Session History of pg_stat_activity for wait-event analysis.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from array import array
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install mcp-postgresql-ops[fast]
+    np = None
+
+from .functions import (
+    POSTGRES_CONFIG,
+    check_extension_exists,
+    execute_query,
+    format_table_data,
+    gather_with_limit,
+)
+from .version_compat import PostgreSQLVersion, get_postgresql_version, query_registry
+
+logger = logging.getLogger(__name__)
+
+# Sampler configuration (interval 0 keeps the sampler off)
+SAMPLER_CONFIG = {
+    "interval": float(os.getenv("POSTGRES_SAMPLER_INTERVAL", "0")),
+    "samples": int(os.getenv("POSTGRES_SAMPLER_SAMPLES", "120")),
+    # Databases whose per-table views are sampled (default: POSTGRES_DB)
+    "databases": [name.strip() for name in os.getenv("POSTGRES_SAMPLER_DATABASES", "").split(",") if name.strip()],
+    # pg_stat_statements snapshots kept (each holds every statement entry)
+    "statement_samples": int(os.getenv("POSTGRES_SAMPLER_STATEMENT_SAMPLES", "60")),
+    # Active Session History: pg_stat_activity poll interval (0 disables) and rows kept
+    "activity_interval": float(os.getenv("POSTGRES_SAMPLER_ACTIVITY_INTERVAL", "0")),
+    "activity_rows": int(os.getenv("POSTGRES_SAMPLER_ACTIVITY_ROWS", "100000")),
+}
+
+NAN = float("nan")
+
+
+class RingBuffer:
+    """Fixed-size ring of counter snapshots backed by array('d').
+
+    Each series (one row of a stats view, identified by its key columns)
+    holds capacity * len(columns) doubles; NaN marks a sample in which the
+    row was absent. Series not seen for a full cycle are dropped.
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int):
+        self.columns = list(columns)
+        self.capacity = max(2, capacity)
+        self.times = array('d', [0.0]) * self.capacity
+        self.series: Dict[Tuple[Any, ...], array] = {}
+        self.last_seen: Dict[Tuple[Any, ...], int] = {}
+        self.count = 0
+
+    def append(self, timestamp: float, rows: Dict[Tuple[Any, ...], Sequence[Optional[float]]]) -> None:
+        """Store one snapshot, overwriting the oldest slot when full."""
+        width = len(self.columns)
+        slot = self.count % self.capacity
+        start, end = slot * width, (slot + 1) * width
+        self.times[slot] = timestamp
+
+        for key, values in rows.items():
+            data = self.series.get(key)
+            if data is None:
+                data = self.series[key] = array('d', [NAN]) * (self.capacity * width)
+            data[start:end] = array('d', (NAN if value is None else float(value) for value in values))
+            self.last_seen[key] = self.count
+
+        empty = array('d', [NAN]) * width
+        for key in list(self.series):
+            if key in rows:
+                continue
+            if self.count - self.last_seen[key] >= self.capacity:
+                del self.series[key]
+                del self.last_seen[key]
+            else:
+                self.series[key][start:end] = empty
+
+        self.count += 1
+
+    def window(self, seconds: float) -> Optional[Tuple[float, Dict[Tuple[Any, ...], List[Optional[float]]]]]:
+        """Return (elapsed seconds, key -> per-column deltas) over the last window.
+
+        The newest sample is compared with the oldest one that is still
+        inside the window (at least the previous sample). A delta is None
+        when the row is missing from either sample or the counter was reset.
+        """
+        available = min(self.count, self.capacity)
+        if available < 2:
+            return None
+
+        newest = (self.count - 1) % self.capacity
+        first = (newest - 1) % self.capacity
+        for back in range(2, available):
+            candidate = (newest - back) % self.capacity
+            if self.times[newest] - self.times[candidate] > seconds:
+                break
+            first = candidate
+
+        elapsed = self.times[newest] - self.times[first]
+        if elapsed <= 0:
+            return None
+
+        width = len(self.columns)
+        deltas = {}
+        for key, data in self.series.items():
+            row = []
+            for column in range(width):
+                before = data[first * width + column]
+                after = data[newest * width + column]
+                if math.isnan(before) or math.isnan(after) or after < before:
+                    row.append(None)
+                else:
+                    row.append(after - before)
+            deltas[key] = row
+        return elapsed, deltas
+
+
+STATEMENT_KEY = ("userid", "dbid", "queryid")
+STATEMENT_COUNTERS = [
+    "calls", "total_exec_time", "rows", "shared_blks_hit", "shared_blks_read",
+    "shared_blks_written", "temp_blks_read", "temp_blks_written",
+]
+# Ranking expressions for StatementSnapshots.top(): counter name -> weight
+STATEMENT_RANKINGS = {
+    "time": {"total_exec_time": 1},
+    "calls": {"calls": 1},
+    "rows": {"rows": 1},
+    "io": {"shared_blks_read": 1, "shared_blks_written": 1, "temp_blks_read": 1, "temp_blks_written": 1},
+}
+
+
+class StatementSnapshots:
+    """Ring of pg_stat_statements snapshots keyed by (userid, dbid, queryid).
+
+    Keys are interned to dense indices, so a snapshot is just an index
+    vector plus a (rows x counters) matrix, and diffing two snapshots is
+    a scatter into dense arrays followed by one subtraction. NumPy is used
+    when installed; otherwise the same layout is kept in array('q'/'d').
+    """
+
+    def __init__(self, capacity: int):
+        self.samples: deque = deque(maxlen=max(2, capacity))
+        self.index: Dict[Tuple[int, int, int], int] = {}
+        self.keys: List[Tuple[int, int, int]] = []
+        self.key_dbids = array('q')
+        self.compact_at = 2048
+
+    def _intern(self, key: Tuple[int, int, int]) -> int:
+        slot = self.index.get(key)
+        if slot is None:
+            slot = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.key_dbids.append(key[1])
+        return slot
+
+    def append(self, timestamp: float, rows: Sequence[Dict[str, Any]]) -> None:
+        """Store one snapshot of pg_stat_statements rows."""
+        width = len(STATEMENT_COUNTERS)
+        slots = array('q', (self._intern(tuple(row[column] for column in STATEMENT_KEY)) for row in rows))
+        values = array('d', (float(row[counter] or 0) for row in rows for counter in STATEMENT_COUNTERS))
+        if np is not None:
+            slots = np.frombuffer(slots, dtype=np.int64).copy()
+            values = np.frombuffer(values, dtype=np.float64).reshape(-1, width).copy()
+        self.samples.append((timestamp, slots, values))
+        self._compact()
+
+    def _compact(self) -> None:
+        """Forget keys that no retained snapshot references (statement churn).
+
+        Runs once the key table has doubled since the last compaction, so the
+        cost stays amortized over appends.
+        """
+        if len(self.keys) <= self.compact_at:
+            return
+        if np is not None:
+            live = np.unique(np.concatenate([slots for _, slots, _ in self.samples]))
+            remap = np.full(len(self.keys), -1, dtype=np.int64)
+            remap[live] = np.arange(len(live))
+            self.samples = deque(
+                ((t, remap[slots], values) for t, slots, values in self.samples), maxlen=self.samples.maxlen
+            )
+            live = live.tolist()
+        else:
+            live = sorted({slot for _, slots, _ in self.samples for slot in slots})
+            remap = {old: new for new, old in enumerate(live)}
+            self.samples = deque(
+                ((t, array('q', (remap[slot] for slot in slots)), values) for t, slots, values in self.samples),
+                maxlen=self.samples.maxlen,
+            )
+        self.keys = [self.keys[slot] for slot in live]
+        self.key_dbids = array('q', (key[1] for key in self.keys))
+        self.index = {key: slot for slot, key in enumerate(self.keys)}
+        self.compact_at = max(2 * len(self.keys), 2048)
+
+    def _bounds(self, seconds: float) -> Optional[Tuple[Any, Any]]:
+        if len(self.samples) < 2:
+            return None
+        newest = self.samples[-1]
+        first = self.samples[-2]
+        for sample in reversed(list(self.samples)[:-2]):
+            if newest[0] - sample[0] > seconds:
+                break
+            first = sample
+        return first, newest
+
+    def diff(self, seconds: float) -> Optional[Tuple[float, Any, Any]]:
+        """Return (elapsed, key slots, per-counter deltas) over the window.
+
+        Statements missing from the older snapshot count from zero (they
+        appeared inside the window); a counter that went backwards was reset,
+        so its current value is the delta. With NumPy the slots and deltas are
+        arrays, otherwise lists.
+        """
+        bounds = self._bounds(seconds)
+        if bounds is None:
+            return None
+        (t0, old_slots, old_values), (t1, new_slots, new_values) = bounds
+        elapsed = t1 - t0
+        if elapsed <= 0:
+            return None
+        width = len(STATEMENT_COUNTERS)
+
+        if np is not None:
+            before = np.zeros((len(self.keys), width))
+            before[old_slots] = old_values
+            delta = new_values - before[new_slots]
+            return elapsed, new_slots, np.where(delta < 0, new_values, delta)
+
+        before = {}
+        for position, slot in enumerate(old_slots):
+            before[slot] = old_values[position * width:(position + 1) * width]
+        deltas = []
+        for position, slot in enumerate(new_slots):
+            current = new_values[position * width:(position + 1) * width]
+            previous = before.get(slot)
+            if previous is None:
+                deltas.append(list(current))
+            else:
+                deltas.append([c - p if c >= p else c for c, p in zip(current, previous)])
+        return elapsed, list(new_slots), deltas
+
+    def top(self, seconds: float, sort_by: str = "time", limit: int = 20,
+            dbid: int = None) -> Optional[Tuple[float, List[Tuple[Tuple[int, int, int], Dict[str, float]]]]]:
+        """Return (elapsed, [(key, counter deltas)]) of the busiest statements.
+
+        Statements with no activity for the ranking are left out; dbid limits
+        the ranking to one database.
+        """
+        weights = STATEMENT_RANKINGS[sort_by]
+        columns = [STATEMENT_COUNTERS.index(name) for name in weights]
+        result = self.diff(seconds)
+        if result is None:
+            return None
+        elapsed, slots, deltas = result
+
+        if np is not None:
+            if not len(slots):
+                return elapsed, []
+            score = deltas[:, columns] @ np.asarray(list(weights.values()), dtype=np.float64)
+            if dbid is not None:
+                score[np.frombuffer(self.key_dbids, dtype=np.int64)[slots] != dbid] = 0
+            count = min(limit, len(score))
+            best = np.argpartition(-score, count - 1)[:count]
+            order = best[np.argsort(-score[best], kind="stable")]
+            ranked = [int(i) for i in order if score[i] > 0]
+            return elapsed, [
+                (self.keys[int(slots[i])], dict(zip(STATEMENT_COUNTERS, deltas[i].tolist()))) for i in ranked
+            ]
+
+        scores = [sum(row[c] * w for c, w in zip(columns, weights.values())) for row in deltas]
+        if dbid is not None:
+            scores = [score if self.key_dbids[slot] == dbid else 0 for slot, score in zip(slots, scores)]
+        ranked = [i for i in heapq.nlargest(limit, range(len(scores)), key=scores.__getitem__) if scores[i] > 0]
+        return elapsed, [
+            (self.keys[slots[i]], dict(zip(STATEMENT_COUNTERS, deltas[i]))) for i in ranked
+        ]
+
+
+class MetricSource:
+    """A cumulative stats view: key columns identify rows, counters are sampled."""
+
+    def __init__(self, name: str, key_columns: Sequence[str], counters: Sequence[str],
+                 per_database: bool = False, min_version: int = 12):
+        self.name = name
+        self.key_columns = list(key_columns)
+        self.counters = list(counters)
+        self.per_database = per_database
+        self.min_version = min_version
+
+    def available(self, version: PostgreSQLVersion) -> bool:
+        return version >= self.min_version
+
+
+METRIC_SOURCES = {
+    source.name: source for source in (
+        MetricSource(
+            "database_stats", ["database_name"],
+            ["xact_commit", "xact_rollback", "blks_read", "blks_hit", "tup_returned", "tup_fetched",
+             "tup_inserted", "tup_updated", "tup_deleted", "temp_files", "temp_bytes", "deadlocks"],
+        ),
+        MetricSource(
+            "bgwriter_stats", ["component"],
+            ["checkpoints_timed", "checkpoints_req", "buffers_checkpoint", "buffers_clean",
+             "buffers_alloc", "maxwritten_clean"],
+        ),
+        MetricSource(
+            "io_stats", ["backend_type", "object", "context"],
+            ["reads", "writes", "extends", "hits", "evictions", "reuses", "fsyncs"],
+            min_version=16,
+        ),
+        MetricSource(
+            "table_io_stats", ["schema_name", "table_name"],
+            ["heap_blks_read", "heap_blks_hit", "idx_blks_read", "idx_blks_hit",
+             "toast_blks_read", "toast_blks_hit"],
+            per_database=True,
+        ),
+        MetricSource(
+            "all_tables_stats", ["schema_name", "table_name"],
+            ["seq_scan", "seq_tup_read", "idx_scan", "idx_tup_fetch", "n_tup_ins", "n_tup_upd",
+             "n_tup_del", "n_tup_hot_upd"],
+            per_database=True,
+        ),
+    )
+}
+
+
+@query_registry.template("sample_database_stats")
+def _sample_database_stats_sql(version: PostgreSQLVersion) -> str:
+    return """
+    SELECT datname AS database_name, xact_commit, xact_rollback, blks_read, blks_hit,
+           tup_returned, tup_fetched, tup_inserted, tup_updated, tup_deleted,
+           temp_files, temp_bytes, deadlocks
+    FROM pg_stat_database
+    WHERE datname IS NOT NULL
+    """
+
+
+@query_registry.template("sample_bgwriter_stats")
+def _sample_bgwriter_stats_sql(version: PostgreSQLVersion) -> str:
+    if version.has_checkpointer_view:
+        # PostgreSQL 17+: checkpoint counters moved to pg_stat_checkpointer
+        return """
+        SELECT 'cluster' AS component,
+               c.num_timed AS checkpoints_timed, c.num_requested AS checkpoints_req,
+               c.buffers_written AS buffers_checkpoint, b.buffers_clean,
+               b.buffers_alloc, b.maxwritten_clean
+        FROM pg_stat_checkpointer c, pg_stat_bgwriter b
+        """
+    return """
+    SELECT 'cluster' AS component, checkpoints_timed, checkpoints_req, buffers_checkpoint,
+           buffers_clean, buffers_alloc, maxwritten_clean
+    FROM pg_stat_bgwriter
+    """
+
+
+@query_registry.template("sample_io_stats")
+def _sample_io_stats_sql(version: PostgreSQLVersion) -> str:
+    return """
+    SELECT backend_type, object, context, reads, writes, extends, hits, evictions, reuses, fsyncs
+    FROM pg_stat_io
+    """
+
+
+@query_registry.template("sample_table_io_stats")
+def _sample_table_io_stats_sql(version: PostgreSQLVersion) -> str:
+    return """
+    SELECT schemaname AS schema_name, relname AS table_name, heap_blks_read, heap_blks_hit,
+           idx_blks_read, idx_blks_hit, toast_blks_read, toast_blks_hit
+    FROM pg_statio_user_tables
+    """
+
+
+@query_registry.template("sample_all_tables_stats")
+def _sample_all_tables_stats_sql(version: PostgreSQLVersion) -> str:
+    return """
+    SELECT schemaname AS schema_name, relname AS table_name, seq_scan, seq_tup_read,
+           idx_scan, idx_tup_fetch, n_tup_ins, n_tup_upd, n_tup_del, n_tup_hot_upd
+    FROM pg_stat_all_tables
+    """
+
+
+@query_registry.template("sample_pg_stat_statements")
+def _sample_pg_stat_statements_sql(version: PostgreSQLVersion) -> str:
+    # showtext => false keeps the snapshot small; texts are fetched for top-N only.
+    # PG 14+ splits entries by toplevel, so sum them per (userid, dbid, queryid)
+    time_column = "total_exec_time" if version.has_pg_stat_statements_exec_time else "total_time"
+    return f"""
+    SELECT userid::bigint AS userid, dbid::bigint AS dbid, queryid,
+           sum(calls) AS calls, sum({time_column}) AS total_exec_time, sum(rows) AS rows,
+           sum(shared_blks_hit) AS shared_blks_hit, sum(shared_blks_read) AS shared_blks_read,
+           sum(shared_blks_written) AS shared_blks_written, sum(temp_blks_read) AS temp_blks_read,
+           sum(temp_blks_written) AS temp_blks_written
+    FROM pg_stat_statements(false)
+    WHERE queryid IS NOT NULL
+    GROUP BY userid, dbid, queryid
+    """
+
+
+class MetricsSampler:
+    """Samples every MetricSource on a fixed interval into RingBuffers."""
+
+    def __init__(self):
+        self.rings: Dict[Tuple[str, Optional[str]], RingBuffer] = {}
+        self.statements: Optional[StatementSnapshots] = None
+        self.task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def _databases(self) -> List[str]:
+        return SAMPLER_CONFIG["databases"] or [POSTGRES_CONFIG["database"]]
+
+    async def _sample(self, source: MetricSource, version: PostgreSQLVersion, database: Optional[str]) -> None:
+        try:
+            rows = await execute_query(query_registry.render(f"sample_{source.name}", version), database=database)
+        except Exception as e:
+            self.last_error = f"{source.name}: {e}"
+            logger.warning(f"Metrics sample of {source.name} failed: {e}")
+            return
+        snapshot = {
+            tuple(row[column] for column in source.key_columns): [row[counter] for counter in source.counters]
+            for row in rows
+        }
+        key = (source.name, database)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = RingBuffer(source.counters, SAMPLER_CONFIG["samples"])
+        ring.append(time.monotonic(), snapshot)
+
+    async def _sample_statements(self, version: PostgreSQLVersion) -> None:
+        # pg_stat_statements is cluster-wide but readable only where it is installed
+        if not await check_extension_exists("pg_stat_statements"):
+            return
+        try:
+            rows = await execute_query(query_registry.render("sample_pg_stat_statements", version))
+        except Exception as e:
+            self.last_error = f"pg_stat_statements: {e}"
+            logger.warning(f"Metrics sample of pg_stat_statements failed: {e}")
+            return
+        if self.statements is None:
+            self.statements = StatementSnapshots(SAMPLER_CONFIG["statement_samples"])
+        self.statements.append(time.monotonic(), rows)
+
+    async def sample_once(self) -> None:
+        """Take one snapshot of every available source."""
+        version = await get_postgresql_version()
+        jobs = [self._sample_statements(version)]
+        for source in METRIC_SOURCES.values():
+            if not source.available(version):
+                continue
+            for database in (self._databases() if source.per_database else [None]):
+                jobs.append(self._sample(source, version, database))
+        await gather_with_limit(*jobs)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Metrics sampling failed: {e}")
+            await asyncio.sleep(SAMPLER_CONFIG["interval"])
+
+    def start(self) -> None:
+        """Start sampling if POSTGRES_SAMPLER_INTERVAL is set."""
+        if SAMPLER_CONFIG["interval"] > 0 and not self.running:
+            logger.info(f"Starting metrics sampler (every {SAMPLER_CONFIG['interval']}s, {SAMPLER_CONFIG['samples']} samples)")
+            self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def window_rows(self, source_name: str, window: int, database: str = None) -> Tuple[float, List[Dict[str, Any]]]:
+        """Return (covered seconds, rows) of deltas and per-second rates for a source.
+
+        Each row holds the source's key columns followed by <counter>_delta
+        and <counter>_per_sec for every sampled counter.
+        """
+        source = METRIC_SOURCES[source_name]
+        if source.per_database:
+            database = database or POSTGRES_CONFIG["database"]
+            if database not in self._databases():
+                raise Exception(f"Database '{database}' is not sampled; add it to POSTGRES_SAMPLER_DATABASES")
+        else:
+            database = None
+
+        ring = self.rings.get((source_name, database))
+        result = ring.window(window) if ring is not None else None
+        if result is None:
+            if not self.running:
+                raise Exception("Window statistics need the background sampler; set POSTGRES_SAMPLER_INTERVAL")
+            raise Exception("Not enough samples collected yet; retry after the next sampling interval")
+
+        elapsed, deltas = result
+        rows = []
+        for key, values in deltas.items():
+            row = dict(zip(source.key_columns, key))
+            for counter, delta in zip(source.counters, values):
+                row[f"{counter}_delta"] = None if delta is None else int(delta)
+                row[f"{counter}_per_sec"] = None if delta is None else round(delta / elapsed, 2)
+            rows.append(row)
+        return elapsed, rows
+
+    def top_statements(self, window: int, sort_by: str = "time", limit: int = 20, dbid: int = None):
+        """Return (covered seconds, [(key, counter deltas)]) for the busiest statements."""
+        if sort_by not in STATEMENT_RANKINGS:
+            raise Exception(f"Invalid sort_by '{sort_by}'; use one of: {', '.join(STATEMENT_RANKINGS)}")
+        result = self.statements.top(window, sort_by, limit, dbid) if self.statements is not None else None
+        if result is None:
+            if not self.running:
+                raise Exception("Window statistics need the background sampler; set POSTGRES_SAMPLER_INTERVAL")
+            raise Exception(
+                "Not enough pg_stat_statements samples collected yet (is the extension installed?); "
+                "retry after the next sampling interval"
+            )
+        return result
+
+
+metrics_sampler = MetricsSampler()
+
+
+def format_window_stats(source_name: str, window: int, title: str, database: str = None,
+                        sort_by: str = None, limit: int = None, schema_name: str = None,
+                        include_system: bool = True) -> str:
+    """Format sampled deltas/rates of a source as a table, busiest rows first.
+
+    Rows without any counter change in the window are omitted.
+    """
+    elapsed, rows = metrics_sampler.window_rows(source_name, window, database)
+    if schema_name:
+        rows = [row for row in rows if row.get("schema_name") == schema_name]
+    if not include_system:
+        rows = [
+            row for row in rows
+            if row.get("schema_name") not in ("pg_catalog", "information_schema")
+            and not str(row.get("schema_name", "")).startswith("pg_toast")
+        ]
+    rows = [
+        row for row in rows
+        if any(value for name, value in row.items() if name.endswith("_delta"))
+    ]
+    if sort_by:
+        rows.sort(key=lambda row: row.get(sort_by) or 0, reverse=True)
+    if limit:
+        rows = rows[:limit]
+    title = f"{title} - last {elapsed:.0f}s (requested window: {window}s)"
+    if not rows:
+        return f"{title}\nNo counter changes in this window"
+    return format_table_data(rows, title)
+
+
+async def format_top_statements(window: int, sort_by: str = "time", limit: int = 20,
+                                database: str = None) -> str:
+    """Format the busiest pg_stat_statements entries over the window.
+
+    Deltas come from the sampler's snapshots; query text, database and role
+    names are looked up afterwards for the selected statements only.
+    """
+    dbid = None
+    if database:
+        found = await execute_query("SELECT oid::bigint AS dbid FROM pg_database WHERE datname = $1", [database])
+        if not found:
+            raise Exception(f"Database '{database}' does not exist")
+        dbid = found[0]["dbid"]
+    elapsed, top = metrics_sampler.top_statements(window, sort_by, limit, dbid)
+    title = (f"Top {limit} Queries by {sort_by} - last {elapsed:.0f}s "
+             f"(requested window: {window}s, pg_stat_statements)")
+    if database:
+        title += f" (Database: {database})"
+    if not top:
+        return f"{title}\nNo statement activity in this window"
+
+    details = await execute_query(
+        """
+        SELECT DISTINCT ON (s.userid, s.dbid, s.queryid)
+               s.userid::bigint AS userid, s.dbid::bigint AS dbid, s.queryid,
+               d.datname AS database_name, r.rolname AS username, LEFT(s.query, 100) AS query
+        FROM pg_stat_statements s
+        LEFT JOIN pg_database d ON d.oid = s.dbid
+        LEFT JOIN pg_roles r ON r.oid = s.userid
+        WHERE s.queryid = ANY($1::bigint[])
+        """,
+        [list({key[2] for key, _ in top})],
+    )
+    by_key = {(row["userid"], row["dbid"], row["queryid"]): row for row in details}
+
+    rows = []
+    for key, delta in top:
+        info = by_key.get(key, {})
+        calls = delta["calls"]
+        rows.append({
+            "query": info.get("query", f"<queryid {key[2]}>"),
+            "database_name": info.get("database_name"),
+            "username": info.get("username"),
+            "calls_delta": int(calls),
+            "calls_per_sec": round(calls / elapsed, 2),
+            "total_exec_ms_delta": round(delta["total_exec_time"], 2),
+            "mean_exec_ms": round(delta["total_exec_time"] / calls, 2) if calls else None,
+            "rows_delta": int(delta["rows"]),
+            "shared_blks_hit_delta": int(delta["shared_blks_hit"]),
+            "shared_blks_read_delta": int(delta["shared_blks_read"]),
+            "shared_blks_written_delta": int(delta["shared_blks_written"]),
+            "temp_blks_delta": int(delta["temp_blks_read"] + delta["temp_blks_written"]),
+        })
+    return format_table_data(rows, title)
+
+
+# Active Session History (ASH)
+
+ACTIVITY_TEXT_COLUMNS = ["wait_event_type", "wait_event", "state", "username", "database_name", "query"]
+ACTIVITY_GROUPS = {
+    "wait_event": ["wait_event_type", "wait_event"],
+    "query": ["query_id", "query"],
+    "user": ["username"],
+    "database": ["database_name"],
+    "session": ["pid", "username", "database_name"],
+}
+
+
+class ActivityBuffer:
+    """Bounded columnar buffer of pg_stat_activity samples.
+
+    Each row is (ts, pid, query_id, wait_event_type, wait_event, state,
+    username, database_name, query). Numbers live in array('d'/'q'); text
+    columns are stored as codes into one shared string table, so repeated
+    wait events, users and query texts cost four bytes per row. When full,
+    the oldest rows are overwritten.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.times = array('d', [0.0]) * self.capacity
+        self.pids = array('q', [0]) * self.capacity
+        self.query_ids = array('q', [0]) * self.capacity
+        self.texts = {column: array('i', [0]) * self.capacity for column in ACTIVITY_TEXT_COLUMNS}
+        # code 0 is reserved for NULL
+        self.strings: List[Optional[str]] = [None]
+        self.codes: Dict[str, int] = {}
+        self.count = 0
+        self.sample_times: deque = deque(maxlen=self.capacity)
+
+    def _code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def append(self, timestamp: float, rows: Sequence[Dict[str, Any]]) -> None:
+        """Store the sessions seen by one poll."""
+        for row in rows:
+            slot = self.count % self.capacity
+            self.times[slot] = timestamp
+            self.pids[slot] = row["pid"]
+            self.query_ids[slot] = row.get("query_id") or 0
+            for column in ACTIVITY_TEXT_COLUMNS:
+                self.texts[column][slot] = self._code(row.get(column))
+            self.count += 1
+        self.sample_times.append(timestamp)
+        oldest = self.times[self.count % self.capacity] if self.count >= self.capacity else None
+        while self.sample_times and oldest is not None and self.sample_times[0] < oldest:
+            self.sample_times.popleft()
+        if len(self.strings) > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rebuild the string table from the codes still referenced."""
+        strings, codes = [None], {}
+        remap = array('i', [0]) * len(self.strings)
+        for column in self.texts.values():
+            for slot, code in enumerate(column):
+                if code and not remap[code]:
+                    remap[code] = len(strings)
+                    codes[self.strings[code]] = len(strings)
+                    strings.append(self.strings[code])
+                column[slot] = remap[code]
+        self.strings, self.codes = strings, codes
+
+    def aggregate(self, seconds: float, group_by: str, database: str = None) -> Optional[Tuple[float, int, List[Tuple[Tuple[Any, ...], int]]]]:
+        """Return (covered seconds, polls, [(group key, samples)]) over the window.
+
+        Busiest groups come first. Sessions that are active without a wait
+        event are counted under wait_event_type "CPU".
+        """
+        if not self.sample_times:
+            return None
+        newest = self.sample_times[-1]
+        cutoff = newest - seconds
+        first = next((t for t in self.sample_times if t > cutoff), None)
+        if first is None:
+            return None
+        polls = sum(1 for t in self.sample_times if t > cutoff)
+
+        columns = ACTIVITY_GROUPS[group_by]
+        database_code = self.codes.get(database, -1) if database else None
+        counts: Dict[Tuple[Any, ...], int] = {}
+        # rows are written in time order, so walk back from the newest one
+        for back in range(1, min(self.count, self.capacity) + 1):
+            slot = (self.count - back) % self.capacity
+            if self.times[slot] <= cutoff:
+                break
+            if database_code is not None and self.texts["database_name"][slot] != database_code:
+                continue
+            key = tuple(self._value(column, slot) for column in columns)
+            counts[key] = counts.get(key, 0) + 1
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return newest - first, polls, ranked
+
+    def _value(self, column: str, slot: int) -> Any:
+        if column == "pid":
+            return self.pids[slot]
+        if column == "query_id":
+            return self.query_ids[slot] or None
+        value = self.strings[self.texts[column][slot]]
+        if column == "wait_event_type" and value is None and self.strings[self.texts["state"][slot]] == "active":
+            return "CPU"
+        return value
+
+
+@query_registry.template("sample_activity")
+def _sample_activity_sql(version: PostgreSQLVersion) -> str:
+    query_id = "query_id" if version.has_activity_query_id else "NULL::bigint AS query_id"
+    return f"""
+    SELECT pid, {query_id}, wait_event_type, wait_event, state,
+           usename AS username, datname AS database_name, LEFT(query, 100) AS query
+    FROM pg_stat_activity
+    WHERE state IS NOT NULL AND state <> 'idle'
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+    """
+
+
+class ActivitySampler:
+    """Polls pg_stat_activity on a fixed interval into an ActivityBuffer.
+
+    Like MetricsSampler, each poll borrows a pooled connection only for the
+    query, so the sampler never keeps one of the pool's connections away
+    from the tools.
+    """
+
+    def __init__(self):
+        self.buffer: Optional[ActivityBuffer] = None
+        self.task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def sample_once(self) -> None:
+        """Store the non-idle client sessions seen by one poll."""
+        query = query_registry.render("sample_activity", await get_postgresql_version())
+        rows = await execute_query(query)
+        if self.buffer is None:
+            self.buffer = ActivityBuffer(SAMPLER_CONFIG["activity_rows"])
+        self.buffer.append(time.monotonic(), rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sample_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Activity sampling failed: {e}")
+            await asyncio.sleep(SAMPLER_CONFIG["activity_interval"])
+
+    def start(self) -> None:
+        """Start sampling if POSTGRES_SAMPLER_ACTIVITY_INTERVAL is set."""
+        if SAMPLER_CONFIG["activity_interval"] > 0 and not self.running:
+            logger.info(f"Starting activity sampler (every {SAMPLER_CONFIG['activity_interval']}s, "
+                        f"{SAMPLER_CONFIG['activity_rows']} rows)")
+            self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def aggregate(self, window: int, group_by: str = "wait_event", database: str = None):
+        """Return (covered seconds, polls, [(group key, samples)]) from memory."""
+        if group_by not in ACTIVITY_GROUPS:
+            raise Exception(f"Invalid group_by '{group_by}'; use one of: {', '.join(ACTIVITY_GROUPS)}")
+        if window <= 0:
+            raise Exception(f"Invalid window {window}; use a positive number of seconds")
+        result = self.buffer.aggregate(window, group_by, database) if self.buffer is not None else None
+        if result is None:
+            if not self.running:
+                raise Exception("Session history needs the activity sampler; set POSTGRES_SAMPLER_ACTIVITY_INTERVAL")
+            raise Exception("No activity samples collected yet; retry after the next sampling interval")
+        return result
+
+
+activity_sampler = ActivitySampler()
+
+
+def format_session_history(window: int, group_by: str = "wait_event", limit: int = 20,
+                           database: str = None) -> str:
+    """Format estimated DB time per group over the window.
+
+    Every sampled session counts as one sampling interval of DB time;
+    average_active_sessions spreads that time over the covered window.
+    """
+    elapsed, polls, ranked = activity_sampler.aggregate(window, group_by, database)
+    title = (f"Active Session History by {group_by} - last {elapsed:.0f}s, {polls} samples "
+             f"(requested window: {window}s)")
+    if database:
+        title += f" (Database: {database})"
+    total = sum(samples for _, samples in ranked)
+    if not total:
+        return f"{title}\nNo active sessions sampled in this window"
+
+    interval = SAMPLER_CONFIG["activity_interval"]
+    rows = []
+    for key, samples in ranked[:limit]:
+        row = dict(zip(ACTIVITY_GROUPS[group_by], key))
+        row["samples"] = samples
+        row["db_time_seconds"] = round(samples * interval, 1)
+        row["db_time_percent"] = round(100.0 * samples / total, 1)
+        row["average_active_sessions"] = round(samples / polls, 2)
+        rows.append(row)
+    return format_table_data(rows, title)
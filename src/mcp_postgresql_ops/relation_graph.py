@@ -0,0 +1,452 @@
+"""
+Relation Graph
+
+Loads the foreign-key, inheritance and partition graph of a database once
+from pg_constraint, pg_inherits and pg_depend and answers relationship
+questions in Python: one-hop references, transitive dependency closure,
+foreign-key cycles, topological load order and orphaned tables. The graph
+is kept per database until the catalog fingerprint changes, so follow-up
+questions cost no database round trips.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from . import functions
+from .catalog import catalog_fingerprints
+from .functions import execute_queries, format_table_data, output_budget
+from .version_compat import PostgreSQLVersion, query_registry
+
+logger = logging.getLogger(__name__)
+
+RELATIONSHIP_TYPES = ("all", "foreign_keys", "dependencies", "inheritance", "load_order", "cycles", "orphans")
+
+# Relation kinds that hold rows (tables, partitioned tables, foreign tables)
+TABLE_KINDS = {"r", "p", "f"}
+
+
+@query_registry.template("graph_relations")
+def _graph_relations_sql(version: Optional[PostgreSQLVersion]) -> str:
+    return """
+    SELECT
+        c.oid,
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        c.relkind::text AS relkind,
+        c.relispartition AS is_partition
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p', 'f', 'v', 'm')
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+      AND n.nspname NOT LIKE 'pg_toast%'
+      AND n.nspname NOT LIKE 'pg_temp%'
+    """
+
+
+@query_registry.template("graph_foreign_keys")
+def _graph_foreign_keys_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # Constraints cloned onto partitions (conparentid <> 0) repeat their parent's
+    def columns(keys: str, relation: str) -> str:
+        return f"""(
+            SELECT string_agg(a.attname, ', ' ORDER BY k.ord)
+            FROM unnest(con.{keys}) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.{relation} AND a.attnum = k.attnum
+        )"""
+
+    def rule(action: str) -> str:
+        return f"""CASE con.{action}
+            WHEN 'a' THEN 'NO ACTION' WHEN 'r' THEN 'RESTRICT' WHEN 'c' THEN 'CASCADE'
+            WHEN 'n' THEN 'SET NULL' WHEN 'd' THEN 'SET DEFAULT' END"""
+
+    return f"""
+    SELECT
+        con.conname AS constraint_name,
+        con.conrelid AS source_oid,
+        con.confrelid AS target_oid,
+        {columns("conkey", "conrelid")} AS source_columns,
+        {columns("confkey", "confrelid")} AS target_columns,
+        {rule("confupdtype")} AS update_rule,
+        {rule("confdeltype")} AS delete_rule,
+        con.condeferrable AS deferrable
+    FROM pg_constraint con
+    WHERE con.contype = 'f'
+      AND con.conparentid = 0
+    """
+
+
+@query_registry.template("graph_inherits")
+def _graph_inherits_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # pg_inherits also links partitioned indexes; keep table edges only
+    return """
+    SELECT i.inhrelid AS child_oid, i.inhparent AS parent_oid
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE c.relkind IN ('r', 'p', 'f')
+    """
+
+
+@query_registry.template("graph_view_dependencies")
+def _graph_view_dependencies_sql(version: Optional[PostgreSQLVersion]) -> str:
+    return """
+    SELECT DISTINCT r.ev_class AS view_oid, d.refobjid AS table_oid
+    FROM pg_depend d
+    JOIN pg_rewrite r ON r.oid = d.objid
+    WHERE d.classid = 'pg_rewrite'::regclass
+      AND d.refclassid = 'pg_class'::regclass
+      AND d.deptype = 'n'
+      AND d.refobjid <> r.ev_class
+    """
+
+
+class RelationGraph:
+    """Foreign-key graph (edge referencing -> referenced table) plus inheritance and view edges.
+
+    Self-referencing foreign keys are kept apart from the edges so they do
+    not count as cycles or affect load order. Foreign-key cycles are the
+    strongly connected components with more than one table.
+    """
+
+    def __init__(self, relations: Sequence[Dict[str, Any]], foreign_keys: Sequence[Dict[str, Any]],
+                 inherits: Sequence[Dict[str, Any]] = (), view_dependencies: Sequence[Dict[str, Any]] = ()):
+        self.relations: Dict[int, Dict[str, Any]] = {}
+        self.names: Dict[str, int] = {}
+        for row in relations:
+            name = f"{row['schema_name']}.{row['table_name']}"
+            self.relations[row["oid"]] = {**row, "name": name}
+            self.names[name] = row["oid"]
+
+        self.foreign_keys: List[Dict[str, Any]] = []
+        self.outbound: Dict[int, List[Dict[str, Any]]] = {}
+        self.inbound: Dict[int, List[Dict[str, Any]]] = {}
+        self.references: Dict[int, Set[int]] = {}
+        self.referenced_by: Dict[int, Set[int]] = {}
+        self.self_referencing: Set[int] = set()
+        for row in foreign_keys:
+            source, target = row["source_oid"], row["target_oid"]
+            if source not in self.relations or target not in self.relations:
+                continue
+            fk = {**row, "source_table": self.name(source), "target_table": self.name(target)}
+            self.foreign_keys.append(fk)
+            self.outbound.setdefault(source, []).append(fk)
+            self.inbound.setdefault(target, []).append(fk)
+            if source == target:
+                self.self_referencing.add(source)
+            else:
+                self.references.setdefault(source, set()).add(target)
+                self.referenced_by.setdefault(target, set()).add(source)
+
+        self.parents: Dict[int, List[int]] = {}
+        self.children: Dict[int, List[int]] = {}
+        for row in inherits:
+            child, parent = row["child_oid"], row["parent_oid"]
+            if child in self.relations and parent in self.relations:
+                self.parents.setdefault(child, []).append(parent)
+                self.children.setdefault(parent, []).append(child)
+
+        self.views_on: Dict[int, List[int]] = {}
+        for row in view_dependencies:
+            if row["view_oid"] in self.relations and row["table_oid"] in self.relations:
+                self.views_on.setdefault(row["table_oid"], []).append(row["view_oid"])
+
+        self._components: Optional[List[List[int]]] = None
+
+    def name(self, oid: int) -> str:
+        return self.relations[oid]["name"]
+
+    def find(self, table_name: str, schema_name: str = "public") -> Optional[int]:
+        return self.names.get(f"{schema_name}.{table_name}")
+
+    def tables(self) -> List[int]:
+        """Tables that appear in load order and orphan analysis (partitions only with their own foreign keys)."""
+        return sorted(
+            oid for oid, rel in self.relations.items()
+            if rel["relkind"] in TABLE_KINDS
+            and (not rel["is_partition"] or oid in self.outbound or oid in self.inbound)
+        )
+
+    @staticmethod
+    def _closure(start: int, edges: Dict[int, Set[int]]) -> Dict[int, int]:
+        # Breadth-first: every reachable table with its shortest distance
+        depths: Dict[int, int] = {}
+        queue = deque((oid, 1) for oid in sorted(edges.get(start, ())))
+        while queue:
+            oid, depth = queue.popleft()
+            if oid in depths or oid == start:
+                continue
+            depths[oid] = depth
+            queue.extend((nxt, depth + 1) for nxt in sorted(edges.get(oid, ())))
+        return depths
+
+    def depends_on(self, oid: int) -> Dict[int, int]:
+        """Tables oid references directly or through a chain, with their distance."""
+        return self._closure(oid, self.references)
+
+    def required_by(self, oid: int) -> Dict[int, int]:
+        """Tables that reference oid directly or through a chain, with their distance."""
+        return self._closure(oid, self.referenced_by)
+
+    def components(self) -> List[List[int]]:
+        """Strongly connected components in dependency order (referenced tables first).
+
+        Iterative Tarjan; it emits a component only after every component
+        it references, which is exactly a valid load order.
+        """
+        if self._components is not None:
+            return self._components
+        index: Dict[int, int] = {}
+        low: Dict[int, int] = {}
+        stack: List[int] = []
+        on_stack: Set[int] = set()
+        components: List[List[int]] = []
+        for start in self.tables():
+            if start in index:
+                continue
+            index[start] = low[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            work = [(start, iter(sorted(self.references.get(start, ()))))]
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in index:
+                        index[target] = low[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(sorted(self.references.get(target, ())))))
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(sorted(component))
+        self._components = components
+        return components
+
+    def cycles(self) -> List[List[int]]:
+        """Foreign-key cycles: components of two or more tables."""
+        return [component for component in self.components() if len(component) > 1]
+
+    def load_order(self, only: Optional[Iterable[int]] = None) -> List[Tuple[int, List[int]]]:
+        """(level, tables) in an order that satisfies every foreign key.
+
+        Level 0 references nothing; every other table references something
+        one level below it. Tables of a cycle share one entry. only limits
+        the result to those tables (e.g. a table and its dependency closure).
+        """
+        wanted = set(only) if only is not None else None
+        component_of: Dict[int, int] = {}
+        levels: List[int] = []
+        order = []
+        for position, component in enumerate(self.components()):
+            level = 0
+            for member in component:
+                component_of[member] = position
+            for member in component:
+                for target in self.references.get(member, ()):
+                    if component_of.get(target, position) != position:
+                        level = max(level, levels[component_of[target]] + 1)
+            levels.append(level)
+            members = [m for m in component if wanted is None or m in wanted]
+            if members:
+                order.append((level, members))
+        order.sort(key=lambda entry: (entry[0], [self.name(m) for m in entry[1]]))
+        return order
+
+    def orphans(self) -> List[int]:
+        """Tables with no foreign key to or from another table (self-references count as a relationship)."""
+        return [
+            oid for oid in self.tables()
+            if oid not in self.outbound and oid not in self.inbound
+        ]
+
+    # Report rows
+
+    def foreign_key_rows(self, fks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{
+            "constraint_name": fk["constraint_name"],
+            "referencing_table": fk["source_table"],
+            "referencing_columns": fk["source_columns"],
+            "referenced_table": fk["target_table"],
+            "referenced_columns": fk["target_columns"],
+            "update_rule": fk["update_rule"],
+            "delete_rule": fk["delete_rule"],
+        } for fk in sorted(fks, key=lambda fk: (fk["source_table"], fk["constraint_name"]))]
+
+    def closure_rows(self, oid: int) -> List[Dict[str, Any]]:
+        rows = [{"direction": "depends on", "table_name": self.name(other), "distance": depth}
+                for other, depth in self.depends_on(oid).items()]
+        rows += [{"direction": "required by", "table_name": self.name(other), "distance": depth}
+                 for other, depth in self.required_by(oid).items()]
+        rows.sort(key=lambda row: (row["direction"], row["distance"], row["table_name"]))
+        return rows
+
+    def inheritance_rows(self, oid: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = []
+        for child, parents in self.parents.items():
+            for parent in parents:
+                if oid is not None and oid not in (child, parent):
+                    continue
+                rows.append({
+                    "parent_table": self.name(parent),
+                    "child_table": self.name(child),
+                    "relationship_type": "PARTITION" if self.relations[child]["is_partition"] else "INHERITS",
+                })
+        rows.sort(key=lambda row: (row["parent_table"], row["child_table"]))
+        return rows
+
+    def view_rows(self, oid: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = [{"view_name": self.name(view), "table_name": self.name(table)}
+                for table, views in self.views_on.items() if oid is None or table == oid
+                for view in views]
+        rows.sort(key=lambda row: (row["table_name"], row["view_name"]))
+        return rows
+
+    def load_order_rows(self, only: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        return [{
+            "step": step,
+            "level": level,
+            "tables": ", ".join(self.name(m) for m in members),
+            "note": "foreign-key cycle: defer constraints or load in two passes" if len(members) > 1 else None,
+        } for step, (level, members) in enumerate(self.load_order(only), start=1)]
+
+    def cycle_rows(self) -> List[Dict[str, Any]]:
+        rows = [{"cycle": f"cycle {n}", "tables": ", ".join(self.name(m) for m in cycle), "table_count": len(cycle)}
+                for n, cycle in enumerate(self.cycles(), start=1)]
+        rows += [{"cycle": "self-reference", "tables": self.name(oid), "table_count": 1}
+                 for oid in sorted(self.self_referencing, key=self.name)]
+        return rows
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        tables = self.tables()
+        return [
+            {"category": "Tables", "count": len(tables)},
+            {"category": "Foreign Key Relationships", "count": len(self.foreign_keys)},
+            {"category": "Referenced Tables", "count": len({fk["target_oid"] for fk in self.foreign_keys})},
+            {"category": "Referencing Tables", "count": len({fk["source_oid"] for fk in self.foreign_keys})},
+            {"category": "Orphaned Tables", "count": len(self.orphans())},
+            {"category": "Foreign Key Cycles", "count": len(self.cycles())},
+            {"category": "Self-Referencing Tables", "count": len(self.self_referencing)},
+            {"category": "Load Order Levels", "count": max((level for level, _ in self.load_order()), default=-1) + 1},
+            {"category": "Inheritance/Partition Links", "count": sum(len(p) for p in self.parents.values())},
+        ]
+
+    def top_referenced_rows(self, limit: int = 5) -> List[Dict[str, Any]]:
+        counts: Dict[int, int] = {}
+        for fk in self.foreign_keys:
+            counts[fk["target_oid"]] = counts.get(fk["target_oid"], 0) + 1
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], self.name(item[0])))[:limit]
+        return [{"table_name": self.name(oid), "reference_count": count,
+                 "transitively_required_by": len(self.required_by(oid))} for oid, count in ranked]
+
+
+async def load_relation_graph(database: str = None) -> RelationGraph:
+    """Read the relationship catalogs of a database (four queries, run concurrently)."""
+    relations, foreign_keys, inherits, views = await execute_queries([
+        query_registry.render("graph_relations"),
+        query_registry.render("graph_foreign_keys"),
+        query_registry.render("graph_inherits"),
+        query_registry.render("graph_view_dependencies"),
+    ], database=database)
+    return RelationGraph(relations, foreign_keys, inherits, views)
+
+
+class RelationGraphs:
+    """One RelationGraph per database, reloaded when the catalog fingerprint changes."""
+
+    def __init__(self):
+        # (host, port, database) -> (fingerprint, graph)
+        self.graphs: Dict[Tuple[str, int, str], Tuple[Any, RelationGraph]] = {}
+        self.inflight: Dict[Tuple[Any, ...], asyncio.Task] = {}
+
+    async def _load(self, key: Tuple[str, int, str], fingerprint: Any, database: Optional[str]) -> RelationGraph:
+        graph = await load_relation_graph(database)
+        self.graphs[key] = (fingerprint, graph)
+        return graph
+
+    async def get(self, database: str = None) -> RelationGraph:
+        config = functions.POSTGRES_CONFIG
+        key = (config["host"], config["port"], database or config["database"])
+        fingerprint = await catalog_fingerprints.get(database)
+        entry = self.graphs.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+        flight = key + (fingerprint,)
+        task = self.inflight.get(flight)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self.inflight[flight] = asyncio.ensure_future(self._load(key, fingerprint, database))
+            task.add_done_callback(lambda done: self.inflight.pop(flight, None) if self.inflight.get(flight) is done else None)
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self.graphs.clear()
+
+
+relation_graphs = RelationGraphs()
+
+
+def _sections(sections: List[Tuple[str, List[Dict[str, Any]]]], title: str) -> str:
+    blocks = []
+    with output_budget():
+        for heading, rows in sections:
+            blocks.append(format_table_data(rows, f"{title} - {heading}") if rows else f"=== {title} - {heading} ===\n\nNone")
+    return "\n\n".join(blocks)
+
+
+def format_relationship_overview(graph: RelationGraph, relationship_type: str, title: str) -> str:
+    """Database-wide relationship report for one relationship_type."""
+    sections = {
+        "foreign_keys": [("Foreign Keys", lambda: graph.foreign_key_rows(graph.foreign_keys))],
+        "dependencies": [("View Dependencies", graph.view_rows)],
+        "inheritance": [("Inheritance and Partitions", graph.inheritance_rows)],
+        "load_order": [("Load Order", graph.load_order_rows)],
+        "cycles": [("Foreign Key Cycles", graph.cycle_rows)],
+        "orphans": [("Orphaned Tables", lambda: [{"table_name": graph.name(oid)} for oid in graph.orphans()])],
+        "all": [
+            ("Statistics", graph.summary_rows),
+            ("Most Referenced Tables", graph.top_referenced_rows),
+            ("Foreign Key Cycles", graph.cycle_rows),
+            ("Foreign Keys", lambda: graph.foreign_key_rows(graph.foreign_keys)),
+        ],
+    }[relationship_type]
+    return _sections([(heading, build()) for heading, build in sections], title)
+
+
+def format_table_relationships(graph: RelationGraph, oid: int, relationship_type: str, title: str) -> str:
+    """Relationship report for one table; cycles and orphans fall back to the database-wide view."""
+    if relationship_type in ("cycles", "orphans"):
+        return format_relationship_overview(graph, relationship_type, title)
+
+    relation = graph.relations[oid]
+    info = [{
+        "table_name": relation["name"],
+        "kind": {"r": "BASE TABLE", "p": "PARTITIONED TABLE", "f": "FOREIGN TABLE",
+                 "v": "VIEW", "m": "MATERIALIZED VIEW"}.get(relation["relkind"], relation["relkind"]),
+        "in_foreign_key_cycle": any(oid in cycle for cycle in graph.cycles()),
+        "self_referencing": oid in graph.self_referencing,
+    }]
+    sections: List[Tuple[str, List[Dict[str, Any]]]] = [("Table", info)]
+    if relationship_type in ("all", "foreign_keys"):
+        sections.append(("Outbound Foreign Keys", graph.foreign_key_rows(graph.outbound.get(oid, ()))))
+        sections.append(("Inbound Foreign Keys", graph.foreign_key_rows(
+            fk for fk in graph.inbound.get(oid, ()) if fk["source_oid"] != oid)))
+    if relationship_type in ("all", "dependencies"):
+        sections.append(("Transitive Dependencies", graph.closure_rows(oid)))
+        sections.append(("View Dependencies", graph.view_rows(oid)))
+    if relationship_type in ("all", "inheritance"):
+        sections.append(("Inheritance and Partitions", graph.inheritance_rows(oid)))
+    if relationship_type in ("all", "load_order"):
+        sections.append(("Load Order", graph.load_order_rows(set(graph.depends_on(oid)) | {oid})))
+    return _sections(sections, title)
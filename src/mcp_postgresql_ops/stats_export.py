@@ -0,0 +1,193 @@
+"""
+Statistics Export
+
+Writes the per-table and per-index statistics views (pg_stat_user_tables or
+pg_stat_all_tables, pg_statio_user_tables, pg_stat_user_indexes) of one or
+many databases to Arrow IPC or Parquet files for capacity planning. Rows are
+read from a server-side cursor in batches; the values asyncpg decodes from
+the binary protocol are turned into typed Arrow columns directly, with the
+Arrow type taken from each result column's PostgreSQL type, so no value is
+rendered to text and parsed back. Files are laid out Hive-style, so a whole
+export directory opens as one pyarrow dataset:
+
+    <export dir>/<dataset>/database=<name>/<snapshot>.parquet
+"""
+
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from .functions import POOL_CONFIG, acquire_connection, execute_query, gather_with_limit
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional: pip install mcp-postgresql-ops[export]
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Export destination (see export_statistics)
+EXPORT_CONFIG = {
+    # Directory export files are written under; the export tool is disabled while unset
+    "directory": os.getenv("POSTGRES_EXPORT_DIR", "").strip(),
+}
+
+FILE_FORMATS = ("parquet", "arrow")
+
+# Dataset name -> statistics view, mirroring the tools of the same name
+EXPORT_DATASETS = {
+    "all_tables_stats": "pg_stat_user_tables",
+    "table_io_stats": "pg_statio_user_tables",
+    "index_usage_stats": "pg_stat_user_indexes",
+}
+
+# PostgreSQL type name -> Arrow type factory; anything else is exported as text
+_ARROW_TYPES = {
+    "bool": lambda: pa.bool_(),
+    "int2": lambda: pa.int16(),
+    "int4": lambda: pa.int32(),
+    "int8": lambda: pa.int64(),
+    "oid": lambda: pa.uint32(),
+    "float4": lambda: pa.float32(),
+    "float8": lambda: pa.float64(),
+    "pg_lsn": lambda: pa.uint64(),
+    "name": lambda: pa.string(),
+    "text": lambda: pa.string(),
+    "varchar": lambda: pa.string(),
+    "timestamptz": lambda: pa.timestamp("us", tz="UTC"),
+    "timestamp": lambda: pa.timestamp("us"),
+    "interval": lambda: pa.duration("us"),
+}
+
+
+def arrow_schema(attributes: Sequence[Any]) -> "pa.Schema":
+    """Arrow schema for the columns of a prepared statement (``get_attributes()``)."""
+    return pa.schema([
+        pa.field(attribute.name, _ARROW_TYPES.get(attribute.type.name, pa.string)())
+        for attribute in attributes
+    ])
+
+
+def record_batch(rows: Sequence[Any], schema: "pa.Schema") -> "pa.RecordBatch":
+    """Build a record batch column by column from asyncpg Records."""
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_string(field.type):
+            # Only unmapped types need converting; text columns are already str
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Writer:
+    """Arrow IPC file or Parquet writer behind one interface."""
+
+    def __init__(self, path: str, schema: "pa.Schema", file_format: str):
+        if file_format == "parquet":
+            self._writer = pa.parquet.ParquetWriter(path, schema)
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+        self.write = self._writer.write_batch
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def dataset_query(dataset: str, include_system: bool = False) -> str:
+    view = EXPORT_DATASETS[dataset]
+    if dataset == "all_tables_stats" and include_system:
+        view = "pg_stat_all_tables"
+    return f"SELECT * FROM {view}"
+
+
+async def export_dataset(dataset: str, path: str, database: str = None, file_format: str = "parquet",
+                         include_system: bool = False) -> Dict[str, Any]:
+    """Write one statistics view of one database to path; returns a summary row.
+
+    The file is written under a temporary name and renamed when complete,
+    so readers never see a partial export.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".partial"
+    rows_written = 0
+    try:
+        async with acquire_connection(database) as conn:
+            async with conn.transaction(readonly=True):
+                statement = await conn.prepare(dataset_query(dataset, include_system))
+                schema = arrow_schema(statement.get_attributes())
+                cursor = await statement.cursor()
+                writer = _Writer(partial, schema, file_format)
+                try:
+                    while rows := await cursor.fetch(POOL_CONFIG["stream_batch_rows"]):
+                        writer.write(record_batch(rows, schema))
+                        rows_written += len(rows)
+                finally:
+                    writer.close()
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return {"dataset": dataset, "database_name": database, "rows": rows_written,
+            "file_bytes": os.path.getsize(path), "path": path}
+
+
+async def list_databases() -> List[str]:
+    rows = await execute_query(
+        "SELECT datname FROM pg_database WHERE datallowconn AND NOT datistemplate ORDER BY datname"
+    )
+    return [row["datname"] for row in rows]
+
+
+async def export_statistics(directory: str, datasets: Optional[Sequence[str]] = None,
+                            databases: Optional[Sequence[str]] = None, file_format: str = "parquet",
+                            include_system: bool = False) -> List[Dict[str, Any]]:
+    """Export statistics views of many databases; returns one summary row per file.
+
+    Args:
+        directory: Root directory of the export
+        datasets: Keys of EXPORT_DATASETS (default: all)
+        databases: Databases to export (default: every database that accepts connections)
+        file_format: "parquet" or "arrow" (Arrow IPC file)
+        include_system: Export pg_stat_all_tables instead of pg_stat_user_tables
+
+    Databases are exported concurrently, up to POSTGRES_TOOL_CONCURRENCY at a time.
+    """
+    if pa is None:
+        raise RuntimeError("Statistics export needs pyarrow: pip install mcp-postgresql-ops[export]")
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"file_format must be one of {', '.join(FILE_FORMATS)}")
+    datasets = list(datasets or EXPORT_DATASETS)
+    unknown = [dataset for dataset in datasets if dataset not in EXPORT_DATASETS]
+    if unknown:
+        raise ValueError(f"Unknown dataset(s) {', '.join(unknown)}; choose from {', '.join(EXPORT_DATASETS)}")
+    databases = list(databases or await list_databases())
+    for database in databases:
+        # Database names become directory names
+        if not re.fullmatch(r"[^/\\\x00]+", database) or database in (".", ".."):
+            raise ValueError(f"Cannot export database with name {database!r}")
+
+    snapshot = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    async def _export_database(database: str) -> List[Dict[str, Any]]:
+        summary = []
+        for dataset in datasets:
+            path = os.path.join(directory, dataset, f"database={database}", f"{snapshot}.{file_format}")
+            try:
+                row = await export_dataset(dataset, path, database, file_format, include_system)
+                row["error"] = None
+            except Exception as e:
+                # One unreachable database must not abort an export of hundreds
+                logger.error(f"Failed to export {dataset} of {database}: {e}")
+                row = {"dataset": dataset, "database_name": database, "rows": None, "file_bytes": None,
+                       "path": None, "error": str(e)}
+            summary.append(row)
+        return summary
+
+    results = await gather_with_limit(*(_export_database(database) for database in databases))
+    logger.info(f"Exported {len(datasets)} statistics view(s) of {len(databases)} database(s) to {directory}")
+    return [row for rows in results for row in rows]
@@ -4,11 +4,19 @@ PostgreSQL Version Compatibility Utilities
 Provides version detection and compatibility handling for MCP PostgreSQL tools.
 """
 
+import asyncio
 import functools
 import re
 import logging
-from typing import Tuple, Optional
-from .functions import execute_single_query
+import time
+from typing import Any, Callable, Dict, List, Tuple, Optional
+from . import functions
+from .functions import (
+    CAPABILITY_NEGATIVE_TTL,
+    CAPABILITY_TTL,
+    get_server_capabilities,
+    register_hot_query,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +73,11 @@ class PostgreSQLVersion:
     def has_parallel_leader_tracking(self) -> bool:
         """Check if pg_stat_activity has leader_pid column (14+)."""
         return self.major >= 14
+
+    @property
+    def has_activity_query_id(self) -> bool:
+        """Check if pg_stat_activity has query_id column (14+)."""
+        return self.major >= 14
         
     @property
     def has_replication_slot_wal_status(self) -> bool:
@@ -146,8 +159,138 @@ class PostgreSQLVersion:
         """Check if pg_stat_statements has parallel_workers_* and wal_buffers_full (18+)."""
         return self.major >= 18
 
-# Global version cache
-_cached_version: Optional[PostgreSQLVersion] = None
+class ServerCapabilities:
+    """Version and catalog layout of one PostgreSQL endpoint."""
+
+    def __init__(self, version: PostgreSQLVersion, catalog_columns: Dict[str, List[str]] = None,
+                 expires_at: float = 0.0, detected: bool = True):
+        self.version = version
+        self.catalog_columns = {
+            relation: frozenset(columns) for relation, columns in (catalog_columns or {}).items()
+        }
+        self.expires_at = expires_at
+        # False when the version is the PG 12 fallback after a failed probe
+        self.detected = detected
+
+    def has_relation(self, relation: str) -> bool:
+        """Check if a pg_catalog view exists on the server."""
+        return relation in self.catalog_columns
+
+    def has_column(self, relation: str, column: str) -> bool:
+        """Check if a pg_catalog view has the given column."""
+        return column in self.catalog_columns.get(relation, ())
+
+
+def parse_server_version_num(version_num: int) -> PostgreSQLVersion:
+    """Convert server_version_num (e.g. 170002) to a PostgreSQLVersion."""
+    return PostgreSQLVersion(version_num // 10000, version_num % 10000, 0)
+
+
+def _parse_version_string(version_string: str) -> Optional[PostgreSQLVersion]:
+    # Parse version string like "PostgreSQL 16.1 on x86_64-pc-linux-gnu..."
+    version_match = re.search(r'PostgreSQL\s+(\d+)\.?(\d*)\.?(\d*)', version_string or '')
+    if not version_match:
+        return None
+    return PostgreSQLVersion(
+        int(version_match.group(1)),
+        int(version_match.group(2) or 0),
+        int(version_match.group(3) or 0),
+    )
+
+
+# Capabilities per (host, port); a process may be pointed at several clusters
+_capability_cache: Dict[Tuple[str, int], ServerCapabilities] = {}
+_refresh_tasks: Dict[Tuple[str, int], asyncio.Task] = {}
+
+
+def _endpoint_key() -> Tuple[str, int]:
+    # Read through the module so a reconfigured POSTGRES_CONFIG is honoured
+    return (functions.POSTGRES_CONFIG["host"], functions.POSTGRES_CONFIG["port"])
+
+
+async def _probe_capabilities(database: str = None) -> ServerCapabilities:
+    """Read capabilities from the server, falling back to PG 12 on failure."""
+    try:
+        snapshot = await get_server_capabilities(database, force_refresh=True)
+        version = None
+        if snapshot.get('server_version_num'):
+            version = parse_server_version_num(int(snapshot['server_version_num']))
+        if version is None:
+            version = _parse_version_string(snapshot.get('version'))
+        if version is None:
+            logger.warning(f"Could not parse version string: {snapshot.get('version')}")
+            # Default to PostgreSQL 12 (minimum supported) if parsing fails
+            # so queries degrade gracefully on any version
+            return ServerCapabilities(PostgreSQLVersion(12, 0, 0),
+                                      expires_at=time.monotonic() + CAPABILITY_NEGATIVE_TTL,
+                                      detected=False)
+        logger.info(f"Detected PostgreSQL version: {version}")
+        return ServerCapabilities(version, snapshot.get('catalog_columns'),
+                                  expires_at=time.monotonic() + CAPABILITY_TTL)
+    except Exception as e:
+        logger.error(f"Failed to get PostgreSQL version: {e}")
+        # Default to PostgreSQL 12 (minimum supported) if version detection fails,
+        # but only until CAPABILITY_NEGATIVE_TTL so a transient error is not permanent
+        return ServerCapabilities(PostgreSQLVersion(12, 0, 0),
+                                  expires_at=time.monotonic() + CAPABILITY_NEGATIVE_TTL,
+                                  detected=False)
+
+
+async def _refresh(key: Tuple[str, int], database: str = None) -> ServerCapabilities:
+    """Probe the endpoint and cache the result.
+
+    A failed probe never replaces capabilities detected earlier: those are
+    kept and only retried after CAPABILITY_NEGATIVE_TTL. The PG 12 fallback
+    is cached only while nothing has been detected for the endpoint.
+    """
+    probed = await _probe_capabilities(database)
+    cached = _capability_cache.get(key)
+    if not probed.detected and cached is not None and cached.detected:
+        cached.expires_at = time.monotonic() + CAPABILITY_NEGATIVE_TTL
+        return cached
+    _capability_cache[key] = probed
+    return probed
+
+
+def _start_refresh(key: Tuple[str, int], database: str = None) -> asyncio.Task:
+    task = _refresh_tasks.get(key)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_refresh(key, database))
+        _refresh_tasks[key] = task
+
+        def _forget(done: asyncio.Task) -> None:
+            if _refresh_tasks.get(key) is done:
+                del _refresh_tasks[key]
+
+        task.add_done_callback(_forget)
+    return task
+
+
+async def get_server_capability_info(database: str = None, force_refresh: bool = False) -> ServerCapabilities:
+    """
+    Get cached capabilities for the configured endpoint.
+    
+    Detected capabilities past their TTL are still returned while a
+    background refresh runs, so query builders only wait on the first probe
+    (or after a failed probe has expired).
+    
+    Args:
+        database: Database to connect to when probing
+        force_refresh: Wait for a fresh probe
+        
+    Returns:
+        ServerCapabilities object
+    """
+    key = _endpoint_key()
+    cached = _capability_cache.get(key)
+    if cached is not None and not force_refresh:
+        if time.monotonic() < cached.expires_at:
+            return cached
+        if cached.detected:
+            _start_refresh(key, database)
+            return cached
+    return await asyncio.shield(_start_refresh(key, database))
+
 
 async def get_postgresql_version(database: str = None, force_refresh: bool = False) -> PostgreSQLVersion:
     """
@@ -160,39 +303,8 @@ async def get_postgresql_version(database: str = None, force_refresh: bool = Fal
     Returns:
         PostgreSQLVersion object
     """
-    global _cached_version
-    
-    if _cached_version is not None and not force_refresh:
-        return _cached_version
-        
-    try:
-        result = await execute_single_query("SELECT version()", database=database)
-        version_string = result.get('version', '')
-        
-        # Parse version string like "PostgreSQL 16.1 on x86_64-pc-linux-gnu..."
-        version_match = re.search(r'PostgreSQL\s+(\d+)\.?(\d*)\.?(\d*)', version_string)
-        
-        if version_match:
-            major = int(version_match.group(1))
-            minor = int(version_match.group(2) or 0)
-            patch = int(version_match.group(3) or 0)
-            
-            _cached_version = PostgreSQLVersion(major, minor, patch)
-            logger.info(f"Detected PostgreSQL version: {_cached_version}")
-            return _cached_version
-        else:
-            logger.warning(f"Could not parse version string: {version_string}")
-            # Default to PostgreSQL 12 (minimum supported) if parsing fails
-            # so queries degrade gracefully on any version
-            _cached_version = PostgreSQLVersion(12, 0, 0)
-            return _cached_version
-
-    except Exception as e:
-        logger.error(f"Failed to get PostgreSQL version: {e}")
-        # Default to PostgreSQL 12 (minimum supported) if version detection fails
-        # so queries degrade gracefully on any version
-        _cached_version = PostgreSQLVersion(12, 0, 0)
-        return _cached_version
+    capabilities = await get_server_capability_info(database, force_refresh=force_refresh)
+    return capabilities.version
 
 async def check_feature_availability(feature: str, database: str = None) -> bool:
     """
@@ -223,6 +335,541 @@ async def check_feature_availability(feature: str, database: str = None) -> bool
     
     return feature_requirements.get(feature, False)
 
+
+class QueryRegistry:
+    """Version-aware SQL templates rendered once and memoized.
+    
+    A template is a plain function of (version, **params) returning SQL.
+    Its output only depends on those arguments, so the text is rendered once
+    per (template, version, params) and reused. Identical text also lets
+    asyncpg's per-connection statement cache reuse the prepared statement,
+    so values that vary per call belong in bind parameters, not the template.
+    
+    Version-independent templates (version=None) of the busiest tools can be
+    registered with warmup=True to be prepared on every pooled connection.
+    """
+
+    def __init__(self):
+        self.templates: Dict[str, Callable[..., str]] = {}
+        self._rendered: Dict[Tuple[Any, ...], str] = {}
+
+    def template(self, name: str, warmup: bool = False) -> Callable[[Callable[..., str]], Callable[..., str]]:
+        """Register a SQL template function under name."""
+        def decorator(func: Callable[..., str]) -> Callable[..., str]:
+            if name in self.templates:
+                raise ValueError(f"Query template already registered: {name}")
+            self.templates[name] = func
+            if warmup:
+                register_hot_query(self.render(name))
+            return func
+        return decorator
+
+    def render(self, name: str, version: Optional[PostgreSQLVersion] = None, **params: Any) -> str:
+        """Return the SQL text of a template for a server version."""
+        key = (name, version, tuple(sorted(params.items())))
+        sql = self._rendered.get(key)
+        if sql is None:
+            sql = self.templates[name](version, **params)
+            self._rendered[key] = sql
+        return sql
+
+    def clear(self) -> None:
+        """Drop all memoized SQL text."""
+        self._rendered.clear()
+
+
+query_registry = QueryRegistry()
+
+# Template parameters decided by the catalog columns the server actually has
+# (template name -> parameter -> (catalog view, column)). The templates fall
+# back to the version number when the columns are unknown.
+COLUMN_GATED_PARAMS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    "replication_slots": {
+        "invalidation_columns": ("pg_replication_slots", "invalidation_reason"),
+        "wal_status_columns": ("pg_replication_slots", "wal_status"),
+    },
+    "wal_receiver": {"written_lsn_columns": ("pg_stat_wal_receiver", "written_lsn")},
+    "all_tables_stats": {
+        "vacuum_time_columns": ("pg_stat_user_tables", "total_vacuum_time"),
+        "ins_since_vacuum_column": ("pg_stat_user_tables", "n_ins_since_vacuum"),
+    },
+    "bgwriter_stats": {"checkpointer_v18_columns": ("pg_stat_checkpointer", "num_done")},
+    "io_stats": {"io_byte_columns": ("pg_stat_io", "read_bytes")},
+}
+
+
+async def render_for_server(name: str, database: str = None, **params: Any) -> str:
+    """Render a template for the server's version and the catalog columns it actually has."""
+    capabilities = await get_server_capability_info(database)
+    if capabilities.catalog_columns:
+        for param, (relation, column) in COLUMN_GATED_PARAMS.get(name, {}).items():
+            params[param] = capabilities.has_column(relation, column)
+    return query_registry.render(name, capabilities.version, **params)
+
+
+@query_registry.template("replication_slots")
+def _replication_slots_sql(version: PostgreSQLVersion, invalidation_columns: Optional[bool] = None,
+                           wal_status_columns: Optional[bool] = None) -> str:
+    if invalidation_columns is None:
+        invalidation_columns = version.has_replication_slot_invalidation
+    if wal_status_columns is None:
+        wal_status_columns = version.has_replication_slot_wal_status
+    base_columns = """
+            slot_name,
+            plugin,
+            slot_type,
+            datoid,
+            temporary,
+            active,
+            active_pid,
+            restart_lsn,
+            confirmed_flush_lsn"""
+
+    if invalidation_columns:
+        # PostgreSQL 17+: includes invalidation_reason and inactive_since
+        return f"""
+        SELECT {base_columns},
+            wal_status,
+            safe_wal_size / 1024 / 1024 as safe_wal_size_mb,
+            invalidation_reason,
+            inactive_since
+        FROM pg_replication_slots
+        ORDER BY slot_name
+        """
+    elif wal_status_columns:
+        # PostgreSQL 13-16: wal_status and safe_wal_size
+        return f"""
+        SELECT {base_columns},
+            wal_status,
+            safe_wal_size / 1024 / 1024 as safe_wal_size_mb,
+            NULL::text as invalidation_reason,
+            NULL::timestamptz as inactive_since
+        FROM pg_replication_slots
+        ORDER BY slot_name
+        """
+    else:
+        # PostgreSQL 12: minimal columns
+        return f"""
+        SELECT {base_columns},
+            NULL::text as wal_status,
+            NULL::numeric as safe_wal_size_mb,
+            NULL::text as invalidation_reason,
+            NULL::timestamptz as inactive_since
+        FROM pg_replication_slots
+        ORDER BY slot_name
+        """
+
+
+@query_registry.template("wal_receiver")
+def _wal_receiver_sql(version: PostgreSQLVersion, written_lsn_columns: Optional[bool] = None) -> str:
+    if written_lsn_columns is None:
+        written_lsn_columns = version.has_enhanced_wal_receiver
+    if written_lsn_columns:
+        # PostgreSQL 16+: has written_lsn/flushed_lsn columns
+        return """
+        SELECT 
+            pid,
+            status,
+            receive_start_lsn,
+            receive_start_tli,
+            written_lsn,
+            flushed_lsn,
+            received_tli,
+            last_msg_send_time,
+            last_msg_receipt_time,
+            latest_end_lsn,
+            latest_end_time,
+            slot_name,
+            sender_host,
+            sender_port,
+            conninfo
+        FROM pg_stat_wal_receiver
+        """
+    else:
+        # PostgreSQL 10-15: no written_lsn/flushed_lsn columns
+        return """
+        SELECT 
+            pid,
+            status,
+            receive_start_lsn,
+            receive_start_tli,
+            NULL::text as written_lsn,
+            NULL::text as flushed_lsn,
+            received_tli,
+            last_msg_send_time,
+            last_msg_receipt_time,
+            latest_end_lsn,
+            latest_end_time,
+            slot_name,
+            sender_host,
+            sender_port,
+            conninfo
+        FROM pg_stat_wal_receiver
+        """
+
+
+@query_registry.template("all_tables_stats")
+def _all_tables_stats_sql(version: PostgreSQLVersion, include_system: bool = False,
+                          vacuum_time_columns: Optional[bool] = None,
+                          ins_since_vacuum_column: Optional[bool] = None) -> str:
+    view_name = "pg_stat_all_tables" if include_system else "pg_stat_user_tables"
+    if vacuum_time_columns is None:
+        vacuum_time_columns = version.has_vacuum_time_columns
+    if ins_since_vacuum_column is None:
+        ins_since_vacuum_column = version.has_table_stats_ins_since_vacuum
+
+    # PG 18+ adds VACUUM/ANALYZE time columns
+    vacuum_time_cols = ""
+    if vacuum_time_columns:
+        vacuum_time_cols = """,
+            ROUND(total_vacuum_time::numeric, 2) as total_vacuum_time_ms,
+            ROUND(total_autovacuum_time::numeric, 2) as total_autovacuum_time_ms,
+            ROUND(total_analyze_time::numeric, 2) as total_analyze_time_ms,
+            ROUND(total_autoanalyze_time::numeric, 2) as total_autoanalyze_time_ms"""
+
+    # n_ins_since_vacuum is available from PostgreSQL 13+
+    if ins_since_vacuum_column:
+        return f"""
+        SELECT
+            schemaname as schema_name,
+            relname as table_name,
+            seq_scan as sequential_scans,
+            seq_tup_read as seq_tuples_read,
+            idx_scan as index_scans,
+            idx_tup_fetch as idx_tuples_fetched,
+            n_tup_ins as tuples_inserted,
+            n_tup_upd as tuples_updated,
+            n_tup_del as tuples_deleted,
+            n_tup_hot_upd as hot_updates,
+            n_live_tup as estimated_live_tuples,
+            n_dead_tup as estimated_dead_tuples,
+            CASE
+                WHEN n_live_tup > 0 THEN
+                    ROUND((n_dead_tup::numeric / n_live_tup) * 100, 2)
+                ELSE 0
+            END as dead_tuple_ratio_percent,
+            n_mod_since_analyze as modified_since_analyze,
+            n_ins_since_vacuum as inserted_since_vacuum,
+            last_vacuum,
+            last_autovacuum,
+            last_analyze,
+            last_autoanalyze,
+            vacuum_count,
+            autovacuum_count,
+            analyze_count,
+            autoanalyze_count{vacuum_time_cols}
+        FROM {view_name}
+        ORDER BY seq_scan + COALESCE(idx_scan, 0) DESC, schemaname, relname
+        """
+    else:
+        # PostgreSQL 12 - without n_ins_since_vacuum
+        return f"""
+        SELECT
+            schemaname as schema_name,
+            relname as table_name,
+            seq_scan as sequential_scans,
+            seq_tup_read as seq_tuples_read,
+            idx_scan as index_scans,
+            idx_tup_fetch as idx_tuples_fetched,
+            n_tup_ins as tuples_inserted,
+            n_tup_upd as tuples_updated,
+            n_tup_del as tuples_deleted,
+            n_tup_hot_upd as hot_updates,
+            n_live_tup as estimated_live_tuples,
+            n_dead_tup as estimated_dead_tuples,
+            CASE
+                WHEN n_live_tup > 0 THEN
+                    ROUND((n_dead_tup::numeric / n_live_tup) * 100, 2)
+                ELSE 0
+            END as dead_tuple_ratio_percent,
+            n_mod_since_analyze as modified_since_analyze,
+            NULL::bigint as inserted_since_vacuum,
+            last_vacuum,
+            last_autovacuum,
+            last_analyze,
+            last_autoanalyze,
+            vacuum_count,
+            autovacuum_count,
+            analyze_count,
+            autoanalyze_count
+        FROM {view_name}
+        ORDER BY seq_scan + COALESCE(idx_scan, 0) DESC, schemaname, relname
+        """
+
+
+
+@query_registry.template("bgwriter_stats")
+def _bgwriter_stats_sql(version: PostgreSQLVersion, checkpointer_v18_columns: Optional[bool] = None) -> str:
+    if checkpointer_v18_columns is None:
+        checkpointer_v18_columns = version.has_checkpointer_v18
+    if version.has_checkpointer_view:
+        # PostgreSQL 17+: Separate checkpointer and bgwriter views
+        # PG 18 adds num_done and slru_written to pg_stat_checkpointer
+        checkpointer_extra_cols = ""
+        bgwriter_extra_null_cols = ""
+        if checkpointer_v18_columns:
+            checkpointer_extra_cols = """,
+            num_done as completed_checkpoints,
+            slru_written as slru_buffers_written"""
+
+            bgwriter_extra_null_cols = """,
+            0 as completed_checkpoints,
+            0 as slru_buffers_written"""
+
+        return f"""
+        SELECT
+            'Checkpointer (PG17+)' as component,
+            num_timed as scheduled_checkpoints,
+            num_requested as requested_checkpoints,
+            num_timed + num_requested as total_checkpoints,
+            CASE
+                WHEN (num_timed + num_requested) > 0 THEN
+                    ROUND((num_timed::numeric / (num_timed + num_requested)) * 100, 2)
+                ELSE 0
+            END as scheduled_checkpoint_ratio_percent,
+            ROUND(write_time::numeric, 2) as checkpoint_write_time_ms,
+            ROUND(sync_time::numeric, 2) as checkpoint_sync_time_ms,
+            ROUND((write_time + sync_time)::numeric, 2) as total_checkpoint_time_ms,
+            buffers_written as buffers_written{checkpointer_extra_cols},
+            stats_reset as stats_reset_time
+        FROM pg_stat_checkpointer
+        UNION ALL
+        SELECT
+            'Background Writer (PG17+)' as component,
+            0 as scheduled_checkpoints,
+            0 as requested_checkpoints,
+            0 as total_checkpoints,
+            0 as scheduled_checkpoint_ratio_percent,
+            0 as checkpoint_write_time_ms,
+            0 as checkpoint_sync_time_ms,
+            0 as total_checkpoint_time_ms,
+            buffers_clean as buffers_written{bgwriter_extra_null_cols},
+            stats_reset as stats_reset_time
+        FROM pg_stat_bgwriter
+        """
+    else:
+        # PostgreSQL 12-16: Combined bgwriter view with all columns
+        return """
+        SELECT
+            'Combined BGWriter (PG12-16)' as component,
+            checkpoints_timed as scheduled_checkpoints,
+            checkpoints_req as requested_checkpoints,
+            checkpoints_timed + checkpoints_req as total_checkpoints,
+            CASE
+                WHEN (checkpoints_timed + checkpoints_req) > 0 THEN
+                    ROUND((checkpoints_timed::numeric / (checkpoints_timed + checkpoints_req)) * 100, 2)
+                ELSE 0
+            END as scheduled_checkpoint_ratio_percent,
+            ROUND(checkpoint_write_time::numeric, 2) as checkpoint_write_time_ms,
+            ROUND(checkpoint_sync_time::numeric, 2) as checkpoint_sync_time_ms,
+            ROUND((checkpoint_write_time + checkpoint_sync_time)::numeric, 2) as total_checkpoint_time_ms,
+            buffers_checkpoint as buffers_written_by_checkpoints,
+            buffers_clean as buffers_written_by_bgwriter,
+            buffers_backend as buffers_written_by_backend,
+            buffers_backend_fsync as backend_fsync_calls,
+            buffers_alloc as buffers_allocated,
+            maxwritten_clean as bgwriter_maxwritten_stops,
+            CASE
+                WHEN buffers_clean > 0 AND maxwritten_clean > 0 THEN
+                    ROUND((maxwritten_clean::numeric / buffers_clean) * 100, 2)
+                ELSE 0
+            END as bgwriter_stop_ratio_percent,
+            stats_reset as stats_reset_time
+        FROM pg_stat_bgwriter
+        """
+
+
+@query_registry.template("io_stats")
+def _io_stats_sql(version: PostgreSQLVersion, io_byte_columns: Optional[bool] = None) -> str:
+    if io_byte_columns is None:
+        io_byte_columns = version.has_pg_stat_io_bytes
+    # Row limit is bound as $1 so one prepared statement serves every limit
+    if version.has_pg_stat_io:
+        # PostgreSQL 16+: Use comprehensive pg_stat_io
+        # PG 18+ adds read_bytes/write_bytes/extend_bytes
+        byte_cols = ""
+        if io_byte_columns:
+            byte_cols = """,
+            pg_size_pretty(read_bytes) as read_bytes_pretty,
+            pg_size_pretty(write_bytes) as write_bytes_pretty,
+            pg_size_pretty(extend_bytes) as extend_bytes_pretty"""
+
+        return f"""
+        SELECT
+            backend_type,
+            object,
+            context,
+            reads,
+            ROUND(read_time::numeric, 2) as read_time_ms,
+            writes,
+            ROUND(write_time::numeric, 2) as write_time_ms,
+            extends,
+            ROUND(extend_time::numeric, 2) as extend_time_ms{byte_cols},
+            hits,
+            evictions,
+            reuses,
+            fsyncs,
+            ROUND(fsync_time::numeric, 2) as fsync_time_ms,
+            CASE
+                WHEN (reads + hits) > 0 THEN
+                    ROUND((hits::numeric / (reads + hits)) * 100, 2)
+                ELSE 0
+            END as hit_ratio_percent
+        FROM pg_stat_io
+        WHERE reads > 0 OR writes > 0 OR hits > 0 OR extends > 0 OR fsyncs > 0
+        ORDER BY (reads + writes + extends) DESC
+        LIMIT $1
+        """
+    else:
+        # PostgreSQL 12-15: Fall back to pg_statio_* views
+        return """
+        SELECT 
+            'relation I/O (fallback)' as backend_type,
+            'heap+index+toast' as object,
+            'basic' as context,
+            (heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) as reads,
+            0 as read_time_ms,
+            0 as writes,
+            0 as write_time_ms,
+            0 as extends,
+            0 as extend_time_ms,
+            (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit) as hits,
+            0 as evictions,
+            0 as reuses,
+            0 as fsyncs,
+            0 as fsync_time_ms,
+            CASE 
+                WHEN ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) + 
+                      (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)) > 0 THEN
+                    ROUND(((heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)::numeric / 
+                           ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) +
+                            (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit))) * 100, 2)
+                ELSE 0
+            END as hit_ratio_percent,
+            schemaname || '.' || relname as table_name
+        FROM pg_statio_all_tables
+        WHERE (heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read +
+               heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit) > 0
+        ORDER BY ((heap_blks_read + idx_blks_read + toast_blks_read + tidx_blks_read) + 
+                 (heap_blks_hit + idx_blks_hit + toast_blks_hit + tidx_blks_hit)) DESC
+        LIMIT $1
+        """
+
+
+
+# Hot tool queries: filters are bound as nullable parameters so every call
+# shares one SQL text (and one prepared statement per connection)
+@query_registry.template("active_connections", warmup=True)
+def _active_connections_sql(version: Optional[PostgreSQLVersion]) -> str:
+    return """
+    SELECT 
+        pid,
+        usename as username,
+        datname as database_name,
+        client_addr,
+        client_port,
+        state,
+        query_start,
+        LEFT(query, 100) as current_query
+    FROM pg_stat_activity 
+    WHERE pid <> pg_backend_pid()
+    ORDER BY query_start DESC
+    """
+
+
+@query_registry.template("lock_monitoring", warmup=True)
+def _lock_monitoring_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 granted, $2 state, $3 mode, $4 locktype, $5 username (NULL = no filter)
+    return """
+    SELECT
+        a.pid,
+        a.usename AS username,
+        a.datname AS database,
+        l.locktype,
+        l.mode,
+        l.granted,
+        l.relation::regclass AS relation,
+        a.state,
+        a.query_start,
+        LEFT(a.query, 80) AS query,
+        l.virtualtransaction,
+        l.virtualxid,
+        l.transactionid,
+        l.fastpath,
+        a.wait_event_type,
+        a.wait_event,
+        bl.pid AS blocked_by
+    FROM pg_locks l
+    JOIN pg_stat_activity a ON l.pid = a.pid
+    LEFT JOIN pg_locks bl_l
+        ON l.locktype = bl_l.locktype
+        AND l.database IS NOT DISTINCT FROM bl_l.database
+        AND l.relation IS NOT DISTINCT FROM bl_l.relation
+        AND l.page IS NOT DISTINCT FROM bl_l.page
+        AND l.tuple IS NOT DISTINCT FROM bl_l.tuple
+        AND l.transactionid IS NOT DISTINCT FROM bl_l.transactionid
+        AND l.pid <> bl_l.pid
+        AND NOT l.granted AND bl_l.granted
+    LEFT JOIN pg_stat_activity bl ON bl_l.pid = bl.pid
+    WHERE ($1::boolean IS NULL OR l.granted = $1)
+      AND ($2::text IS NULL OR a.state ILIKE $2)
+      AND ($3::text IS NULL OR l.mode ILIKE $3)
+      AND ($4::text IS NULL OR l.locktype ILIKE $4)
+      AND ($5::text IS NULL OR a.usename ILIKE $5)
+    ORDER BY a.datname, a.pid, l.locktype, l.mode
+    """
+
+
+@query_registry.template("table_bloat", warmup=True)
+def _table_bloat_sql(version: Optional[PostgreSQLVersion]) -> str:
+    # $1 schema (NULL = all user schemas), $2 table pattern, $3 min dead tuples, $4 limit
+    return """
+    SELECT 
+        schemaname as schema_name,
+        relname as table_name,
+        pg_size_pretty(pg_total_relation_size(schemaname||'.'||relname)) as total_size,
+        pg_size_pretty(pg_relation_size(schemaname||'.'||relname)) as table_size,
+        n_dead_tup as dead_tuples,
+        n_live_tup as live_tuples,
+        CASE 
+            WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
+            ELSE round(100.0 * n_dead_tup / (n_live_tup + n_dead_tup), 2)
+        END as bloat_ratio_percent,
+        pg_size_pretty(
+            (pg_relation_size(schemaname||'.'||relname) * 
+            CASE 
+                WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
+                ELSE n_dead_tup::float / (n_live_tup + n_dead_tup)
+            END)::bigint
+        ) as estimated_bloat_size,
+        last_vacuum,
+        last_autovacuum,
+        CASE 
+            WHEN last_vacuum IS NULL AND last_autovacuum IS NULL THEN 'Never vacuumed'
+            WHEN last_vacuum IS NULL THEN 'Manual vacuum needed'
+            WHEN last_autovacuum IS NULL THEN 'Auto vacuum available'
+            WHEN last_vacuum > last_autovacuum THEN 'Recently manual vacuumed'
+            ELSE 'Recently auto vacuumed'
+        END as vacuum_status
+    FROM pg_stat_user_tables
+    WHERE (CASE
+               WHEN $1::text IS NULL THEN
+                   schemaname NOT IN ('information_schema', 'pg_catalog')
+                   AND schemaname NOT LIKE 'pg_%'
+               ELSE schemaname = $1
+           END)
+      AND ($2::text IS NULL OR relname ILIKE $2)
+      AND n_dead_tup >= $3
+    ORDER BY 
+        CASE 
+            WHEN (n_live_tup + n_dead_tup) = 0 THEN 0
+            ELSE 100.0 * n_dead_tup / (n_live_tup + n_dead_tup)
+        END DESC, 
+        n_dead_tup DESC
+    LIMIT $4
+    """
+
+
 # Version-specific query builders
 class VersionAwareQueries:
     """Collection of version-aware query builders."""
@@ -230,185 +877,17 @@ class VersionAwareQueries:
     @staticmethod
     async def get_replication_slots_query(database: str = None) -> str:
         """Get replication slots info with version compatibility."""
-        version = await get_postgresql_version(database)
-
-        base_columns = """
-                slot_name,
-                plugin,
-                slot_type,
-                datoid,
-                temporary,
-                active,
-                active_pid,
-                restart_lsn,
-                confirmed_flush_lsn"""
-
-        if version.has_replication_slot_invalidation:
-            # PostgreSQL 17+: includes invalidation_reason and inactive_since
-            return f"""
-            SELECT {base_columns},
-                wal_status,
-                safe_wal_size / 1024 / 1024 as safe_wal_size_mb,
-                invalidation_reason,
-                inactive_since
-            FROM pg_replication_slots
-            ORDER BY slot_name
-            """
-        elif version.has_replication_slot_wal_status:
-            # PostgreSQL 13-16: wal_status and safe_wal_size
-            return f"""
-            SELECT {base_columns},
-                wal_status,
-                safe_wal_size / 1024 / 1024 as safe_wal_size_mb,
-                NULL::text as invalidation_reason,
-                NULL::timestamptz as inactive_since
-            FROM pg_replication_slots
-            ORDER BY slot_name
-            """
-        else:
-            # PostgreSQL 12: minimal columns
-            return f"""
-            SELECT {base_columns},
-                NULL::text as wal_status,
-                NULL::numeric as safe_wal_size_mb,
-                NULL::text as invalidation_reason,
-                NULL::timestamptz as inactive_since
-            FROM pg_replication_slots
-            ORDER BY slot_name
-            """
+        return await render_for_server("replication_slots", database)
     
     @staticmethod
     async def get_wal_receiver_query(database: str = None) -> str:
         """Get WAL receiver status with version compatibility."""
-        version = await get_postgresql_version(database)
-        
-        if version.has_enhanced_wal_receiver:
-            # PostgreSQL 16+: has written_lsn/flushed_lsn columns
-            return """
-            SELECT 
-                pid,
-                status,
-                receive_start_lsn,
-                receive_start_tli,
-                written_lsn,
-                flushed_lsn,
-                received_tli,
-                last_msg_send_time,
-                last_msg_receipt_time,
-                latest_end_lsn,
-                latest_end_time,
-                slot_name,
-                sender_host,
-                sender_port,
-                conninfo
-            FROM pg_stat_wal_receiver
-            """
-        else:
-            # PostgreSQL 10-15: no written_lsn/flushed_lsn columns
-            return """
-            SELECT 
-                pid,
-                status,
-                receive_start_lsn,
-                receive_start_tli,
-                NULL::text as written_lsn,
-                NULL::text as flushed_lsn,
-                received_tli,
-                last_msg_send_time,
-                last_msg_receipt_time,
-                latest_end_lsn,
-                latest_end_time,
-                slot_name,
-                sender_host,
-                sender_port,
-                conninfo
-            FROM pg_stat_wal_receiver
-            """
+        return await render_for_server("wal_receiver", database)
     
     @staticmethod
     async def get_all_tables_stats_query(include_system: bool = False, database: str = None) -> str:
         """Get all tables statistics query with version compatibility."""
-        version = await get_postgresql_version(database)
-
-        view_name = "pg_stat_all_tables" if include_system else "pg_stat_user_tables"
-
-        # PG 18+ adds VACUUM/ANALYZE time columns
-        vacuum_time_cols = ""
-        if version.has_vacuum_time_columns:
-            vacuum_time_cols = """,
-                ROUND(total_vacuum_time::numeric, 2) as total_vacuum_time_ms,
-                ROUND(total_autovacuum_time::numeric, 2) as total_autovacuum_time_ms,
-                ROUND(total_analyze_time::numeric, 2) as total_analyze_time_ms,
-                ROUND(total_autoanalyze_time::numeric, 2) as total_autoanalyze_time_ms"""
-
-        # n_ins_since_vacuum is available from PostgreSQL 13+
-        if version.has_table_stats_ins_since_vacuum:
-            return f"""
-            SELECT
-                schemaname as schema_name,
-                relname as table_name,
-                seq_scan as sequential_scans,
-                seq_tup_read as seq_tuples_read,
-                idx_scan as index_scans,
-                idx_tup_fetch as idx_tuples_fetched,
-                n_tup_ins as tuples_inserted,
-                n_tup_upd as tuples_updated,
-                n_tup_del as tuples_deleted,
-                n_tup_hot_upd as hot_updates,
-                n_live_tup as estimated_live_tuples,
-                n_dead_tup as estimated_dead_tuples,
-                CASE
-                    WHEN n_live_tup > 0 THEN
-                        ROUND((n_dead_tup::numeric / n_live_tup) * 100, 2)
-                    ELSE 0
-                END as dead_tuple_ratio_percent,
-                n_mod_since_analyze as modified_since_analyze,
-                n_ins_since_vacuum as inserted_since_vacuum,
-                last_vacuum,
-                last_autovacuum,
-                last_analyze,
-                last_autoanalyze,
-                vacuum_count,
-                autovacuum_count,
-                analyze_count,
-                autoanalyze_count{vacuum_time_cols}
-            FROM {view_name}
-            ORDER BY seq_scan + COALESCE(idx_scan, 0) DESC, schemaname, relname
-            """
-        else:
-            # PostgreSQL 12 - without n_ins_since_vacuum
-            return f"""
-            SELECT
-                schemaname as schema_name,
-                relname as table_name,
-                seq_scan as sequential_scans,
-                seq_tup_read as seq_tuples_read,
-                idx_scan as index_scans,
-                idx_tup_fetch as idx_tuples_fetched,
-                n_tup_ins as tuples_inserted,
-                n_tup_upd as tuples_updated,
-                n_tup_del as tuples_deleted,
-                n_tup_hot_upd as hot_updates,
-                n_live_tup as estimated_live_tuples,
-                n_dead_tup as estimated_dead_tuples,
-                CASE
-                    WHEN n_live_tup > 0 THEN
-                        ROUND((n_dead_tup::numeric / n_live_tup) * 100, 2)
-                    ELSE 0
-                END as dead_tuple_ratio_percent,
-                n_mod_since_analyze as modified_since_analyze,
-                NULL::bigint as inserted_since_vacuum,
-                last_vacuum,
-                last_autovacuum,
-                last_analyze,
-                last_autoanalyze,
-                vacuum_count,
-                autovacuum_count,
-                analyze_count,
-                autoanalyze_count
-            FROM {view_name}
-            ORDER BY seq_scan + COALESCE(idx_scan, 0) DESC, schemaname, relname
-            """
+        return await render_for_server("all_tables_stats", database, include_system=include_system)
 
 
 # Version-aware pg_stat_statements queries
@@ -423,7 +902,11 @@ async def get_pg_stat_statements_query(database: str = None) -> str:
         SQL query string compatible with the database version
     """
     version = await get_postgresql_version(database)
-    
+    return query_registry.render("pg_stat_statements", version)
+
+
+@query_registry.template("pg_stat_statements")
+def _pg_stat_statements_sql(version: PostgreSQLVersion) -> str:
     # Common base columns available in all versions
     base_columns = [
         "queryid", "query", "calls", "rows"
@@ -494,7 +977,11 @@ async def get_pg_stat_monitor_query(database: str = None) -> str:
         SQL query string compatible with the database version
     """
     version = await get_postgresql_version(database)
-    
+    return query_registry.render("pg_stat_monitor", version)
+
+
+@query_registry.template("pg_stat_monitor")
+def _pg_stat_monitor_sql(version: PostgreSQLVersion) -> str:
     # Common base columns available in all versions
     base_columns = [
         "query", "calls", "rows"
@@ -156,11 +156,14 @@ def setup_env(monkeypatch: pytest.MonkeyPatch, pg_config):
     # Clear the version cache so it re-detects for this PG instance
     import mcp_postgresql_ops.version_compat as vc
 
-    monkeypatch.setattr(vc, "_cached_version", None)
+    monkeypatch.setattr(vc, "_capability_cache", {})
 
     # Reload functions module to pick up new env vars
     import mcp_postgresql_ops.functions as fn
 
+    # Tests create and drop objects; never serve a cached tool result
+    fn.clear_tool_cache()
+
     monkeypatch.setattr(
         fn,
         "POSTGRES_CONFIG",
@@ -0,0 +1,195 @@
+"""Unit tests for catalog.py — no database required."""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import mcp_postgresql_ops.catalog as catalog
+from mcp_postgresql_ops.functions import OUTPUT_CONFIG
+from mcp_postgresql_ops.version_compat import query_registry
+
+
+class TestCatalogQueries:
+    """Schema queries read pg_catalog by OID instead of information_schema views."""
+
+    @pytest.mark.parametrize("name,params", [
+        ("table_schema_info", 2), ("schema_overview", 1), ("batch_relations", 3),
+        ("batch_columns", 1), ("batch_constraints", 1), ("batch_indexes", 1), ("table_list_page", 4),
+    ])
+    def test_no_information_schema_views(self, name, params):
+        sql = query_registry.render(name)
+        for view in ("information_schema.tables", "information_schema.columns",
+                     "information_schema.table_constraints", "information_schema.key_column_usage",
+                     "information_schema.constraint_column_usage"):
+            assert view not in sql
+        assert f"${params}" in sql and f"${params + 1}" not in sql
+
+    def test_table_schema_info_keeps_result_shape(self):
+        sql = query_registry.render("table_schema_info")
+        for section in ("'TABLE_INFO'", "'COLUMN'", "'CONSTRAINT'", "'INDEX'"):
+            assert section in sql
+        assert "ORDER BY sort_order, name" in sql
+
+    def test_relation_type_names(self):
+        sql = catalog.relation_type_sql("x")
+        assert "x.relkind IN ('r', 'p') THEN 'BASE TABLE'" in sql
+
+
+class TestSchemaBatch:
+    """Many tables are described with one query per section and grouped per table."""
+
+    RELATIONS = [
+        {"oid": 10, "schema_name": "public", "table_name": "customers", "table_type": "BASE TABLE",
+         "total_size": 8192, "estimated_rows": 3},
+        {"oid": 20, "schema_name": "public", "table_name": "orders", "table_type": "BASE TABLE",
+         "total_size": 16384, "estimated_rows": 5},
+    ]
+
+    async def test_groups_sections_per_table(self):
+        columns = [
+            {"oid": 10, "column_name": "id", "data_type": "integer", "key_type": "PRIMARY KEY"},
+            {"oid": 20, "column_name": "id", "data_type": "integer", "key_type": "PRIMARY KEY"},
+            {"oid": 20, "column_name": "customer_id", "data_type": "integer", "key_type": "FOREIGN KEY"},
+        ]
+        constraints = [{"oid": 20, "constraint_name": "orders_pkey", "constraint_type": "PRIMARY KEY",
+                        "definition": "PRIMARY KEY (id)"}]
+        with patch.object(catalog, "execute_query", AsyncMock(return_value=self.RELATIONS)) as fetch, \
+                patch.object(catalog, "execute_queries", AsyncMock(return_value=[columns, constraints, []])) as batch:
+            tables = await catalog.get_schema_batch("public", ["orders", "customers"], database="shop")
+
+        assert fetch.await_args.args[1] == ["public", ["orders", "customers"], 500]
+        queries = batch.await_args.args[0]
+        assert len(queries) == 3 and all(params == [[10, 20]] for _, params in queries)
+        assert [t["table_name"] for t in tables] == ["customers", "orders"]
+        assert [c["column_name"] for c in tables[1]["columns"]] == ["id", "customer_id"]
+        assert "oid" not in tables[1]["columns"][0]
+        assert tables[1]["constraints"][0]["constraint_name"] == "orders_pkey"
+        assert tables[0]["constraints"] == [] and tables[0]["indexes"] == []
+
+    async def test_whole_schema_and_empty_result(self):
+        with patch.object(catalog, "execute_query", AsyncMock(return_value=[])) as fetch, \
+                patch.object(catalog, "execute_queries", AsyncMock()) as batch:
+            assert await catalog.get_schema_batch("empty") == []
+        assert fetch.await_args.args[1] == ["empty", None, 500]
+        batch.assert_not_awaited()
+
+    def test_format(self):
+        tables = [{**self.RELATIONS[1], "columns": [{"column_name": "id"}, {"column_name": "total"}],
+                   "constraints": [], "indexes": [{"index_name": "orders_pkey"}, {"index_name": "orders_idx"}]}]
+        report = catalog.format_schema_batch(tables, "Table Schemas in public")
+        assert "Table Schemas in public: 1 tables" in report
+        assert "public.orders (BASE TABLE, 16.00 KB, ~5 rows) - Columns" in report
+        assert "Constraints" not in report and "- Indexes" in report
+
+    def test_output_budget_spans_all_tables(self, monkeypatch):
+        monkeypatch.setitem(OUTPUT_CONFIG, "max_bytes", 2000)
+        tables = [{**self.RELATIONS[1], "table_name": f"t{n}",
+                   "columns": [{"column_name": "id"}, {"column_name": "total"}], "constraints": [],
+                   "indexes": [{"index_name": f"t{n}_pkey"}, {"index_name": f"t{n}_idx"}]} for n in range(200)]
+        report = catalog.format_schema_batch(tables, "Table Schemas in public")
+        lines = report.splitlines()
+        body = [line for line in lines if "not shown (output limit" not in line]
+        assert len("\n".join(body).encode()) <= 2000
+        assert len(lines) - len(body) <= 4
+        shown = sum(" - Columns" in line for line in lines)
+        assert 0 < shown < 200
+        assert lines[-1] == (f"... {200 - shown} more tables not shown (output limit of 2000 bytes reached after "
+                             f"{shown} tables; narrow the request or raise POSTGRES_OUTPUT_MAX_BYTES)")
+
+
+class TestTablePage:
+    """get_table_list pages are keyset-paginated and read one row past the page."""
+
+    @staticmethod
+    def _stream(rows):
+        calls = []
+
+        async def _stream_query(query, params=None, database=None, limit=None):
+            calls.append((params, database, limit))
+            for row in rows[:limit]:
+                yield row
+
+        return _stream_query, calls
+
+    ROWS = [{"schema_name": "public", "table_name": f"t{n}", "owner": "app", "total_size": 8192} for n in range(3)]
+
+    async def test_next_page_cursor(self):
+        stream, calls = self._stream(self.ROWS)
+        with patch.object(catalog, "stream_query", stream):
+            rows, next_after = await catalog.get_table_page(page_size=2, database="app")
+        assert [r["table_name"] for r in rows] == ["t0", "t1"]
+        assert next_after == "public.t1"
+        assert calls == [([None, None, 3, True], "app", 3)]
+
+    async def test_last_page_without_sizes(self):
+        stream, calls = self._stream(self.ROWS[2:])
+        with patch.object(catalog, "stream_query", stream):
+            rows, next_after = await catalog.get_table_page("public.t1", 2, include_size=False)
+        assert rows == [{"schema_name": "public", "table_name": "t2", "owner": "app"}]
+        assert next_after is None
+        assert calls[0][0] == ["public", "t1", 3, False]
+
+    @pytest.mark.parametrize("schema, table, cursor", [
+        ("public", "t1", "public.t1"),
+        ("my.schema", "Orders", '"my.schema"."Orders"'),
+        ('odd"name', "a.b.c", '"odd""name"."a.b.c"'),
+    ])
+    def test_cursor_round_trip(self, schema, table, cursor):
+        assert catalog.table_cursor(schema, table) == cursor
+        assert catalog.parse_table_cursor(cursor) == (schema, table)
+
+    async def test_cursor_of_dotted_schema(self):
+        stream, calls = self._stream([{"schema_name": "my.schema", "table_name": f"t{n}", "owner": "app",
+                                       "total_size": 0} for n in range(3)])
+        with patch.object(catalog, "stream_query", stream):
+            _, next_after = await catalog.get_table_page(page_size=2)
+            await catalog.get_table_page(next_after, 2)
+        assert next_after == '"my.schema".t1'
+        assert calls[1][0][:2] == ["my.schema", "t1"]
+
+    def test_ambiguous_cursor_rejected(self):
+        with pytest.raises(ValueError, match="Invalid after value"):
+            catalog.parse_table_cursor("my.schema.t1")
+
+
+class TestCatalogFingerprints:
+    """The catalog is fingerprinted at most once per check interval and database."""
+
+    @pytest.fixture
+    def fingerprints(self, monkeypatch):
+        monkeypatch.setattr(catalog.functions, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "app"})
+        monkeypatch.setattr(catalog, "CATALOG_CACHE_CONFIG", {"check_interval": 60, "change_table": ""})
+        return catalog.CatalogFingerprints()
+
+    async def test_checked_once_per_interval(self, fingerprints):
+        fetch = AsyncMock(return_value={"fingerprint": "120:4/751"})
+        with patch.object(catalog.functions, "execute_single_query", fetch):
+            results = await asyncio.gather(*(fingerprints.get() for _ in range(5)))
+            assert await fingerprints.get("app") == "120:4/751"
+            await fingerprints.get("other")
+        assert results == ["120:4/751"] * 5
+        assert fetch.await_count == 2
+        assert "pg_stat_get_tuples_inserted" in fetch.await_args.args[0]
+        assert fetch.await_args.kwargs["database"] == "other"
+
+    async def test_change_seen_after_interval(self, fingerprints):
+        catalog.CATALOG_CACHE_CONFIG["check_interval"] = 0
+        fetch = AsyncMock(side_effect=[{"fingerprint": "1"}, {"fingerprint": "2"}])
+        with patch.object(catalog.functions, "execute_single_query", fetch):
+            assert await fingerprints.get() == "1"
+            assert await fingerprints.get() == "2"
+
+    async def test_failed_check_never_matches(self, fingerprints):
+        catalog.CATALOG_CACHE_CONFIG["check_interval"] = 0
+        with patch.object(catalog.functions, "execute_single_query", AsyncMock(side_effect=Exception("down"))):
+            first = await fingerprints.get()
+            await asyncio.sleep(0.001)
+            assert await fingerprints.get() != first
+
+    @pytest.mark.parametrize("table, expected", [
+        ("public.mcp_ddl_changes", "max(id) FROM public.mcp_ddl_changes"),
+        ("ddl; DROP TABLE x", "pg_stat_get_tuples_inserted"),
+    ])
+    def test_change_table_query(self, fingerprints, table, expected):
+        catalog.CATALOG_CACHE_CONFIG["change_table"] = table
+        assert expected in catalog._fingerprint_query()
@@ -0,0 +1,741 @@
+"""Unit tests for functions.py — no database required."""
+import asyncio
+import gc
+import inspect
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+
+import mcp_postgresql_ops.functions as fn
+
+
+class _FakeAcquire:
+    """Async context manager returned by FakePool.acquire()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    """Minimal stand-in for asyncpg.Pool."""
+
+    def __init__(self, rows=None, **kwargs):
+        self.kwargs = kwargs
+        self.conn = MagicMock()
+        self.conn.fetch = AsyncMock(return_value=rows or [])
+        self.closed = False
+        self.expired = 0
+
+    def acquire(self):
+        return _FakeAcquire(self.conn)
+
+    async def expire_connections(self):
+        self.expired += 1
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pools(monkeypatch):
+    """Route pool creation to FakePool and start from an empty registry."""
+    created = []
+
+    async def _create_pool(**kwargs):
+        pool = FakePool(rows=[{"one": 1}], **kwargs)
+        created.append(pool)
+        return pool
+
+    monkeypatch.setattr(fn, "_pool_registry", fn._PoolRegistry())
+    monkeypatch.setattr(fn, "POSTGRES_CONFIG", {
+        "host": "db", "port": 5432, "user": "u", "password": "p", "database": "postgres",
+    })
+    with patch.object(fn.asyncpg, "create_pool", side_effect=_create_pool):
+        yield created
+
+
+def _pool_for(database):
+    return fn._pool_registry.entries[("db", 5432, database)].task.result()
+
+
+class TestConnectionPool:
+    """Pooled connections are created lazily and reused per database."""
+
+    async def test_pool_reused_for_same_database(self, fake_pools):
+        await fn.execute_query("SELECT 1")
+        await fn.execute_query("SELECT 1")
+        assert len(fake_pools) == 1
+        assert fake_pools[0].conn.fetch.await_count == 2
+
+    async def test_pool_per_database(self, fake_pools):
+        await fn.execute_query("SELECT 1")
+        await fn.execute_query("SELECT 1", database="analytics")
+        assert len(fake_pools) == 2
+        assert _pool_for("analytics").kwargs["database"] == "analytics"
+
+    async def test_pool_uses_configured_sizes(self, fake_pools, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "min_size", 2)
+        monkeypatch.setitem(fn.POOL_CONFIG, "max_size", 7)
+        await fn.execute_query("SELECT 1")
+        assert fake_pools[0].kwargs["min_size"] == 2
+        assert fake_pools[0].kwargs["max_size"] == 7
+
+    async def test_execute_query_returns_dicts(self, fake_pools):
+        assert await fn.execute_query("SELECT 1 AS one") == [{"one": 1}]
+
+    async def test_failed_pool_creation_is_not_cached(self, fake_pools):
+        with patch.object(fn.asyncpg, "create_pool", side_effect=OSError("refused")):
+            with pytest.raises(OSError):
+                await fn.execute_query("SELECT 1")
+        assert not fn._pool_registry.entries
+        assert await fn.execute_query("SELECT 1") == [{"one": 1}]
+
+    async def test_max_lifetime_expires_connections(self, fake_pools):
+        await fn.execute_query("SELECT 1")
+        fn._pool_registry.entries[("db", 5432, "postgres")].expires_at = 0
+        await fn.execute_query("SELECT 1")
+        assert fake_pools[0].expired == 1
+
+    async def test_close_db_pools(self, fake_pools):
+        await fn.execute_query("SELECT 1")
+        await fn.close_db_pools()
+        assert fake_pools[0].closed
+        assert not fn._pool_registry.entries
+
+
+class TestPoolBudget:
+    """The registry keeps all pools inside a global connection budget."""
+
+    @pytest.fixture(autouse=True)
+    def small_budget(self, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "max_size", 2)
+        monkeypatch.setitem(fn.POOL_CONFIG, "max_total_connections", 4)
+        monkeypatch.setitem(fn.POOL_CONFIG, "budget_wait_timeout", 0.05)
+
+    async def test_least_recently_used_pool_is_evicted(self, fake_pools):
+        await fn.execute_query("SELECT 1", database="db1")
+        await fn.execute_query("SELECT 1", database="db2")
+        await fn.execute_query("SELECT 1", database="db1")
+        await fn.execute_query("SELECT 1", database="db3")
+        names = [key[2] for key in fn._pool_registry.entries]
+        assert names == ["db1", "db3"]
+        assert fake_pools[1].closed
+        assert fn._pool_registry.reserved() <= 4
+
+    async def test_busy_pools_are_not_evicted(self, fake_pools):
+        async with fn.acquire_connection("db1"):
+            async with fn.acquire_connection("db2"):
+                with pytest.raises(Exception, match="budget exhausted"):
+                    await fn.execute_query("SELECT 1", database="db3")
+        assert not fake_pools[0].closed
+        assert not fake_pools[1].closed
+
+    async def test_idle_pools_are_reaped(self, fake_pools, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "reap_timeout", 60)
+        await fn.execute_query("SELECT 1", database="db1")
+        fn._pool_registry.entries[("db", 5432, "db1")].last_used -= 120
+        await fn.execute_query("SELECT 1", database="db2")
+        assert [key[2] for key in fn._pool_registry.entries] == ["db2"]
+        assert fake_pools[0].closed
+
+
+class TestStreamQuery:
+    """Rows come from a server-side cursor inside a read-only transaction."""
+
+    @pytest.fixture
+    def conn(self, fake_pools, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "stream_batch_rows", 2)
+        conn = MagicMock()
+        conn.produced = 0
+
+        async def _cursor(query, *args, prefetch=None):
+            conn.cursor_call = (query, args, prefetch)
+            for n in range(10):
+                conn.produced += 1
+                yield {"n": n}
+
+        conn.cursor = _cursor
+        conn.transaction = MagicMock(return_value=_FakeAcquire(None))
+        monkeypatch.setattr(fn, "acquire_connection", lambda database=None: _FakeAcquire(conn))
+        return conn
+
+    async def test_streams_with_limit(self, conn):
+        rows = [row async for row in fn.stream_query("SELECT n", [1], limit=3)]
+        assert rows == [{"n": 0}, {"n": 1}, {"n": 2}]
+        assert conn.produced == 3
+        assert conn.cursor_call == ("SELECT n", (1,), 2)
+        conn.transaction.assert_called_once_with(readonly=True)
+
+    async def test_whole_result_without_limit(self, conn):
+        assert len([row async for row in fn.stream_query("SELECT n")]) == 10
+
+    async def test_zero_limit_skips_query(self, conn):
+        assert [row async for row in fn.stream_query("SELECT n", limit=0)] == []
+        conn.transaction.assert_not_called()
+
+
+class _Record:
+    """Positional row like asyncpg.Record: keys() and values(), no dict underneath."""
+
+    def __init__(self, keys, values):
+        self._keys, self._values = tuple(keys), tuple(values)
+
+    def keys(self):
+        return iter(self._keys)
+
+    def values(self):
+        return iter(self._values)
+
+    def __getitem__(self, key):
+        return self._values[self._keys.index(key)]
+
+
+class TestFormatTableData:
+    """Columns are aligned; sizes and durations render like format_bytes/format_duration."""
+
+    ROWS = [
+        {"name": "a", "total_size": 1536, "wait_time": 90, "label_size": "n/a", "flag": True, "note": None},
+        {"name": "b", "total_size": None, "wait_time": 0.5, "label_size": "big", "flag": False, "note": "x"},
+    ]
+
+    def test_table(self):
+        assert fn.format_table_data(self.ROWS, "T").splitlines() == [
+            "=== T ===", "",
+            "name | total_size | wait_time | label_size | flag  | note",
+            "-" * 57,
+            "a    | 1.50 KB    | 1.50m     | n/a        | True  | NULL",
+            "b    | NULL       | 0.50s     | big        | False | x",
+        ]
+
+    def test_single_record(self):
+        assert fn.format_table_data(self.ROWS[:1]).splitlines() == [
+            "name: a", "total_size: 1.50 KB", "wait_time: 1.50m", "label_size: n/a", "flag: True", "note: None"]
+
+    def test_records_need_no_dict_copy(self):
+        records = [_Record(row.keys(), row.values()) for row in self.ROWS]
+        assert fn.format_table_data(records, "T") == fn.format_table_data(self.ROWS, "T")
+        assert fn.format_table_data([{"a": 1, "b": None}, {"a": 2, "b": "y"}]).endswith("1 | NULL\n2 | y")
+
+    SIZES = [0, 1, 1023, 1023.999, 1024, 1536.5, 1024 ** 2 - 1, 1024 ** 2, 5 * 1024 ** 4, 1024 ** 5, 1024 ** 7,
+             -5, True, float("nan"), float("inf"), None]
+    SECONDS = [0, 0.004, 59.994, 59.996, 60, 61.5, 3599.9, 3600, 86400 * 3, -1, float("nan"), None]
+
+    def test_bulk_columns_match_per_cell(self):
+        def cell(formatter, value):
+            return "NULL" if value is None else formatter(value)
+
+        assert fn._format_bytes_column(self.SIZES) == [cell(fn.format_bytes, v) for v in self.SIZES]
+        assert fn._format_duration_column(self.SECONDS) == [cell(fn.format_duration, v) for v in self.SECONDS]
+
+    def test_non_numeric_columns_fall_back_per_cell(self):
+        rows = [{"total_size": Decimal("1.5"), "wait_time": 61}, {"total_size": 2048, "wait_time": "n/a"}]
+        assert fn.format_table_data(rows).splitlines()[2:] == ["1.5        | 1.02m", "2.00 KB    | n/a"]
+
+
+class TestTableRenderer:
+    """Cells are capped and rows beyond the output budget are counted, not rendered."""
+
+    ROWS = [{"pid": n, "query": f"SELECT {n}"} for n in range(100)]
+
+    def test_long_cells_are_cut(self):
+        renderer = fn.TableRenderer(max_cell_width=10)
+        renderer.add([{"pid": 1, "query": "SELECT *\n  FROM pg_class"}, {"pid": 22, "query": "x"}])
+        assert renderer.lines == ["pid | query", "-" * 16, "1   | SELECT ...", "22  | x"]
+
+    def test_budget_elides_rows_with_summary(self):
+        renderer = fn.TableRenderer("T", max_bytes=200)
+        assert renderer.add(self.ROWS[:50]) is False
+        assert renderer.add(self.ROWS[50:]) is False
+        text = renderer.text()
+        assert len(text.encode()) - len(text.splitlines()[-1]) <= 200
+        assert renderer.shown + renderer.dropped == 100 and renderer.shown > 0
+        assert text.endswith(f"... {renderer.dropped} more rows not shown (output limit of 200 bytes reached "
+                             f"after {renderer.shown} rows; narrow the request or raise POSTGRES_OUTPUT_MAX_BYTES)")
+
+    def test_header_counts_against_budget(self):
+        renderer = fn.TableRenderer("T", max_bytes=30)
+        assert renderer.add(self.ROWS[:2]) is False
+        assert renderer.used <= 30
+        assert renderer.lines == ["=== T ===\n", "pid | query"]
+        assert (renderer.shown, renderer.dropped) == (0, 2)
+
+    def test_budget_counts_utf8_bytes(self):
+        renderer = fn.TableRenderer(max_bytes=30)
+        renderer.add([{"name": "\u00e9" * 4}, {"name": "\u00e9" * 4}, {"name": "\u00e9" * 4}])
+        assert renderer.shown == 2 and renderer.dropped == 1
+
+    def test_rows_past_the_budget_are_not_formatted(self, monkeypatch):
+        renderer = fn.TableRenderer(max_bytes=100)
+        renderer.add(self.ROWS[:10])
+        columns = MagicMock(side_effect=AssertionError("formatted after the budget was used up"))
+        monkeypatch.setattr(fn._ColumnPlan, "columns", columns)
+        renderer.add(self.ROWS[10:])
+        assert renderer.dropped == 100 - renderer.shown
+
+    def test_tables_of_one_response_share_the_budget(self, monkeypatch):
+        monkeypatch.setitem(fn.OUTPUT_CONFIG, "max_bytes", 500)
+        with fn.output_budget() as budget:
+            report = "\n\n".join(fn.format_table_data(self.ROWS, f"T{n}") for n in range(3))
+        body = [line for line in report.splitlines() if "not shown (output limit" not in line]
+        assert budget.spent and len("\n".join(body).encode()) <= 500
+
+    def test_zero_disables_limits(self):
+        renderer = fn.TableRenderer(max_bytes=0, max_cell_width=0)
+        renderer.add([{"query": "x" * 1000}] * 2)
+        assert renderer.shown == 2 and len(renderer.lines[-1]) == 1000
+
+
+class TestTableStream:
+    """Streamed rows are formatted exactly like format_table_data, with an optional row cap."""
+
+    ROWS = [{"name": f"t{n}", "total_size": 2048 * n, "exec_time": 0.5, "note": None} for n in range(5)]
+
+    @staticmethod
+    async def _rows(rows, seen=None):
+        for row in rows:
+            if seen is not None:
+                seen.append(row)
+            yield row
+
+    @pytest.mark.parametrize("count", [0, 1, 5])
+    async def test_matches_format_table_data(self, count):
+        rows = self.ROWS[:count]
+        assert await fn.format_table_stream(self._rows(rows), "Stats") == fn.format_table_data(rows, "Stats")
+
+    @pytest.mark.parametrize("batch_rows", [2, 3, 500])
+    async def test_batches_match_whole_table(self, batch_rows, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "stream_batch_rows", batch_rows)
+        report = await fn.format_table_stream(self._rows(self.ROWS), "Stats")
+        assert report == fn.format_table_data(self.ROWS, "Stats")
+        capped = await fn.format_table_stream(self._rows(self.ROWS), "Stats", max_rows=4)
+        assert capped.splitlines()[:-1] == fn.format_table_data(self.ROWS[:4], "Stats").splitlines()
+
+    async def test_row_cap_reads_one_extra_row(self):
+        seen = []
+        report = await fn.format_table_stream(self._rows(self.ROWS, seen), "Stats", max_rows=2)
+        assert report.splitlines()[:-1] == fn.format_table_data(self.ROWS[:2], "Stats").splitlines()
+        assert report.endswith("... more rows not shown (result capped at 2 rows)")
+        assert len(seen) == 3
+
+    async def test_budget_stops_reading_streamed_rows(self, monkeypatch):
+        monkeypatch.setitem(fn.OUTPUT_CONFIG, "max_bytes", 120)
+        monkeypatch.setitem(fn.POOL_CONFIG, "stream_batch_rows", 2)
+        rows = [{"name": f"t{n}", "n": n} for n in range(50)]
+        seen = []
+        report = await fn.format_table_stream(self._rows(rows, seen), max_rows=40)
+        lines = report.splitlines()
+        shown = len(lines) - 3
+        assert lines[-1].startswith(f"... more rows not shown (output limit of 120 bytes reached after {shown} rows")
+        assert len(seen) < 2 * shown
+
+    async def test_stream_table_data_caps_cursor(self, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "max_result_rows", 3)
+        calls = []
+
+        async def _stream_query(query, params=None, database=None, limit=None):
+            calls.append((query, params, database, limit))
+            for row in self.ROWS[:limit]:
+                yield row
+
+        monkeypatch.setattr(fn, "stream_query", _stream_query)
+        report = await fn.stream_table_data("SELECT 1", title="Stats", database="app")
+        assert calls == [("SELECT 1", None, "app", 4)]
+        assert "capped at 3 rows" in report
+        monkeypatch.setitem(fn.POOL_CONFIG, "max_result_rows", 0)
+        await fn.stream_table_data("SELECT 1")
+        assert calls[-1][3] is None
+
+
+class TestStructuredOutput:
+    """output_format returns the tool's tables as typed JSON, NDJSON or CSV instead of text."""
+
+    ROWS = [
+        {"relname": "orders", "total_size": Decimal("8192"), "ratio": Decimal("0.25"), "flush_lsn": 23876328,
+         "age": timedelta(minutes=1, seconds=30), "last_vacuum": datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc),
+         "active": True},
+        {"relname": "items", "total_size": None, "ratio": Decimal("NaN"), "flush_lsn": None,
+         "age": None, "last_vacuum": None, "active": False},
+    ]
+
+    @pytest.fixture(params=["orjson", "json"])
+    def serializer(self, request, monkeypatch):
+        if request.param == "orjson":
+            if fn.orjson is None:
+                pytest.skip("orjson not installed")
+        else:
+            monkeypatch.setattr(fn, "orjson", None)
+
+    @staticmethod
+    def _tool(rows, text=""):
+        @fn.structured_output
+        async def get_thing(database_name: str = None) -> str:
+            """Docstring is kept."""
+            return text + fn.format_table_data(rows, "Things") + "\n" + fn.format_table_data([], "Empty")
+
+        return get_thing
+
+    async def test_text_is_unchanged(self):
+        tool = self._tool(self.ROWS)
+        assert await tool() == fn.format_table_data(self.ROWS, "Things") + "\n" + fn.format_table_data([], "Empty")
+        assert list(inspect.signature(tool).parameters) == ["database_name", "output_format"]
+        assert tool.__doc__ == "Docstring is kept."
+
+    async def test_json_keeps_types(self, serializer):
+        result = json.loads(await self._tool(self.ROWS)(output_format="json"))
+        things, empty = result["tables"]
+        assert things["columns"] == list(self.ROWS[0])
+        assert things["rows"] == [
+            ["orders", 8192, 0.25, 23876328, 90.0, "2024-05-01T12:00:00+00:00", True],
+            ["items", None, None, None, None, None, False],
+        ]
+        assert empty == {"title": "Empty", "columns": [], "rows": [], "truncated": False}
+
+    async def test_ndjson_one_object_per_row(self, serializer):
+        lines = (await self._tool(self.ROWS)(output_format="ndjson")).splitlines()
+        assert [json.loads(line)["relname"] for line in lines] == ["orders", "items"]
+        assert json.loads(lines[0])["_table"] == "Things"
+
+    async def test_csv(self):
+        result = await self._tool(self.ROWS[:1])(output_format="csv")
+        assert result.splitlines() == [
+            "# Things", "relname,total_size,ratio,flush_lsn,age,last_vacuum,active",
+            "orders,8192,0.25,23876328,90.0,2024-05-01T12:00:00+00:00,true", "", "# Empty",
+        ]
+
+    @staticmethod
+    def _paged_tool(rows, next_after):
+        @fn.structured_output
+        async def get_page() -> str:
+            result = "=== Summary ===\n\n" + fn.format_table_data(rows, "Things")
+            fn.add_result_field("next_after", next_after)
+            if next_after:
+                result += f"\n\nMore follow. Next page: after={json.dumps(next_after)}"
+            return result + "\nRecommendation: vacuum orders"
+
+        return get_page
+
+    async def test_json_keeps_cursor_and_notes(self, serializer):
+        result = json.loads(await self._paged_tool(self.ROWS, '"my.schema".t1')(output_format="json"))
+        assert result["next_after"] == '"my.schema".t1'
+        assert result["notes"] == ["=== Summary ===", 'More follow. Next page: after="\\"my.schema\\".t1"',
+                                   "Recommendation: vacuum orders"]
+        last_page = json.loads(await self._paged_tool(self.ROWS, None)(output_format="json"))
+        assert last_page["next_after"] is None and len(last_page["tables"]) == 1
+
+    async def test_ndjson_and_csv_keep_cursor_and_notes(self, serializer):
+        tool = self._paged_tool(self.ROWS[:1], "public.t1")
+        trailer = json.loads((await tool(output_format="ndjson")).splitlines()[-1])
+        assert trailer["_next_after"] == "public.t1"
+        assert trailer["_notes"][-1] == "Recommendation: vacuum orders"
+        lines = (await tool(output_format="csv")).splitlines()
+        assert lines[2:] == ["# next_after: public.t1", "# === Summary ===",
+                             '# More follow. Next page: after="public.t1"', "# Recommendation: vacuum orders"]
+
+    async def test_errors_and_invalid_format(self):
+        async def failing() -> str:
+            return "Error retrieving things: boom"
+
+        tool = fn.structured_output(failing)
+        assert json.loads(await tool(output_format="json")) == {"error": "Error retrieving things: boom"}
+        assert (await tool(output_format="xml")).startswith("Error: output_format must be one of")
+
+    async def test_streamed_rows_are_collected_with_cap(self):
+        async def rows():
+            for n in range(5):
+                yield {"n": n}
+
+        @fn.structured_output
+        async def get_stream() -> str:
+            return await fn.format_table_stream(rows(), "Stream", max_rows=3)
+
+        table = json.loads(await get_stream(output_format="json"))["tables"][0]
+        assert table["rows"] == [[0], [1], [2]] and table["truncated"] is True
+
+    async def test_cache_keys_on_format(self, monkeypatch):
+        monkeypatch.setattr(fn, "_tool_cache", fn._ToolResultCache())
+        monkeypatch.setattr(fn, "TOOL_CACHE_CONFIG", {
+            "enabled": True, "max_entries": 256, "max_bytes": 1 << 20, "max_stale": 60, "ttl_overrides": {},
+        })
+        tool = fn.cached_tool(ttl=60, stale_while_revalidate=True)(self._tool(self.ROWS))
+        text = await tool()
+        assert await tool(output_format="text") == text
+        assert json.loads(await tool(output_format="json"))["tables"][0]["title"] == "Things"
+
+
+class TestConcurrentQueries:
+    """Independent queries run concurrently under a concurrency cap."""
+
+    async def test_gather_preserves_order(self):
+        async def _value(v, delay):
+            await asyncio.sleep(delay)
+            return v
+
+        results = await fn.gather_with_limit(_value("a", 0.02), _value("b", 0), _value("c", 0.01))
+        assert results == ["a", "b", "c"]
+
+    async def test_gather_respects_limit(self):
+        running = 0
+        peak = 0
+
+        async def _track():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await fn.gather_with_limit(*(_track() for _ in range(6)), limit=2)
+        assert peak == 2
+
+    async def test_execute_queries_accepts_params(self, fake_pools):
+        results = await fn.execute_queries(["SELECT 1", ("SELECT $1", [1])])
+        assert results == [[{"one": 1}], [{"one": 1}]]
+        calls = fake_pools[0].conn.fetch.await_args_list
+        assert calls[0].args == ("SELECT 1",)
+        assert calls[1].args == ("SELECT $1", 1)
+
+
+class TestServerCapabilities:
+    """Version, extensions and settings come from one cached snapshot query."""
+
+    @pytest.fixture
+    def snapshot_pool(self, fake_pools, monkeypatch):
+        monkeypatch.setattr(fn, "_capability_cache", {})
+        monkeypatch.setattr(fn, "_capability_tasks", {})
+        row = {
+            "version": "PostgreSQL 17.2 on x86_64-pc-linux-gnu",
+            "server_version_num": 170002,
+            "database_name": "postgres",
+            "in_recovery": False,
+            "extensions": '{"pg_stat_statements": "1.11"}',
+            "settings": '{"track_io_timing": "on"}',
+            "catalog_columns": '{"pg_stat_io": ["backend_type", "object"]}',
+        }
+
+        async def _fetch(query, *args):
+            return [row]
+
+        async def _create_pool(**kwargs):
+            pool = FakePool(**kwargs)
+            pool.conn.fetch = AsyncMock(side_effect=_fetch)
+            fake_pools.append(pool)
+            return pool
+
+        with patch.object(fn.asyncpg, "create_pool", side_effect=_create_pool):
+            yield fake_pools
+
+    async def test_snapshot_decodes_json_columns(self, snapshot_pool):
+        capabilities = await fn.get_server_capabilities()
+        assert capabilities["extensions"] == {"pg_stat_statements": "1.11"}
+        assert capabilities["settings"]["track_io_timing"] == "on"
+
+    async def test_probes_share_one_query(self, snapshot_pool):
+        version, has_pss, has_psm = await asyncio.gather(
+            fn.get_server_version(),
+            fn.check_extension_exists("pg_stat_statements"),
+            fn.check_extension_exists("pg_stat_monitor"),
+        )
+        assert version.startswith("PostgreSQL 17.2")
+        assert has_pss is True
+        assert has_psm is False
+        assert snapshot_pool[0].conn.fetch.await_count == 1
+
+    async def test_snapshot_expires_after_ttl(self, snapshot_pool, monkeypatch):
+        monkeypatch.setattr(fn, "CAPABILITY_TTL", 0)
+        await fn.get_server_capabilities()
+        await fn.get_server_capabilities()
+        assert snapshot_pool[0].conn.fetch.await_count == 2
+
+
+class _FakeStatement:
+    def __init__(self, query):
+        self.query = query
+        self.fetch = AsyncMock(return_value=[{"one": 1}])
+
+
+class TestHotStatements:
+    """Hot queries are prepared once per connection and reused."""
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        cache = fn._HotStatementCache()
+        cache.register("SELECT hot")
+        monkeypatch.setattr(fn, "_hot_statements", cache)
+        monkeypatch.setattr(fn, "POSTGRES_CONFIG", {"host": "db", "port": 5432})
+        return cache
+
+    @staticmethod
+    def _conn(pid=101):
+        conn = MagicMock()
+        conn.get_server_pid.return_value = pid
+        conn.prepare = AsyncMock(side_effect=_FakeStatement)
+        conn.fetch = AsyncMock(return_value=[])
+        return conn
+
+    async def test_warmup_prepares_hot_queries(self, cache):
+        conn = self._conn()
+        await cache.warm(conn)
+        await cache.fetch(conn, "SELECT hot", [1])
+        assert conn.prepare.await_count == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["warmed"] == 1
+
+    async def test_cold_connection_prepares_on_first_use(self, cache):
+        conn = self._conn()
+        await cache.fetch(conn, "SELECT hot", [])
+        await cache.fetch(conn, "SELECT hot", [])
+        stats = cache.stats()
+        assert (stats["misses"], stats["hits"]) == (1, 1)
+        assert stats["hit_ratio_percent"] == 50.0
+
+    async def test_statements_are_kept_per_connection(self, cache):
+        # Same backend pid (e.g. another database on the same server) must not share statements
+        old, new = self._conn(pid=7), self._conn(pid=7)
+        await cache.warm(old)
+        await cache.fetch(new, "SELECT hot", [])
+        assert new.prepare.await_count == 1
+        assert cache.statements[old]["SELECT hot"].fetch.await_count == 0
+
+    async def test_closed_connection_drops_statements(self, cache):
+        conn = self._conn()
+        await cache.warm(conn)
+        del conn
+        gc.collect()
+        assert len(cache.statements) == 0
+
+    async def test_other_queries_use_plain_fetch(self, cache):
+        conn = self._conn()
+        await cache.fetch(conn, "SELECT other", [1])
+        conn.fetch.assert_awaited_once_with("SELECT other", 1)
+        conn.prepare.assert_not_awaited()
+
+    async def test_disabled_with_statement_cache(self, cache, monkeypatch):
+        monkeypatch.setitem(fn.POOL_CONFIG, "statement_cache_size", 0)
+        conn = self._conn()
+        await cache.fetch(conn, "SELECT hot", [])
+        conn.prepare.assert_not_awaited()
+
+    async def test_pool_gets_warmup_hook(self, cache, fake_pools):
+        await fn.execute_query("SELECT 1")
+        assert fake_pools[0].kwargs["init"] == cache.warm
+
+
+class TestToolResultCache:
+    """Tool results are cached per arguments with single-flight loading."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_cache(self, monkeypatch):
+        monkeypatch.setattr(fn, "_tool_cache", fn._ToolResultCache())
+        monkeypatch.setattr(fn, "TOOL_CACHE_CONFIG", {
+            "enabled": True, "max_entries": 256, "max_bytes": 1 << 20, "max_stale": 0, "ttl_overrides": {},
+        })
+        monkeypatch.setattr(fn, "POSTGRES_CONFIG", {"host": "db", "port": 5432})
+
+    @staticmethod
+    def _tool(ttl=60, result="rows", stale_while_revalidate=False):
+        calls = []
+
+        @fn.cached_tool(ttl=ttl, stale_while_revalidate=stale_while_revalidate)
+        async def get_thing(database_name: str = None, limit: int = 20) -> str:
+            """Docstring is kept."""
+            calls.append((database_name, limit))
+            await asyncio.sleep(0.01)
+            return f"{result} {database_name} {limit}"
+
+        return get_thing, calls
+
+    async def test_normalized_arguments_share_entry(self):
+        tool, calls = self._tool()
+        first = await tool()
+        assert await tool(database_name=None) == first
+        assert await tool(None, 20) == first
+        await tool(limit=5)
+        assert calls == [(None, 20), (None, 5)]
+        assert tool.__doc__ == "Docstring is kept."
+
+    async def test_concurrent_calls_are_coalesced(self):
+        tool, calls = self._tool()
+        results = await asyncio.gather(*(tool("app") for _ in range(5)))
+        assert len(set(results)) == 1
+        assert len(calls) == 1
+
+    async def test_entries_expire(self):
+        tool, calls = self._tool(ttl=0.01)
+        await tool()
+        await asyncio.sleep(0.02)
+        await tool()
+        assert len(calls) == 2
+
+    async def test_errors_are_not_cached(self):
+        tool, calls = self._tool(result="Error retrieving thing:")
+        await tool()
+        await tool()
+        assert len(calls) == 2
+
+    async def test_size_eviction(self):
+        fn.TOOL_CACHE_CONFIG["max_entries"] = 2
+        tool, calls = self._tool()
+        for limit in (1, 2, 3):
+            await tool(limit=limit)
+        assert len(fn._tool_cache.entries) == 2
+        await tool(limit=1)
+        assert len(calls) == 4
+
+    async def test_ttl_override_and_disable(self):
+        tool, calls = self._tool()
+        fn.TOOL_CACHE_CONFIG["ttl_overrides"]["get_thing"] = 0
+        await tool()
+        await tool()
+        assert len(calls) == 2
+
+    async def test_stale_result_served_while_refreshing(self):
+        fn.TOOL_CACHE_CONFIG["max_stale"] = 60
+        tool, calls = self._tool(ttl=0.01, stale_while_revalidate=True)
+        first = await tool()
+        await asyncio.sleep(0.02)
+        stale = await tool()
+        assert stale.startswith("[Cached result computed 0s ago")
+        assert stale.endswith(first)
+        # Callers during the refresh still get the stale copy, without a second refresh
+        await tool()
+        await asyncio.gather(*fn._tool_cache.inflight.values())
+        assert len(calls) == 2
+        assert await tool() == first
+        assert len(calls) == 2
+
+    async def test_fingerprint_change_misses_cache(self):
+        state = {"version": 1}
+        calls = []
+
+        async def fingerprint(arguments):
+            assert arguments == {"database_name": "app"}
+            return state["version"]
+
+        @fn.cached_tool(ttl=60, fingerprint=fingerprint)
+        async def get_schema(database_name: str = None) -> str:
+            calls.append(database_name)
+            return f"schema v{state['version']}"
+
+        assert await get_schema("app") == "schema v1"
+        assert await get_schema("app") == "schema v1"
+        state["version"] = 2
+        assert await get_schema("app") == "schema v2"
+        assert calls == ["app", "app"]
+
+    async def test_stale_mode_is_opt_in(self):
+        tool, calls = self._tool(ttl=0.01, stale_while_revalidate=True)
+        await tool()
+        await asyncio.sleep(0.02)
+        assert not (await tool()).startswith("[Cached")
+        assert len(calls) == 2
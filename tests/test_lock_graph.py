@@ -0,0 +1,144 @@
+"""Unit tests for lock_graph.py — no database required."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import mcp_postgresql_ops.lock_graph as lg
+
+
+def _row(pid, blocked_by=(), state="active", query=None):
+    return {"pid": pid, "username": "app", "database": "app", "state": state,
+            "wait_event_type": "Lock" if blocked_by else None, "wait_event": "relation" if blocked_by else None,
+            "xact_duration": 12.0, "state_duration": 3.0, "query": query or f"q{pid}",
+            "blocked_by": list(blocked_by)}
+
+
+class TestWaitForGraph:
+    """Root blockers, victims and chain depth come from the pg_blocking_pids() edges."""
+
+    def test_chain_and_fan_out(self):
+        # 10 blocks 11 and 12; 12 blocks 13; 20 blocks 21
+        graph = lg.WaitForGraph([
+            _row(10, state="idle in transaction"), _row(11, [10]), _row(12, [10]), _row(13, [12]),
+            _row(20), _row(21, [20]),
+        ])
+        assert graph.roots() == [10, 20]
+        assert graph.victims(10) == {11, 12, 13}
+        assert graph.depth(10) == 2
+        assert graph.depth(20) == 1
+        summary = graph.summary_rows()
+        assert [(r["root_pid"], r["directly_blocked"], r["total_victims"]) for r in summary] == [(10, 2, 3), (20, 1, 1)]
+        assert summary[0]["state"] == "idle in transaction"
+
+    def test_tree_is_depth_first(self):
+        graph = lg.WaitForGraph([_row(1), _row(2, [1]), _row(3, [2]), _row(4, [1])])
+        assert [(r["pid"].strip(), r["level"]) for r in graph.tree_rows()] == [("1", 0), ("2", 1), ("3", 2), ("4", 1)]
+
+    def test_waiter_with_several_blockers_listed_once(self):
+        graph = lg.WaitForGraph([_row(1), _row(2), _row(3, [1, 2])])
+        assert graph.roots() == [1, 2]
+        assert graph.edges == {(3, 1), (3, 2)}
+        assert [r["pid"].strip() for r in graph.tree_rows()].count("3") == 1
+
+    def test_wait_cycle_reported(self):
+        graph = lg.WaitForGraph([_row(5, [6]), _row(6, [5]), _row(7, [6])])
+        assert graph.roots() == [5]
+        assert graph.in_cycle(5)
+        assert graph.victims(5) == {6, 7}
+        assert graph.summary_rows()[0]["state"] == "wait cycle"
+
+    def test_waiter_behind_cycle_is_not_a_root(self):
+        # 1 queues behind the 5 <-> 6 deadlock and has the lowest pid
+        graph = lg.WaitForGraph([_row(1, [5]), _row(5, [6]), _row(6, [5])])
+        assert graph.roots() == [5]
+        assert graph.in_cycle(5)
+        assert not graph.in_cycle(1)
+        assert graph.victims(5) == {1, 6}
+        assert graph.levels[1] == 1
+
+    def test_unknown_blocker_pid(self):
+        # e.g. a prepared transaction holds the lock (reported as pid 0)
+        graph = lg.WaitForGraph([_row(8, [0])])
+        assert graph.roots() == [0]
+        assert graph.summary_rows()[0]["username"] is None
+
+
+class TestFormatLockTree:
+    async def test_no_waiters(self):
+        with patch.object(lg, "execute_query", AsyncMock(return_value=[])):
+            graph = await lg.get_wait_for_graph()
+        assert "No sessions are waiting" in lg.format_lock_tree(graph, "Lock Wait Tree")
+
+    async def test_sections(self):
+        with patch.object(lg, "execute_query", AsyncMock(return_value=[_row(1), _row(2, [1])])) as fetch:
+            graph = await lg.get_wait_for_graph("app")
+        assert "pg_blocking_pids" in fetch.await_args.args[0]
+        report = lg.format_lock_tree(graph, "Lock Wait Tree")
+        assert "Root Blockers" in report and "Blocking Tree" in report
+
+
+class TestLockWatcher:
+    """Watch mode reports changes between polls and looks up user and database for new pids only."""
+
+    @pytest.fixture
+    def watcher(self, monkeypatch):
+        monkeypatch.setattr(lg.functions, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "app"})
+        return lg.LockWatcher()
+
+    async def _poll(self, watcher, edges, queries=None):
+        async def _fetch(query, params=None, database=None):
+            if "pid = ANY" in query:
+                return [{"pid": pid, "username": "app", "database": "app"} for pid in params[0]]
+            rows = [_row(pid, blockers) for pid, blockers in edges.items()]
+            rows += [_row(pid) for pid in {b for blockers in edges.values() for b in blockers} - edges.keys()]
+            for row in rows:
+                row["query"] = (queries or {}).get(row["pid"], row["query"])
+                row.pop("username"), row.pop("database")
+            return rows
+
+        with patch.object(lg, "execute_query", AsyncMock(side_effect=_fetch)) as fetch:
+            previous, current = await watcher.poll()
+        return previous, current, fetch
+
+    async def test_details_fetched_for_new_pids_only(self, watcher):
+        _, graph, fetch = await self._poll(watcher, {2: [1]})
+        assert fetch.await_args_list[1].args[1] == [[1, 2]]
+        assert graph.roots() == [1]
+        previous, _, fetch = await self._poll(watcher, {2: [1], 3: [1]})
+        assert previous is not None
+        assert fetch.await_args_list[1].args[1] == [[3]]
+        _, _, fetch = await self._poll(watcher, {2: [1], 3: [1]})
+        assert fetch.await_count == 1
+
+    async def test_known_sessions_refreshed_from_current_poll(self, watcher):
+        await self._poll(watcher, {2: [1]})
+        _, graph, fetch = await self._poll(watcher, {2: [1]}, queries={1: "UPDATE orders", 2: "DELETE FROM orders"})
+        assert fetch.await_count == 1
+        assert graph.sessions[1]["query"] == "UPDATE orders"
+        assert graph.sessions[2]["query"] == "DELETE FROM orders"
+        assert graph.sessions[2]["username"] == "app"
+
+    def test_diff_reports_changes(self):
+        old = lg.WaitForGraph([_row(1), _row(2, [1]), _row(5), _row(6, [5]), _row(8), _row(9, [8])])
+        new = lg.WaitForGraph([_row(1), _row(2, [1]), _row(3, [1]), _row(8), _row(7), _row(10, [7])])
+        changes = {(c["change"], c["pid"]) for c in lg.diff_graphs(old, new)}
+        assert changes == {
+            ("new blocker", 7), ("resolved", 5), ("resolved", 8), ("queue grew", 1),
+            ("new waiter", 3), ("new waiter", 10), ("stopped waiting", 6), ("stopped waiting", 9),
+        }
+        assert lg.diff_graphs(new, new) == []
+
+    def test_root_that_starts_waiting_is_not_released(self):
+        old = lg.WaitForGraph([_row(1), _row(2, [1])])
+        new = lg.WaitForGraph([_row(0), _row(1, [0]), _row(2, [1])])
+        resolved = [c for c in lg.diff_graphs(old, new) if c["change"] == "resolved"]
+        assert resolved[0]["detail"] == "now waits behind 0"
+
+    async def test_format_baseline_then_changes(self, watcher, monkeypatch):
+        monkeypatch.setattr(lg, "lock_watcher", watcher)
+        await self._poll(watcher, {})
+        assert watcher.graphs
+        with patch.object(watcher, "poll", AsyncMock(return_value=(watcher.graphs[("db", 5432, "app")],
+                                                                     lg.WaitForGraph([_row(1), _row(2, [1])])))):
+            report = await lg.format_lock_watch()
+        assert "Lock Wait Changes" in report and "new blocker" in report
@@ -0,0 +1,262 @@
+"""Unit tests for metrics_sampler.py — no database required."""
+import asyncio
+from unittest.mock import AsyncMock, patch
+import pytest
+
+import mcp_postgresql_ops.metrics_sampler as ms
+from mcp_postgresql_ops.version_compat import PostgreSQLVersion
+
+
+class TestRingBuffer:
+    """Snapshots are kept in a fixed-size ring and diffed over a window."""
+
+    def test_window_needs_two_samples(self):
+        ring = ms.RingBuffer(["reads"], capacity=4)
+        ring.append(0.0, {("a",): [10]})
+        assert ring.window(60) is None
+
+    def test_deltas_and_elapsed(self):
+        ring = ms.RingBuffer(["reads", "writes"], capacity=4)
+        ring.append(0.0, {("a",): [10, 1]})
+        ring.append(10.0, {("a",): [30, 1]})
+        elapsed, deltas = ring.window(60)
+        assert elapsed == 10.0
+        assert deltas[("a",)] == [20, 0]
+
+    def test_window_selects_oldest_sample_inside(self):
+        ring = ms.RingBuffer(["reads"], capacity=8)
+        for t, value in ((0, 0), (10, 100), (20, 150), (30, 200)):
+            ring.append(float(t), {("a",): [value]})
+        elapsed, deltas = ring.window(20)
+        assert (elapsed, deltas[("a",)]) == (20.0, [100])
+        # A window shorter than the interval still compares the last two samples
+        elapsed, deltas = ring.window(1)
+        assert (elapsed, deltas[("a",)]) == (10.0, [50])
+
+    def test_ring_wraps_at_capacity(self):
+        ring = ms.RingBuffer(["reads"], capacity=3)
+        for t in range(6):
+            ring.append(float(t), {("a",): [t * 10]})
+        elapsed, deltas = ring.window(100)
+        assert (elapsed, deltas[("a",)]) == (2.0, [20])
+
+    def test_reset_and_missing_rows_yield_none(self):
+        ring = ms.RingBuffer(["reads"], capacity=4)
+        ring.append(0.0, {("a",): [50], ("b",): [5]})
+        ring.append(1.0, {("a",): [3], ("c",): [1]})
+        _, deltas = ring.window(60)
+        assert deltas[("a",)] == [None]
+        assert deltas[("b",)] == [None]
+        assert deltas[("c",)] == [None]
+
+    def test_vanished_series_are_dropped(self):
+        ring = ms.RingBuffer(["reads"], capacity=2)
+        ring.append(0.0, {("a",): [1], ("b",): [1]})
+        for t in range(1, 4):
+            ring.append(float(t), {("a",): [1 + t]})
+        assert ("b",) not in ring.series
+
+
+def _statement(queryid, calls, exec_time, dbid=1, rows=0, blks_read=0):
+    return {"userid": 10, "dbid": dbid, "queryid": queryid, "calls": calls, "total_exec_time": exec_time,
+            "rows": rows, "shared_blks_hit": 0, "shared_blks_read": blks_read, "shared_blks_written": 0,
+            "temp_blks_read": 0, "temp_blks_written": 0}
+
+
+class TestStatementSnapshots:
+    """pg_stat_statements snapshots are diffed per (userid, dbid, queryid)."""
+
+    @pytest.fixture(params=["numpy", "fallback"])
+    def snapshots(self, request, monkeypatch):
+        if request.param == "numpy":
+            if ms.np is None:
+                pytest.skip("numpy not installed")
+        else:
+            monkeypatch.setattr(ms, "np", None)
+        return ms.StatementSnapshots(capacity=4)
+
+    def test_top_by_time_and_calls(self, snapshots):
+        snapshots.append(0.0, [_statement(1, 100, 1000.0), _statement(2, 10, 50.0)])
+        snapshots.append(10.0, [_statement(1, 101, 1100.0), _statement(2, 60, 90.0)])
+        elapsed, top = snapshots.top(60, "time")
+        assert elapsed == 10.0
+        assert [key[2] for key, _ in top] == [1, 2]
+        assert top[0][1]["total_exec_time"] == 100.0
+        _, top = snapshots.top(60, "calls", limit=1)
+        assert [(key[2], delta["calls"]) for key, delta in top] == [(2, 50.0)]
+
+    def test_new_idle_and_reset_statements(self, snapshots):
+        snapshots.append(0.0, [_statement(1, 5, 5.0), _statement(2, 50, 50.0)])
+        snapshots.append(5.0, [_statement(1, 5, 5.0), _statement(2, 3, 3.0), _statement(3, 7, 7.0)])
+        _, top = snapshots.top(60, "calls")
+        # idle statement 1 is omitted, reset statement 2 counts from zero, new statement 3 counts fully
+        assert {key[2]: delta["calls"] for key, delta in top} == {2: 3.0, 3: 7.0}
+
+    def test_io_ranking_and_database_filter(self, snapshots):
+        snapshots.append(0.0, [_statement(1, 0, 0.0, dbid=1), _statement(2, 0, 0.0, dbid=2)])
+        snapshots.append(1.0, [_statement(1, 1, 1.0, dbid=1, blks_read=5),
+                               _statement(2, 1, 1.0, dbid=2, blks_read=50)])
+        _, top = snapshots.top(60, "io")
+        assert [key[2] for key, _ in top] == [2, 1]
+        _, top = snapshots.top(60, "io", dbid=1)
+        assert [key[2] for key, _ in top] == [1]
+
+    def test_churned_keys_are_compacted(self, snapshots):
+        for t in range(6):
+            snapshots.append(float(t), [_statement(t * 2000 + i, t + 1, 1.0) for i in range(2000)])
+        # only keys referenced by the 4 retained snapshots survive a compaction
+        assert len(snapshots.keys) <= 2 * 4 * 2000
+        assert set(snapshots.index) == set(snapshots.keys)
+        _, top = snapshots.top(1, "calls", limit=3)
+        assert all(10000 <= key[2] < 12000 for key, _ in top)
+        assert top[0][1]["calls"] == 6.0
+
+
+class TestMetricsSampler:
+    """Sampler fills rings per source and turns them into rate rows."""
+
+    @pytest.fixture
+    def sampler(self, monkeypatch):
+        monkeypatch.setitem(ms.SAMPLER_CONFIG, "samples", 10)
+        monkeypatch.setitem(ms.SAMPLER_CONFIG, "databases", [])
+        monkeypatch.setattr(ms, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "app"})
+        return ms.MetricsSampler()
+
+    async def _sample(self, sampler, major, commits, clock, statements=None):
+        async def _fetch(query, params=None, database=None):
+            if "pg_stat_statements" in query:
+                return statements
+            if "pg_stat_database" in query:
+                return [{"database_name": "app", "xact_commit": commits, "xact_rollback": 0, "blks_read": 0,
+                         "blks_hit": 0, "tup_returned": 0, "tup_fetched": 0, "tup_inserted": 0,
+                         "tup_updated": 0, "tup_deleted": 0, "temp_files": 0, "temp_bytes": 0, "deadlocks": 0}]
+            return []
+
+        with patch.object(ms, "get_postgresql_version", AsyncMock(return_value=PostgreSQLVersion(major))), \
+                patch.object(ms, "check_extension_exists", AsyncMock(return_value=statements is not None)), \
+                patch.object(ms, "execute_query", AsyncMock(side_effect=_fetch)) as fetch, \
+                patch.object(ms.time, "monotonic", return_value=clock):
+            await sampler.sample_once()
+        return fetch
+
+    async def test_rates_from_samples(self, sampler):
+        await self._sample(sampler, 16, 100, 0.0)
+        await self._sample(sampler, 16, 400, 30.0)
+        elapsed, rows = sampler.window_rows("database_stats", 60)
+        assert elapsed == 30.0
+        assert rows[0]["database_name"] == "app"
+        assert rows[0]["xact_commit_delta"] == 300
+        assert rows[0]["xact_commit_per_sec"] == 10.0
+
+    async def test_io_source_skipped_before_pg16(self, sampler):
+        fetch = await self._sample(sampler, 15, 1, 0.0)
+        queries = [call.args[0] for call in fetch.await_args_list]
+        assert not any("pg_stat_io" in query for query in queries)
+        assert ("table_io_stats", "app") in sampler.rings
+
+    def test_window_requires_sampler(self, sampler):
+        with pytest.raises(Exception, match="POSTGRES_SAMPLER_INTERVAL"):
+            sampler.window_rows("database_stats", 60)
+
+    def test_unsampled_database_rejected(self, sampler):
+        with pytest.raises(Exception, match="POSTGRES_SAMPLER_DATABASES"):
+            sampler.window_rows("all_tables_stats", 60, database="other")
+
+    async def test_format_hides_idle_rows(self, sampler, monkeypatch):
+        monkeypatch.setattr(ms, "metrics_sampler", sampler)
+        await self._sample(sampler, 16, 100, 0.0)
+        await self._sample(sampler, 16, 100, 10.0)
+        report = ms.format_window_stats("database_stats", 60, "Database Activity Rates")
+        assert "No counter changes" in report
+
+    async def test_statements_sampled_when_extension_installed(self, sampler):
+        fetch = await self._sample(sampler, 16, 1, 0.0)
+        assert sampler.statements is None
+        assert not any("pg_stat_statements" in call.args[0] for call in fetch.await_args_list)
+        await self._sample(sampler, 16, 1, 0.0, statements=[_statement(7, 1, 2.0)])
+        await self._sample(sampler, 16, 1, 20.0, statements=[_statement(7, 21, 42.0)])
+        elapsed, top = sampler.top_statements(60, "time")
+        assert (elapsed, top[0][1]["calls"]) == (20.0, 20.0)
+
+    def test_top_statements_rejects_unknown_ranking(self, sampler):
+        with pytest.raises(Exception, match="Invalid sort_by"):
+            sampler.top_statements(60, "bogus")
+
+
+def _session(pid, wait_event=None, wait_type=None, state="active", user="app", database="app", query_id=1):
+    return {"pid": pid, "query_id": query_id, "wait_event_type": wait_type, "wait_event": wait_event,
+            "state": state, "username": user, "database_name": database, "query": f"SELECT {query_id}"}
+
+
+class TestActivityBuffer:
+    """Session samples are kept column-wise and aggregated over a window."""
+
+    def test_group_by_wait_event_counts_cpu(self):
+        buffer = ms.ActivityBuffer(capacity=100)
+        buffer.append(0.0, [_session(1), _session(2, "DataFileRead", "IO")])
+        buffer.append(1.0, [_session(1, "DataFileRead", "IO"), _session(3, state="idle in transaction")])
+        elapsed, polls, ranked = buffer.aggregate(60, "wait_event")
+        assert (elapsed, polls) == (1.0, 2)
+        assert ranked[0] == (("IO", "DataFileRead"), 2)
+        assert dict(ranked) == {("IO", "DataFileRead"): 2, ("CPU", None): 1, (None, None): 1}
+
+    def test_window_and_database_filter(self):
+        buffer = ms.ActivityBuffer(capacity=100)
+        buffer.append(0.0, [_session(1, user="old")])
+        buffer.append(10.0, [_session(1, user="alice"), _session(2, user="bob", database="other")])
+        buffer.append(11.0, [])
+        _, polls, ranked = buffer.aggregate(5, "user")
+        assert polls == 2
+        assert dict(ranked) == {("alice",): 1, ("bob",): 1}
+        _, _, ranked = buffer.aggregate(60, "user", database="other")
+        assert ranked == [(("bob",), 1)]
+        _, _, ranked = buffer.aggregate(60, "user", database="missing")
+        assert ranked == []
+
+    def test_empty_window_yields_none(self):
+        buffer = ms.ActivityBuffer(capacity=100)
+        buffer.append(0.0, [_session(1)])
+        assert buffer.aggregate(0, "wait_event") is None
+
+    def test_oldest_rows_overwritten_and_strings_compacted(self):
+        buffer = ms.ActivityBuffer(capacity=4)
+        for t in range(50):
+            buffer.append(float(t), [_session(t, query_id=t)])
+        _, polls, ranked = buffer.aggregate(1000, "query")
+        assert polls == 4
+        assert [key for key, _ in ranked] == [(t, f"SELECT {t}") for t in (49, 48, 47, 46)]
+        assert len(buffer.strings) <= 2 * 4 + 5
+
+
+class TestActivitySampler:
+    """ActivitySampler polls into its buffer and reports DB time from memory."""
+
+    def test_requires_sampler(self):
+        with pytest.raises(Exception, match="POSTGRES_SAMPLER_ACTIVITY_INTERVAL"):
+            ms.ActivitySampler().aggregate(60)
+
+    def test_rejects_unknown_grouping(self):
+        with pytest.raises(Exception, match="Invalid group_by"):
+            ms.ActivitySampler().aggregate(60, "bogus")
+
+    @pytest.mark.parametrize("window", [0, -30])
+    def test_rejects_non_positive_window(self, window):
+        with pytest.raises(Exception, match="Invalid window"):
+            ms.ActivitySampler().aggregate(window)
+
+    async def test_polls_with_a_connection_per_tick(self, monkeypatch):
+        monkeypatch.setitem(ms.SAMPLER_CONFIG, "activity_interval", 0.01)
+        monkeypatch.setitem(ms.SAMPLER_CONFIG, "activity_rows", 1000)
+        sampler = ms.ActivitySampler()
+        monkeypatch.setattr(ms, "activity_sampler", sampler)
+        with patch.object(ms, "get_postgresql_version", AsyncMock(return_value=PostgreSQLVersion(16))), \
+                patch.object(ms, "execute_query", AsyncMock(return_value=[_session(1, "Lock", "Lock")])) as fetch:
+            sampler.start()
+            while sampler.buffer is None or len(sampler.buffer.sample_times) < 3:
+                await asyncio.sleep(0.01)
+            await sampler.stop()
+
+        assert fetch.await_count >= 3
+        assert "query_id" in fetch.await_args.args[0]
+        report = ms.format_session_history(60, "wait_event")
+        assert "Lock" in report and "average_active_sessions" in report.lower().replace(" ", "_")
@@ -0,0 +1,121 @@
+"""Unit tests for relation_graph.py — no database required."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import mcp_postgresql_ops.relation_graph as rg
+from mcp_postgresql_ops.version_compat import query_registry
+
+
+def _rel(oid, name, relkind="r", is_partition=False, schema="public"):
+    return {"oid": oid, "schema_name": schema, "table_name": name, "relkind": relkind, "is_partition": is_partition}
+
+
+def _fk(name, source, target):
+    return {"constraint_name": name, "source_oid": source, "target_oid": target,
+            "source_columns": "ref_id", "target_columns": "id",
+            "update_rule": "NO ACTION", "delete_rule": "CASCADE", "deferrable": False}
+
+
+# customers <- orders <- order_items -> products; employees self-reference;
+# a <-> b cycle; audit_log orphan; events partitioned into events_2024; view on orders
+RELATIONS = [
+    _rel(1, "customers"), _rel(2, "orders"), _rel(3, "order_items"), _rel(4, "products"),
+    _rel(5, "employees"), _rel(6, "a"), _rel(7, "b"), _rel(8, "audit_log"),
+    _rel(9, "events", "p"), _rel(10, "events_2024", is_partition=True), _rel(11, "order_summary", "v"),
+]
+FOREIGN_KEYS = [
+    _fk("orders_customer_fk", 2, 1), _fk("items_order_fk", 3, 2), _fk("items_product_fk", 3, 4),
+    _fk("employees_manager_fk", 5, 5), _fk("a_b_fk", 6, 7), _fk("b_a_fk", 7, 6),
+]
+INHERITS = [{"child_oid": 10, "parent_oid": 9}]
+VIEWS = [{"view_oid": 11, "table_oid": 2}]
+
+
+@pytest.fixture
+def graph():
+    return rg.RelationGraph(RELATIONS, FOREIGN_KEYS, INHERITS, VIEWS)
+
+
+class TestRelationGraph:
+    """Closure, cycles, load order and orphans are answered from the loaded edges."""
+
+    def test_transitive_closure(self, graph):
+        assert graph.depends_on(3) == {2: 1, 4: 1, 1: 2}
+        assert graph.required_by(1) == {2: 1, 3: 2}
+        assert graph.depends_on(5) == {}
+
+    def test_cycles_exclude_self_references(self, graph):
+        assert graph.cycles() == [[6, 7]]
+        assert graph.self_referencing == {5}
+        assert {row["cycle"] for row in graph.cycle_rows()} == {"cycle 1", "self-reference"}
+
+    def test_load_order_respects_every_foreign_key(self, graph):
+        order = graph.load_order()
+        position = {oid: n for n, (_, members) in enumerate(order) for oid in members}
+        for fk in FOREIGN_KEYS:
+            assert position[fk["target_oid"]] <= position[fk["source_oid"]]
+        levels = {oid: level for level, members in order for oid in members}
+        assert (levels[1], levels[2], levels[3], levels[4]) == (0, 1, 2, 0)
+        assert [6, 7] in [members for _, members in order]
+        # Partitions without their own foreign keys load with their parent
+        assert 10 not in position and 11 not in position
+
+    def test_load_order_for_closure(self, graph):
+        rows = graph.load_order_rows(set(graph.depends_on(3)) | {3})
+        assert [row["tables"] for row in rows] == ["public.customers", "public.products", "public.orders",
+                                                   "public.order_items"]
+
+    def test_orphans(self, graph):
+        assert [graph.name(oid) for oid in graph.orphans()] == ["public.audit_log", "public.events"]
+
+    def test_long_chain_is_not_recursive(self):
+        n = 5000
+        graph = rg.RelationGraph([_rel(i, f"t{i}") for i in range(n)],
+                                 [_fk(f"fk{i}", i + 1, i) for i in range(n - 1)])
+        assert len(graph.required_by(0)) == n - 1
+        assert graph.load_order()[-1] == (n - 1, [n - 1])
+
+    def test_unknown_relations_are_ignored(self):
+        graph = rg.RelationGraph([_rel(1, "t")], [_fk("fk", 1, 999)], [{"child_oid": 1, "parent_oid": 999}])
+        assert graph.foreign_keys == [] and graph.parents == {}
+
+
+class TestFormatting:
+    def test_table_report(self, graph):
+        report = rg.format_table_relationships(graph, 2, "all", "Relationships for public.orders")
+        for heading in ("Outbound Foreign Keys", "Inbound Foreign Keys", "Transitive Dependencies",
+                        "View Dependencies", "Load Order"):
+            assert heading in report
+        assert "public.order_summary" in report
+
+    def test_inheritance_marks_partitions(self, graph):
+        assert graph.inheritance_rows(9) == [
+            {"parent_table": "public.events", "child_table": "public.events_2024", "relationship_type": "PARTITION"}]
+
+    @pytest.mark.parametrize("relationship_type", rg.RELATIONSHIP_TYPES)
+    def test_overview_sections(self, graph, relationship_type):
+        report = rg.format_relationship_overview(graph, relationship_type, "Overview")
+        assert report.startswith("=== Overview - ")
+
+
+class TestRelationGraphs:
+    """The graph is loaded once per database and reloaded only when the catalog fingerprint changes."""
+
+    @pytest.mark.parametrize("name", ["graph_relations", "graph_foreign_keys", "graph_inherits",
+                                      "graph_view_dependencies"])
+    def test_templates_render(self, name):
+        assert "SELECT" in query_registry.render(name)
+
+    async def test_reload_on_fingerprint_change(self, monkeypatch):
+        monkeypatch.setattr(rg.functions, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "app"})
+        fingerprints = AsyncMock(side_effect=["v1", "v1", "v2"])
+        monkeypatch.setattr(rg.catalog_fingerprints, "get", fingerprints)
+        graphs = rg.RelationGraphs()
+        fetch = AsyncMock(return_value=[RELATIONS, FOREIGN_KEYS, INHERITS, VIEWS])
+        with patch.object(rg, "execute_queries", fetch):
+            first = await graphs.get("app")
+            assert await graphs.get("app") is first
+            assert await graphs.get("app") is not first
+        assert fetch.await_count == 2
+        assert fetch.await_args.kwargs["database"] == "app"
@@ -0,0 +1,140 @@
+"""Unit tests for stats_export.py — no database required."""
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import mcp_postgresql_ops.stats_export as se
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset  # noqa: E402
+import pyarrow.ipc  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+VACUUMED = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+COLUMNS = [("relid", "oid"), ("schemaname", "name"), ("relname", "name"), ("seq_scan", "int8"),
+           ("last_vacuum", "timestamptz"), ("total_vacuum_time", "float8"), ("age", "interval"),
+           ("client_addr", "inet")]
+ROWS = [
+    (16384, "public", "orders", 12, VACUUMED, 1.5, timedelta(seconds=90), "10.0.0.1"),
+    (16390, "public", "items", None, None, None, None, None),
+    (16400, "sales", "events", 2 ** 40, VACUUMED, 0.0, timedelta(0), "10.0.0.2"),
+]
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    async def fetch(self, n):
+        batch, self.rows = self.rows[:n], self.rows[n:]
+        return batch
+
+
+class _Statement:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_attributes(self):
+        return [SimpleNamespace(name=name, type=SimpleNamespace(name=type_name)) for name, type_name in COLUMNS]
+
+    async def cursor(self):
+        return _Cursor(self.rows)
+
+
+class _Connection:
+    def __init__(self, rows, queries):
+        self.rows = rows
+        self.queries = queries
+
+    @asynccontextmanager
+    async def _transaction(self):
+        yield
+
+    def transaction(self, readonly=False):
+        assert readonly
+        return self._transaction()
+
+    async def prepare(self, query):
+        self.queries.append(query)
+        if self.rows is None:
+            raise RuntimeError("permission denied")
+        return _Statement(self.rows)
+
+
+@pytest.fixture
+def databases(monkeypatch):
+    """Map database name -> rows (None fails the export); records the queries run."""
+    data = {"app": ROWS, "crm": ROWS[:1]}
+    queries = []
+
+    @asynccontextmanager
+    async def _acquire(database=None):
+        yield _Connection(data[database], queries)
+
+    async def _list_databases():
+        return sorted(data)
+
+    monkeypatch.setattr(se, "acquire_connection", _acquire)
+    monkeypatch.setattr(se, "list_databases", _list_databases)
+    monkeypatch.setitem(se.POOL_CONFIG, "stream_batch_rows", 2)
+    return SimpleNamespace(rows=data, queries=queries)
+
+
+class TestArrowConversion:
+    def test_schema_follows_postgres_types(self):
+        schema = se.arrow_schema(_Statement(ROWS).get_attributes())
+        assert [str(field.type) for field in schema] == [
+            "uint32", "string", "string", "int64", "timestamp[us, tz=UTC]", "double", "duration[us]", "string"]
+
+    def test_record_batch_keeps_values(self):
+        schema = se.arrow_schema(_Statement(ROWS).get_attributes())
+        batch = se.record_batch(ROWS, schema)
+        assert batch.column("seq_scan").to_pylist() == [12, None, 2 ** 40]
+        assert batch.column("last_vacuum").to_pylist()[0] == VACUUMED
+        assert batch.column("age").to_pylist() == [timedelta(seconds=90), None, timedelta(0)]
+
+
+class TestExportStatistics:
+    @pytest.mark.parametrize("file_format", se.FILE_FORMATS)
+    async def test_writes_one_file_per_database_and_view(self, databases, tmp_path, file_format):
+        summary = await se.export_statistics(str(tmp_path), file_format=file_format)
+        assert [(row["database_name"], row["dataset"], row["rows"]) for row in summary] == [
+            (database, dataset, len(databases.rows[database]))
+            for database in ("app", "crm") for dataset in se.EXPORT_DATASETS
+        ]
+        assert all(row["error"] is None and os.path.getsize(row["path"]) == row["file_bytes"] for row in summary)
+        assert not list(tmp_path.rglob("*.partial"))
+
+        path = summary[0]["path"]
+        table = (pa.parquet.read_table(path) if file_format == "parquet"
+                 else pa.ipc.open_file(path).read_all())
+        assert table.column("relname").to_pylist() == ["orders", "items", "events"]
+        assert table.schema.field("relid").type == pa.uint32()
+
+        dataset = pa.dataset.dataset(tmp_path / "table_io_stats", format="parquet" if file_format == "parquet"
+                                     else "ipc", partitioning="hive")
+        assert dataset.to_table().num_rows == 4
+
+    async def test_views(self, databases, tmp_path):
+        await se.export_statistics(str(tmp_path), ["all_tables_stats"], ["app"], include_system=True)
+        await se.export_statistics(str(tmp_path), ["index_usage_stats"], ["app"])
+        assert databases.queries == ["SELECT * FROM pg_stat_all_tables", "SELECT * FROM pg_stat_user_indexes"]
+
+    async def test_failed_database_does_not_stop_export(self, databases, tmp_path):
+        databases.rows["crm"] = None
+        summary = await se.export_statistics(str(tmp_path), ["table_io_stats"])
+        assert [row["error"] for row in summary] == [None, "permission denied"]
+        assert not list(tmp_path.rglob("database=crm/*"))
+
+    @pytest.mark.parametrize("kwargs, message", [
+        ({"file_format": "csv"}, "file_format must be one of"),
+        ({"datasets": ["locks"]}, "Unknown dataset(s) locks"),
+        ({"databases": ["../etc"]}, "Cannot export database"),
+    ])
+    async def test_invalid_arguments(self, databases, tmp_path, kwargs, message):
+        with pytest.raises(ValueError, match=re.escape(message)):
+            await se.export_statistics(str(tmp_path), **kwargs)
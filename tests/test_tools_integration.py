@@ -2,9 +2,16 @@
 
 Requires Docker Compose test stack running (tests/docker/docker-compose.test.yml).
 """
+import asyncio
+import json
+
+import asyncpg
 import pytest
 
+import mcp_postgresql_ops.functions as _functions
+import mcp_postgresql_ops.lock_graph as _lock_graph
 import mcp_postgresql_ops.mcp_main as _mcp_main
+import mcp_postgresql_ops.metrics_sampler as _metrics_sampler
 
 
 def _fn(name: str):
@@ -50,6 +57,9 @@ get_wait_events = _fn("get_wait_events")
 get_wal_summarizer_status = _fn("get_wal_summarizer_status")
 get_async_io_status = _fn("get_async_io_status")
 get_per_backend_io_stats = _fn("get_per_backend_io_stats")
+get_table_schema_batch = _fn("get_table_schema_batch")
+get_active_session_history = _fn("get_active_session_history")
+export_statistics_snapshot = _fn("export_statistics_snapshot")
 
 
 pytestmark = pytest.mark.asyncio
@@ -103,6 +113,12 @@ class TestCoreTools:
         result = await get_table_list()
         assert_tool_result(result, "get_table_list")
 
+    async def test_get_table_list_json_paging(self, setup_env):
+        first = json.loads(await get_table_list(page_size=1, include_size=False, output_format="json"))
+        assert len(first["tables"][0]["rows"]) == 1 and first["next_after"]
+        second = json.loads(await get_table_list(page_size=1, after=first["next_after"], output_format="json"))
+        assert second["tables"][0]["rows"][0][:2] != first["tables"][0]["rows"][0][:2]
+
     async def test_get_user_list(self, setup_env):
         result = await get_user_list()
         assert_tool_result(result, "get_user_list")
@@ -217,6 +233,127 @@ class TestCoreTools:
         assert_tool_result(result, "get_database_conflicts_stats")
 
 
+# ============================================================
+# Batch schema, lock graph, sampler and export tools
+# ============================================================
+
+async def _connect():
+    config = _functions.POSTGRES_CONFIG
+    return await asyncpg.connect(host=config["host"], port=config["port"], user=config["user"],
+                                 password=config["password"], database=config["database"])
+
+
+@pytest.fixture
+async def blocked_session(setup_env):
+    """One session holds a lock on sales.customers while another waits for it; yields their pids."""
+    holder, waiter = await _connect(), await _connect()
+    transaction = holder.transaction()
+    await transaction.start()
+    await holder.execute("LOCK TABLE sales.customers IN ACCESS EXCLUSIVE MODE")
+    waiting = asyncio.ensure_future(waiter.fetchval("SELECT count(*) FROM sales.customers"))
+    try:
+        for _ in range(50):
+            if await holder.fetchval("SELECT wait_event_type = 'Lock' FROM pg_stat_activity WHERE pid = $1",
+                                     waiter.get_server_pid()):
+                break
+            await asyncio.sleep(0.1)
+        yield holder.get_server_pid(), waiter.get_server_pid()
+    finally:
+        await transaction.rollback()
+        await waiting
+        await holder.close()
+        await waiter.close()
+
+
+@pytest.fixture
+async def sampled(setup_env, monkeypatch):
+    """A fresh metrics sampler that has taken two snapshots of every sampled view."""
+    sampler = _metrics_sampler.MetricsSampler()
+    monkeypatch.setattr(_metrics_sampler, "metrics_sampler", sampler)
+    monkeypatch.setitem(_metrics_sampler.SAMPLER_CONFIG, "databases", ["testdb"])
+    await sampler.sample_once()
+    await get_table_list(database_name="testdb")
+    await asyncio.sleep(0.1)
+    await sampler.sample_once()
+    assert sampler.last_error is None, sampler.last_error
+    return sampler
+
+
+class TestBatchSamplerAndExportTools:
+    """Tools whose SQL only runs with particular arguments or background samplers."""
+
+    async def test_get_table_schema_batch_whole_schema(self, setup_env):
+        result = await get_table_schema_batch(database_name="testdb", schema_name="sales")
+        assert_tool_result(result, "get_table_schema_batch")
+        assert "sales.customers" in result and "sales.order_items" in result
+
+    async def test_get_table_schema_batch_named_tables(self, setup_env):
+        result = await get_table_schema_batch(database_name="testdb", schema_name="sales",
+                                              table_names=["orders", "missing_table"])
+        assert_tool_result(result, "get_table_schema_batch(named)")
+        assert "sales.orders" in result and "sales.customers" not in result
+        assert "Not found in sales: missing_table" in result
+
+    async def test_get_lock_monitoring_tree(self, blocked_session):
+        holder, waiter = blocked_session
+        result = await get_lock_monitoring(database_name="testdb", tree=True)
+        assert_tool_result(result, "get_lock_monitoring(tree)")
+        assert "Root Blockers" in result and str(holder) in result and str(waiter) in result
+
+    async def test_get_lock_monitoring_watch(self, blocked_session, monkeypatch):
+        monkeypatch.setattr(_lock_graph, "lock_watcher", _lock_graph.LockWatcher())
+        holder, waiter = blocked_session
+        baseline = await get_lock_monitoring(database_name="testdb", watch=True)
+        assert_tool_result(baseline, "get_lock_monitoring(watch)")
+        assert "watch baseline" in baseline and str(waiter) in baseline
+        changes = await get_lock_monitoring(database_name="testdb", watch=True)
+        assert "Lock Wait Changes" in changes and "1 root blockers, 1 waiting sessions" in changes
+
+    async def test_get_active_session_history(self, blocked_session, monkeypatch):
+        sampler = _metrics_sampler.ActivitySampler()
+        monkeypatch.setattr(_metrics_sampler, "activity_sampler", sampler)
+        monkeypatch.setitem(_metrics_sampler.SAMPLER_CONFIG, "activity_interval", 1)
+        for _ in range(2):
+            await sampler.sample_once()
+        result = await get_active_session_history(window=60, database_name="testdb")
+        assert_tool_result(result, "get_active_session_history")
+        assert "Lock" in result
+        result = await get_active_session_history(window=60, group_by="query")
+        assert "sales.customers" in result
+        assert "Invalid window" in await get_active_session_history(window=0)
+
+    @pytest.mark.parametrize("tool, kwargs", [
+        ("get_database_stats", {}),
+        ("get_bgwriter_stats", {}),
+        ("get_table_io_stats", {"database_name": "testdb", "schema_name": "sales"}),
+        ("get_all_tables_stats", {"database_name": "testdb"}),
+        ("get_pg_stat_statements_top_queries", {"database_name": "testdb"}),
+    ])
+    async def test_window_statistics(self, sampled, tool, kwargs):
+        result = await _fn(tool)(window=60, **kwargs)
+        assert_tool_result(result, f"{tool}(window)")
+        assert "Error" not in result and "(requested window: 60s)" in result
+
+    async def test_io_stats_window(self, sampled, setup_env):
+        major, _ = setup_env
+        result = await get_io_stats(window=60)
+        assert_tool_result(result, "get_io_stats(window)")
+        if major >= 16:
+            assert "I/O Rates (pg_stat_io)" in result
+        else:
+            assert "Error" in result
+
+    async def test_export_statistics_snapshot(self, setup_env, monkeypatch, tmp_path):
+        pytest.importorskip("pyarrow")
+        monkeypatch.setitem(_mcp_main.EXPORT_CONFIG, "directory", str(tmp_path))
+        result = json.loads(await export_statistics_snapshot(database_names=["testdb"], output_format="json"))
+        summary = result["tables"][0]
+        rows = [dict(zip(summary["columns"], row)) for row in summary["rows"]]
+        assert [row["dataset"] for row in rows] == ["all_tables_stats", "table_io_stats", "index_usage_stats"]
+        assert all(row["error"] is None and row["rows"] > 0 for row in rows)
+        assert len(list(tmp_path.rglob("*.parquet"))) == 3
+
+
 # ============================================================
 # Version-gated tools — test behavior on all versions
 # ============================================================
@@ -1,12 +1,17 @@
 """Unit tests for version_compat.py — no database required."""
+import asyncio
 import re
+import time
 from unittest.mock import AsyncMock, patch
 import pytest
 
 from mcp_postgresql_ops.version_compat import (
     PostgreSQLVersion,
+    QueryRegistry,
+    ServerCapabilities,
     VersionAwareQueries,
     get_pg_stat_statements_query,
+    query_registry,
 )
 
 TRAILING_COMMA_PATTERN = re.compile(r',\s*FROM\b', re.IGNORECASE)
@@ -15,7 +20,9 @@ TRAILING_COMMA_PATTERN = re.compile(r',\s*FROM\b', re.IGNORECASE)
 async def _mock_version_call(func, major, *args, **kwargs):
     """Call an async query builder with get_postgresql_version mocked to return the given major version."""
     version = PostgreSQLVersion(major, 0, 0)
-    with patch("mcp_postgresql_ops.version_compat.get_postgresql_version", new_callable=AsyncMock, return_value=version):
+    with patch("mcp_postgresql_ops.version_compat.get_postgresql_version", new_callable=AsyncMock, return_value=version), \
+            patch("mcp_postgresql_ops.version_compat.get_server_capability_info", new_callable=AsyncMock,
+                  return_value=ServerCapabilities(version)):
         return await func(*args, **kwargs)
 
 
@@ -61,6 +68,10 @@ class TestPostgreSQLVersionProperties:
     def test_has_parallel_leader_tracking(self, major, expected):
         assert PostgreSQLVersion(major, 0, 0).has_parallel_leader_tracking is expected
 
+    @pytest.mark.parametrize("major,expected", [(13, False), (14, True), (18, True)])
+    def test_has_activity_query_id(self, major, expected):
+        assert PostgreSQLVersion(major, 0, 0).has_activity_query_id is expected
+
     # PG 16+ properties
     @pytest.mark.parametrize("major,expected", [
         (12, False), (13, False), (14, False), (15, False), (16, True), (17, True), (18, True),
@@ -303,3 +314,143 @@ class TestVersionAwareQueriesSQL:
             VersionAwareQueries.get_all_tables_stats_query, 16, include_system=False
         )
         assert "pg_stat_user_tables" in query
+
+
+
+class TestQueryRegistry:
+    """Templates render once per (version, params) and are reused."""
+
+    def test_render_is_memoized(self):
+        registry = QueryRegistry()
+        calls = []
+
+        @registry.template("demo")
+        def _demo(version, verbose=False):
+            calls.append((version.major, verbose))
+            return f"SELECT {version.major}"
+
+        v16 = PostgreSQLVersion(16, 0, 0)
+        first = registry.render("demo", v16)
+        assert registry.render("demo", PostgreSQLVersion(16, 0, 0)) is first
+        registry.render("demo", v16, verbose=True)
+        registry.render("demo", PostgreSQLVersion(17, 0, 0))
+        assert calls == [(16, False), (16, True), (17, False)]
+
+    def test_duplicate_template_rejected(self):
+        registry = QueryRegistry()
+        registry.template("demo")(lambda version: "SELECT 1")
+        with pytest.raises(ValueError):
+            registry.template("demo")(lambda version: "SELECT 2")
+
+    @pytest.mark.parametrize("major", [12, 13, 14, 15, 16, 17, 18])
+    def test_io_stats_binds_limit(self, major):
+        sql = query_registry.render("io_stats", PostgreSQLVersion(major, 0, 0))
+        assert "LIMIT $1" in sql
+        assert ("pg_stat_io" in sql) is (major >= 16)
+
+    @pytest.mark.parametrize("major", [12, 13, 14, 15, 16, 17, 18])
+    def test_bgwriter_stats_view(self, major):
+        sql = query_registry.render("bgwriter_stats", PostgreSQLVersion(major, 0, 0))
+        assert ("pg_stat_checkpointer" in sql) is (major >= 17)
+        assert not TRAILING_COMMA_PATTERN.search(sql)
+
+    async def test_builder_returns_same_text(self):
+        first = await _mock_version_call(VersionAwareQueries.get_all_tables_stats_query, 15)
+        second = await _mock_version_call(VersionAwareQueries.get_all_tables_stats_query, 15)
+        assert first is second
+
+
+class TestCapabilityCache:
+    """Capabilities are cached per (host, port) with positive and negative TTLs."""
+
+    @pytest.fixture(autouse=True)
+    def endpoint(self, monkeypatch):
+        import mcp_postgresql_ops.functions as fn
+        import mcp_postgresql_ops.version_compat as vc
+
+        monkeypatch.setattr(vc, "_capability_cache", {})
+        monkeypatch.setattr(vc, "_refresh_tasks", {})
+        monkeypatch.setattr(fn, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "postgres"})
+        return fn, vc
+
+    @staticmethod
+    def _snapshot(version_num, columns=None):
+        return {
+            "version": f"PostgreSQL {version_num // 10000}.{version_num % 10000}",
+            "server_version_num": version_num,
+            "catalog_columns": columns or {},
+        }
+
+    async def test_version_from_server_version_num(self, endpoint):
+        _, vc = endpoint
+        probe = AsyncMock(return_value=self._snapshot(160004, {"pg_stat_io": ["backend_type", "reads"]}))
+        with patch.object(vc, "get_server_capabilities", probe):
+            info = await vc.get_server_capability_info()
+            assert await vc.get_postgresql_version() == PostgreSQLVersion(16, 4, 0)
+        assert info.has_relation("pg_stat_io")
+        assert info.has_column("pg_stat_io", "reads")
+        assert not info.has_column("pg_stat_io", "read_bytes")
+        assert probe.await_count == 1
+
+    async def test_templates_follow_catalog_columns(self, endpoint):
+        _, vc = endpoint
+        # PG 18 by number, but this build's pg_stat_io and pg_stat_user_tables lack the 18 columns
+        columns = {"pg_stat_io": ["backend_type", "reads"],
+                   "pg_stat_user_tables": ["relname", "n_ins_since_vacuum"]}
+        probe = AsyncMock(return_value=self._snapshot(180000, columns))
+        with patch.object(vc, "get_server_capabilities", probe):
+            io_sql = await vc.render_for_server("io_stats")
+            tables_sql = await VersionAwareQueries.get_all_tables_stats_query()
+        assert "pg_stat_io" in io_sql and "read_bytes" not in io_sql
+        assert "n_ins_since_vacuum" in tables_sql and "total_vacuum_time" not in tables_sql
+
+    async def test_templates_fall_back_to_version_without_columns(self, endpoint):
+        _, vc = endpoint
+        with patch.object(vc, "get_server_capabilities", AsyncMock(return_value=self._snapshot(180000))):
+            assert "read_bytes" in await vc.render_for_server("io_stats")
+
+    async def test_cache_is_per_endpoint(self, endpoint, monkeypatch):
+        fn, vc = endpoint
+        probe = AsyncMock(side_effect=[self._snapshot(130010), self._snapshot(180000)])
+        with patch.object(vc, "get_server_capabilities", probe):
+            assert (await vc.get_postgresql_version()).major == 13
+            monkeypatch.setattr(fn, "POSTGRES_CONFIG", {"host": "db", "port": 5433, "database": "postgres"})
+            assert (await vc.get_postgresql_version()).major == 18
+            monkeypatch.setattr(fn, "POSTGRES_CONFIG", {"host": "db", "port": 5432, "database": "postgres"})
+            assert (await vc.get_postgresql_version()).major == 13
+        assert probe.await_count == 2
+
+    async def test_failed_probe_expires(self, endpoint, monkeypatch):
+        _, vc = endpoint
+        monkeypatch.setattr(vc, "CAPABILITY_NEGATIVE_TTL", 0)
+        probe = AsyncMock(side_effect=[OSError("refused"), self._snapshot(170002)])
+        with patch.object(vc, "get_server_capabilities", probe):
+            fallback = await vc.get_server_capability_info()
+            assert fallback.version == 12
+            assert not fallback.detected
+            assert await vc.get_postgresql_version() == PostgreSQLVersion(17, 2, 0)
+
+    async def test_failed_refresh_keeps_detected_version(self, endpoint, monkeypatch):
+        _, vc = endpoint
+        monkeypatch.setattr(vc, "CAPABILITY_TTL", 0)
+        probe = AsyncMock(side_effect=[self._snapshot(170002), OSError("refused"), OSError("refused")])
+        with patch.object(vc, "get_server_capabilities", probe):
+            assert await vc.get_postgresql_version() == PostgreSQLVersion(17, 2, 0)
+            await vc.get_postgresql_version()
+            await asyncio.gather(*vc._refresh_tasks.values())
+            cached = vc._capability_cache[("db", 5432)]
+            assert cached.detected and cached.version == PostgreSQLVersion(17, 2, 0)
+            assert cached.expires_at > time.monotonic()
+            # A forced probe that fails also falls back to what was detected
+            assert await vc.get_postgresql_version(force_refresh=True) == PostgreSQLVersion(17, 2, 0)
+
+    async def test_expired_entry_refreshes_in_background(self, endpoint, monkeypatch):
+        _, vc = endpoint
+        monkeypatch.setattr(vc, "CAPABILITY_TTL", 0)
+        probe = AsyncMock(side_effect=[self._snapshot(160000), self._snapshot(170000)])
+        with patch.object(vc, "get_server_capabilities", probe):
+            assert (await vc.get_postgresql_version()).major == 16
+            # Stale entry is served immediately while the refresh runs
+            assert (await vc.get_postgresql_version()).major == 16
+            await asyncio.gather(*vc._refresh_tasks.values())
+        assert vc._capability_cache[("db", 5432)].version.major == 17